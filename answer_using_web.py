@@ -2,16 +2,32 @@ import argparse
 import json
 import os
 import re
+from contextlib import nullcontext
 
+from llm.answer_cache import AnswerCache
+from llm.context_packer import ContextPacker
 from llm.llm_manager import LLMManager
-from retrieve.st_retrieval import SentenceTransformerRetriever
+from pipeline.answer_server import AnswerServer
+from pipeline.metrics import COUNTERS, STAGES, MetricsRegistry, QueryMetrics
+from pipeline.staged_executor import Stage, StagedPipeline, StageError
+from retrieve.chunking import chunk_text, source_urls
+from web.html_extraction import SUPPORTED_HTML_ENGINES, get_extractor
+from web.http_fetcher import DomainTiers, HttpFetcher
+from web.multi_search import SUPPORTED_SEARCH_MODES, MultiEngineSearch
+from web.page_cache import PageCache
+from web.rate_limited_session import RateLimitedSession
+from web.search_cache import SearchCache
 from web.web_scraper import WebScraper
 
 CONFIG_FILE: str = "config.json"
 SUPPORTED_SEARCH_ENGINES: list[str] = ["ddg", "google", "ddg_custom"]
-SUPPORTED_RETRIEVAL_MODES: list[str] = ["sentence_transformers"]
+SUPPORTED_RETRIEVAL_MODES: list[str] = ["sentence_transformers", "bm25", "hybrid"]
 SUPPORTED_LLM_PROVIDERS: list[str] = ["ollama"]
 CSV_SEPARATOR: str = ";"
+SUPPORTED_METRICS_FORMATS: list[str] = ["jsonl", "csv", "none"]
+METRICS_COLUMNS: list[str] = (
+    ["status", "total_seconds"] + [f"{stage}_seconds" for stage in STAGES] + COUNTERS
+)
 
 
 def parse_config_json(config_path):
@@ -29,8 +45,15 @@ def parse_config_yaml(file):
 
 
 def init_components(config_path):
-    config = parse_config_json(config_path)
+    return init_components_from_config(parse_config_json(config_path))
 
+
+def init_components_from_config(config, load_in_background=True):
+    """
+    Build the components described by config. With load_in_background the
+    embedding model and the LLM chain are loaded by threads (torch and langchain
+    take seconds to import), so the caller can already search and scrape the web
+    """
     required_keys = [
         "llm_provider",
         "final_answer_model",
@@ -57,125 +80,702 @@ def init_components(config_path):
         if m["name"] == config["final_answer_model"]:
             temperature = m.get("temperature", 0.3)
             has_thinking = m.get("thinking_enabled", False)
+            context_tokens = m.get("context_tokens")
+            answer_tokens = m.get("answer_tokens", 512)
             break
     else:
         print(f"[ERROR] Model config not found: {config['final_answer_model']}")
         exit(1)
 
-    if config["retrieval_mode"] == "sentence_transformers":
-        retrieval = SentenceTransformerRetriever(config["embedding_model"])
+    dedup_cfg = config.get("dedup", {})
+    if dedup_cfg.get("enabled", False):
+        from retrieve.dedup import NearDuplicateFilter
+
+        dedup = NearDuplicateFilter(max_distance=dedup_cfg.get("max_distance", 6))
+    else:
+        dedup = None
+
+    knowledge_base_cfg = config.get("knowledge_base", {})
+    incremental_cfg = config.get("incremental_retrieval", {})
+    if incremental_cfg.get("stable_pages", 1) <= 0:
+        print("[ERROR] incremental_retrieval.stable_pages must be greater than 0")
+        exit(1)
+    if config["retrieval_mode"] in ("sentence_transformers", "hybrid"):
+        from retrieve.embedding_backend import (
+            SUPPORTED_EMBEDDING_BACKENDS,
+            SUPPORTED_EMBEDDING_PRECISIONS,
+            EmbeddingBackend,
+        )
+        from retrieve.st_retrieval import SentenceTransformerRetriever
+
+        backend_cfg = config.get("embedding_backend", {})
+        if backend_cfg.get("backend", "torch") not in SUPPORTED_EMBEDDING_BACKENDS:
+            print(
+                f"[ERROR] Unsupported embedding backend: {backend_cfg['backend']}. "
+                f"Supported backends are: {SUPPORTED_EMBEDDING_BACKENDS}"
+            )
+            exit(1)
+        if backend_cfg.get("precision", "fp32") not in SUPPORTED_EMBEDDING_PRECISIONS:
+            print(
+                f"[ERROR] Unsupported embedding precision: {backend_cfg['precision']}. "
+                f"Supported precisions are: {SUPPORTED_EMBEDDING_PRECISIONS}"
+            )
+            exit(1)
+
+        embedding_cache_cfg = config.get("embedding_cache", {})
+        retrieval = SentenceTransformerRetriever(
+            config["embedding_model"],
+            cache_directory=(
+                embedding_cache_cfg.get("directory", ".cache/embeddings")
+                if embedding_cache_cfg.get("enabled", False)
+                else None
+            ),
+            cache_max_size_mb=embedding_cache_cfg.get("max_size_mb", 500),
+            lexical_candidates=(
+                config.get("hybrid_candidates", 50)
+                if config["retrieval_mode"] == "hybrid"
+                else None
+            ),
+            knowledge_base_directory=(
+                knowledge_base_cfg.get("directory", ".cache/knowledge_base")
+                if knowledge_base_cfg.get("enabled", False)
+                else None
+            ),
+            load_in_background=load_in_background,
+            dedup=dedup,
+            backend=EmbeddingBackend(
+                backend=backend_cfg.get("backend", "torch"),
+                precision=backend_cfg.get("precision", "fp32"),
+                threads=backend_cfg.get("threads", 0),
+                truncate_dim=backend_cfg.get("truncate_dim") or None,
+                onnx_directory=backend_cfg.get("onnx_directory", ".cache/onnx"),
+            ),
+        )
+    elif config["retrieval_mode"] == "bm25":
+        from retrieve.bm25_retrieval import BM25Retriever
+
+        if knowledge_base_cfg.get("enabled", False):
+            print("[WARNING] The knowledge base needs an embedding model, disabled.")
+        if incremental_cfg.get("enabled", False):
+            print(
+                "[WARNING] The incremental retrieval needs an embedding model, "
+                "disabled."
+            )
+        retrieval = BM25Retriever(dedup=dedup)
     else:
         print(f"[ERROR] Unsupported retrieval mode: {config['retrieval_mode']}")
         exit(1)
 
+    page_cache_cfg = config.get("page_cache", {})
+    page_cache = (
+        PageCache(
+            page_cache_cfg.get("directory", ".cache/pages"),
+            ttl_seconds=page_cache_cfg.get("ttl_seconds", 86400),
+            max_size_mb=page_cache_cfg.get("max_size_mb", 200),
+            revalidate=page_cache_cfg.get("revalidate", True),
+        )
+        if page_cache_cfg.get("enabled", False)
+        else None
+    )
+
+    search_cache_cfg = config.get("search_cache", {})
+    search_cache = (
+        SearchCache(
+            search_cache_cfg.get("path", ".cache/search.sqlite"),
+            ttl_seconds=search_cache_cfg.get("ttl_seconds", 21600),
+            negative_ttl_seconds=search_cache_cfg.get("negative_ttl_seconds", 600),
+        )
+        if search_cache_cfg.get("enabled", False)
+        else None
+    )
+
+    multi_search_cfg = config.get("multi_search", {})
+    if multi_search_cfg.get("mode", "fallback") not in SUPPORTED_SEARCH_MODES:
+        print(
+            f"[ERROR] Unsupported search mode: {multi_search_cfg['mode']}. "
+            f"Supported modes are: {SUPPORTED_SEARCH_MODES}"
+        )
+        exit(1)
+    for engine in multi_search_cfg.get("fallback_engines") or []:
+        if engine not in SUPPORTED_SEARCH_ENGINES:
+            print(f"[ERROR] Unsupported fallback search engine: {engine}")
+            exit(1)
+    multi_search = MultiEngineSearch(
+        mode=multi_search_cfg.get("mode", "fallback"),
+        fallback_engines=multi_search_cfg.get("fallback_engines"),
+        hedge_after=multi_search_cfg.get("hedge_after", 2.0),
+        timeout=multi_search_cfg.get("timeout", 15),
+        failure_threshold=multi_search_cfg.get("failure_threshold", 3),
+        reset_after=multi_search_cfg.get("reset_after", 60),
+    )
+
+    ddg_custom_session_cfg = config.get("ddg_custom_session", {})
+    ddg_custom_session = RateLimitedSession(
+        timeout=ddg_custom_session_cfg.get("timeout", 10),
+        requests_per_second=ddg_custom_session_cfg.get("requests_per_second", 1.0),
+        burst=ddg_custom_session_cfg.get("burst", 3),
+        max_retries=ddg_custom_session_cfg.get("max_retries", 2),
+        backoff=ddg_custom_session_cfg.get("backoff", 1.0),
+        max_backoff=ddg_custom_session_cfg.get("max_backoff", 30),
+    )
+
+    html_engine = config.get("html_engine", "auto")
+    if html_engine not in SUPPORTED_HTML_ENGINES:
+        print(
+            f"[ERROR] Unsupported html engine: {html_engine}. "
+            f"Supported engines are: {SUPPORTED_HTML_ENGINES}"
+        )
+        exit(1)
+    extractor = get_extractor(html_engine)
+
+    http_fetch_cfg = config.get("http_fetch", {})
+    http_fetcher = (
+        HttpFetcher(
+            timeout=http_fetch_cfg.get("timeout", 10),
+            pool_size=config.get("max_concurrent_pages", 4) * 4,
+            min_text_chars=http_fetch_cfg.get("min_text_chars", 500),
+            max_page_mb=http_fetch_cfg.get("max_page_mb", 5),
+            domain_tiers=DomainTiers(
+                http_fetch_cfg.get("domain_memory_path", ".cache/fetch_tiers.sqlite"),
+                retry_http_after=http_fetch_cfg.get("retry_http_after", 604800),
+                browser_after=http_fetch_cfg.get("browser_after_pages", 3),
+            ),
+            extractor=extractor,
+        )
+        if http_fetch_cfg.get("enabled", False)
+        else None
+    )
+
+    browser_pool_cfg = config.get("browser_pool", {})
+    scraper = WebScraper(
+        max_concurrency=config.get("max_concurrent_pages", 4),
+        page_timeout=config.get("page_timeout", 60),
+        use_browser_pool=browser_pool_cfg.get("enabled", False),
+        recycle_browser_after=browser_pool_cfg.get("recycle_after_pages", 50),
+        page_cache=page_cache,
+        search_cache=search_cache,
+        ddg_custom_url=config.get("ddg_custom_url"),
+        http_fetcher=http_fetcher,
+        extractor=extractor,
+        multi_search=multi_search,
+        ddg_custom_session=ddg_custom_session,
+    )
+
+    answer_cache_cfg = config.get("answer_cache", {})
+    answer_cache = (
+        AnswerCache(
+            answer_cache_cfg.get("path", ".cache/answers.sqlite"),
+            max_size_mb=answer_cache_cfg.get("max_size_mb", 50),
+        )
+        if answer_cache_cfg.get("enabled", False)
+        else None
+    )
+    llm_manager = LLMManager(
+        config["llm_provider"],
+        config["final_answer_model"],
+        temperature,
+        config["llm_template"],
+        has_thinking,
+        answer_cache=answer_cache,
+        base_url=config.get("ollama_base_url"),
+        max_in_flight=config.get("llm_max_in_flight", 1),
+        max_retries=config.get("llm_max_retries", 2),
+        load_in_background=load_in_background,
+        context_tokens=context_tokens,
+    )
+    packer = (
+        ContextPacker(config["llm_template"], context_tokens, answer_tokens)
+        if context_tokens
+        else None
+    )
+
     return {
         "config": config,
+        "scraper": scraper,
+        "llm_manager": llm_manager,
         "retrieval": retrieval,
         "temperature": temperature,
         "has_thinking": has_thinking,
+        "dedup": dedup,
+        "packer": packer,
+        "incremental_stable_pages": (
+            incremental_cfg.get("stable_pages", 1)
+            if incremental_cfg.get("enabled", False)
+            and config["retrieval_mode"] != "bm25"
+            else None
+        ),
+        # not retrieval.knowledge_base, it would wait for the embedding model
+        "knowledge_base_min_confidence": (
+            knowledge_base_cfg.get("min_confidence", 0.75)
+            if knowledge_base_cfg.get("enabled", False)
+            and config["retrieval_mode"] != "bm25"
+            else None
+        ),
     }
 
 
-def execute_answer_using_web(
+def close_components(init):
+    init["scraper"].close()
+    init["retrieval"].close()
+    if init["llm_manager"].answer_cache is not None:
+        init["llm_manager"].answer_cache.close()
+
+
+def scrape_query(
     query,
     max_pages,
     language,
     search_engine,
-    retriever,
-    llm_provider,
-    model_name,
-    max_chunk,
+    scraper,
     save_content_to_file,
-    llm_template,
-    temperature,
-    has_thinking,
+    metrics=None,
+    dedup=None,
+    on_page=None,
 ):
-    status = "OK"  # or NO_WEB_CONTENT or NO_RELEVANT_CHUNKS
+    """
+    Search and scrape the pages of the query.
+    on_page, if given, gets every page as soon as it is scraped, see
+    WebScraper.get_scraped_pages.
+    With dedup (NearDuplicateFilter) the pages that are near duplicates of a page
+    before them (mirrors, syndicated copies) are dropped; with on_page too the
+    pages are compared as soon as they are scraped, and the dropped ones never
+    reach on_page.
+    Returns the pages ({"url", "content"}, empty if nothing was found) and the
+    status; they are never joined in a single text, the retrievers chunk them one
+    by one
+    """
+    status = "OK"  # or NO_WEB_CONTENT
+
+    # urls of the pages dropped before on_page
+    dropped = None
+    if on_page is not None and dedup is not None:
+        from retrieve.dedup import SeenTexts
+
+        seen = SeenTexts()
+        dropped = set()
+        forward_page = on_page
+
+        def on_page(page):
+            with metrics.measure("dedup") if metrics is not None else nullcontext():
+                kept = dedup.keep([page["content"]], seen)
+            if not kept:
+                dropped.add(page["url"])
+                return False
+            return forward_page(page)
 
-    scraper = WebScraper()
     print(f"[INFO] Scraping {max_pages} pages for query: '{query}' in '{language}'")
     data = scraper.get_scraped_pages(
-        query, search_engine=search_engine, max_pages=max_pages, language=language
+        query,
+        search_engine=search_engine,
+        max_pages=max_pages,
+        language=language,
+        metrics=metrics,
+        on_page=on_page,
     )
 
     if not data or all("No content found." in page["content"] for page in data):
         status = "NO_WEB_CONTENT"
-        scraped_md = ""
+        data = []
     else:
-        scraped_md = "\n\n".join([page["content"] for page in data])
+        if dedup is not None:
+            if dropped is not None:
+                kept = [i for i, page in enumerate(data) if page["url"] not in dropped]
+            else:
+                with metrics.measure("dedup") if metrics is not None else nullcontext():
+                    kept = dedup.keep([page["content"] for page in data])
+            if len(kept) < len(data):
+                print(f"[INFO] Dropped {len(data) - len(kept)} near-duplicate pages.")
+            if metrics is not None:
+                metrics.count("duplicate_pages", len(data) - len(kept))
+            data = [data[i] for i in kept]
 
     if save_content_to_file:
         with open(f"{query}_scraped_content.md", "w", encoding="utf-8") as f:
-            f.write(scraped_md)
+            for i, page in enumerate(data):
+                f.write(("\n\n" if i else "") + page["content"])
 
-    print("[INFO] Finding relevant paragraphs...")
+    return data, status
 
-    if scraped_md:
-        relevant_chunks = retriever.get_relevant_chunks(scraped_md, query, max_chunk)
-    else:
+
+def search_knowledge_base(query, max_chunk, retriever, min_confidence, metrics=None):
+    """
+    Relevant chunks of the query from the local knowledge base and the urls of
+    their pages, None if the web is needed because the best chunk has a score
+    below min_confidence
+    """
+    [(relevant_chunks, confidence, sources)] = retriever.search_knowledge_base(
+        [query], max_chunk, metrics=[metrics] if metrics else None
+    )
+    if confidence < min_confidence or not relevant_chunks:
+        print(
+            f"[INFO] Knowledge base confidence {confidence:.2f} is below "
+            f"{min_confidence}, searching the web..."
+        )
+        return None
+
+    print(f"[INFO] Answering from the knowledge base (confidence {confidence:.2f})")
+    return relevant_chunks, sources
+
+
+def build_template_input(
+    query,
+    language,
+    pages,
+    relevant_chunks,
+    status,
+    save_content_to_file,
+    packer=None,
+    metrics=None,
+):
+    """
+    Build the dict used to fill the llm template from the relevant chunks.
+    With packer (ContextPacker) the chunks, from the most relevant, fill the token
+    budget of the model, otherwise they are all used.
+    Returns the dict and the status, updated to NO_RELEVANT_CHUNKS if needed
+    """
+    if status == "NO_WEB_CONTENT":
         relevant_chunks = [""]
 
-    if (not relevant_chunks or len(relevant_chunks) == 0) and scraped_md:
+    if (not relevant_chunks or len(relevant_chunks) == 0) and pages:
         print(
             "[WARNING] No relevant chunks found. LLM will answer using the question only."
         )
         status = "NO_RELEVANT_CHUNKS"
         relevant_chunks = [""]
 
+    dict_for_template = {"language": language, "question": query}
+    dict_for_template["document"] = (
+        packer.pack(relevant_chunks, dict_for_template, metrics)
+        if packer is not None
+        else "\n\n".join(relevant_chunks)
+    )
+
     if save_content_to_file:
         with open(f"{query}_relevant_content.md", "w", encoding="utf-8") as f:
-            f.write("\n\n".join(relevant_chunks))
+            f.write(dict_for_template["document"])
 
-    dict_for_template = {
-        "language": language,
-        "question": query,
-        "document": "\n\n".join(relevant_chunks),
-    }
+    return dict_for_template, status
 
-    llm_manager = LLMManager(
-        llm_provider, model_name, temperature, llm_template, has_thinking
+
+def generate_answer(
+    dict_for_template, llm_manager, stream=False, use_cache=True, metrics=None
+):
+    """
+    Generate the answer. With stream the answer is also printed while it is
+    generated, with the time to the first token and the total generation time
+    """
+    print(f"[INFO] Generating answer with model: {llm_manager.model_name}...")
+
+    if not stream:
+        return llm_manager.answer_query(
+            dict_for_template, use_cache=use_cache, metrics=metrics
+        )
+
+    print("\n[OK] Answer:\n")
+    pieces = []
+    for piece in llm_manager.stream_answer(
+        dict_for_template, use_cache=use_cache, metrics=metrics
+    ):
+        print(piece, end="", flush=True)
+        pieces.append(piece)
+    print("\n")
+
+    timings = llm_manager.last_stream_timings
+    print(
+        f"[INFO] Time to first token: {timings['time_to_first_token']:.2f}s, "
+        f"total generation time: {timings['total_time']:.2f}s"
     )
+    return "".join(pieces).strip()
 
-    print(f"[INFO] Generating answer with model: {model_name}...")
 
-    final_answer = llm_manager.answer_query(dict_for_template)
+def execute_answer_using_web(
+    query,
+    max_pages,
+    language,
+    search_engine,
+    retriever,
+    llm_provider,
+    model_name,
+    max_chunk,
+    save_content_to_file,
+    llm_template,
+    temperature,
+    has_thinking,
+    scraper=None,
+    stream=False,
+    llm_manager=None,
+    use_cache=True,
+    metrics=None,
+    knowledge_base_min_confidence=None,
+    dedup=None,
+    packer=None,
+    incremental_stable_pages=None,
+):
+    # returns the answer, the status and the urls of the pages of the chunks used
+    # status is OK or NO_WEB_CONTENT or NO_RELEVANT_CHUNKS or KNOWLEDGE_BASE
+    # metrics (QueryMetrics), if given, receives the timings of every stage
+    # with knowledge_base_min_confidence the knowledge base of the retriever is
+    # searched first, the web is used only if its confidence is lower
+    # dedup (NearDuplicateFilter), if given, drops the near-duplicate pages
+    # packer (ContextPacker), if given, fits the chunks in the context of the model
+    # with incremental_stable_pages every page is searched as soon as it is scraped,
+    # the other pages are skipped once the best chunks do not change for that many
+    # pages (only for the retrievers with start_incremental)
+
+    if scraper is None:
+        scraper = WebScraper()
+    if llm_manager is None:
+        llm_manager = LLMManager(
+            llm_provider, model_name, temperature, llm_template, has_thinking
+        )
+    found = None
+    if knowledge_base_min_confidence is not None:
+        found = search_knowledge_base(
+            query, max_chunk, retriever, knowledge_base_min_confidence, metrics
+        )
+
+    if found is not None:
+        (relevant_chunks, sources), pages, status = found, [], "KNOWLEDGE_BASE"
+    else:
+        search = (
+            retriever.start_incremental(
+                query, max_chunk, incremental_stable_pages, metrics=metrics
+            )
+            if incremental_stable_pages is not None
+            and hasattr(retriever, "start_incremental")
+            else None
+        )
+        pages, status = scrape_query(
+            query,
+            max_pages,
+            language,
+            search_engine,
+            scraper,
+            save_content_to_file,
+            metrics=metrics,
+            dedup=dedup,
+            on_page=search.add_page if search is not None else None,
+        )
+
+        print("[INFO] Finding relevant paragraphs...")
+
+        # the chunks are records pointing into the pages, only the relevant ones
+        # are read
+        records, scored_pages = [], pages
+        if pages and search is not None:
+            # the pages scored by the search, in the order they were scraped
+            records, scored_pages = search.result(), search.pages
+        elif pages:
+            records = retriever.get_relevant_records(
+                "", query, max_chunk, metrics=metrics, pages=pages
+            )
+        relevant_chunks = [chunk_text(record, scored_pages) for record in records]
+        sources = source_urls(records, scored_pages)
+
+    dict_for_template, status = build_template_input(
+        query,
+        language,
+        pages,
+        relevant_chunks,
+        status,
+        save_content_to_file,
+        packer=packer,
+        metrics=metrics,
+    )
+
+    final_answer = generate_answer(
+        dict_for_template,
+        llm_manager,
+        stream=stream,
+        use_cache=use_cache,
+        metrics=metrics,
+    )
+
+    if metrics is not None:
+        metrics.finish(status)
+    return final_answer, status, sources
+
+
+def build_batch_pipeline(language, init, use_cache=True):
+    """
+    Pipeline answering many queries: scraping, retrieval and generation run at the
+    same time on different queries, each stage with its own number of workers.
+    Every query produces (answer, status, sources, metrics), the sources are the
+    same of execute_answer_using_web
+    """
+    cfg = init["config"]
+    pipeline_cfg = cfg.get("pipeline", {})
+    save_content_to_file = cfg.get("save_content_to_file", False)
+
+    def scrape(query):
+        print(f"[INFO] Processing: {query}")
+        metrics = QueryMetrics(query)
+        if init.get("knowledge_base_min_confidence") is not None:
+            found = search_knowledge_base(
+                query,
+                cfg["max_chunk"],
+                init["retrieval"],
+                init["knowledge_base_min_confidence"],
+                metrics,
+            )
+            if found is not None:
+                return {
+                    "query": query,
+                    "pages": [],
+                    "relevant_chunks": found[0],
+                    "sources": found[1],
+                    "status": "KNOWLEDGE_BASE",
+                    "metrics": metrics,
+                }
+
+        pages, status = scrape_query(
+            query,
+            cfg["max_pages"],
+            language,
+            cfg["search_engine"],
+            init["scraper"],
+            save_content_to_file,
+            metrics=metrics,
+            dedup=init.get("dedup"),
+        )
+        return {
+            "query": query,
+            "pages": pages,
+            "status": status,
+            "metrics": metrics,
+        }
+
+    def retrieve(items):
+        with_content = [item for item in items if item["pages"]]
+        print(f"[INFO] Finding relevant paragraphs for {len(with_content)} queries...")
+        records_per_item = init["retrieval"].get_relevant_records_batch(
+            [("", item["query"]) for item in with_content],
+            cfg["max_chunk"],
+            batch_size=cfg.get("embedding_batch_size", 32),
+            metrics=[item["metrics"] for item in with_content],
+            pages=[item["pages"] for item in with_content],
+        )
+        for item, records in zip(with_content, records_per_item):
+            item["relevant_chunks"] = [
+                chunk_text(record, item["pages"]) for record in records
+            ]
+            item["sources"] = source_urls(records, item["pages"])
+        return items
+
+    def generate(item):
+        dict_for_template, status = build_template_input(
+            item["query"],
+            language,
+            item["pages"],
+            item.get("relevant_chunks", [""]),
+            item["status"],
+            save_content_to_file,
+            packer=init.get("packer"),
+            metrics=item["metrics"],
+        )
+        answer = generate_answer(
+            dict_for_template,
+            init["llm_manager"],
+            use_cache=use_cache,
+            metrics=item["metrics"],
+        )
+        item["metrics"].finish(status)
+        return answer, status, item.get("sources", []), item["metrics"]
 
-    return final_answer, status
+    return StagedPipeline(
+        [
+            Stage("scrape", scrape, concurrency=pipeline_cfg.get("scrape_workers", 2)),
+            Stage(
+                "retrieval",
+                retrieve,
+                concurrency=pipeline_cfg.get("retrieval_workers", 1),
+                batch_size=cfg.get("retrieval_batch_size", 16),
+            ),
+            Stage(
+                "generation",
+                generate,
+                concurrency=init["llm_manager"].max_in_flight,
+            ),
+        ],
+        queue_size=pipeline_cfg.get("queue_size", 8),
+    )
 
 
-def answer_using_web(config_path, query, language, list_languages):
-    scraper = WebScraper()
+def execute_answer_using_web_batch(queries, language, init, use_cache=True):
+    """
+    Answer many queries with the batch pipeline.
+    Returns the (answer, status, sources, metrics) of every query, in the same order
+    """
+    results = []
+    pipeline = build_batch_pipeline(language, init, use_cache=use_cache)
+    for _, result in pipeline.run(queries):
+        if isinstance(result, StageError):
+            raise result.error
+        results.append(result)
+    return results
 
+
+def answer_using_web(
+    config_path, query, language, list_languages, stream=False, use_cache=True
+):
     if list_languages:
+        scraper = WebScraper()
         scraper.print_ddg_supported_languages()
         scraper.print_google_supported_languages()
         return "List of supported languages printed."
 
     init = init_components(config_path)
     cfg = init["config"]
+    metrics = QueryMetrics(query)
 
-    final_answer, status = execute_answer_using_web(
-        query=query,
-        max_pages=cfg["max_pages"],
-        language=language,
-        search_engine=cfg["search_engine"],
-        retriever=init["retrieval"],
-        llm_provider=cfg["llm_provider"],
-        model_name=cfg["final_answer_model"],
-        max_chunk=cfg["max_chunk"],
-        save_content_to_file=cfg.get("save_content_to_file", False),
-        llm_template=cfg["llm_template"],
-        temperature=init["temperature"],
-        has_thinking=init["has_thinking"],
-    )
+    try:
+        final_answer, status, sources = execute_answer_using_web(
+            query=query,
+            max_pages=cfg["max_pages"],
+            language=language,
+            search_engine=cfg["search_engine"],
+            retriever=init["retrieval"],
+            llm_provider=cfg["llm_provider"],
+            model_name=cfg["final_answer_model"],
+            max_chunk=cfg["max_chunk"],
+            save_content_to_file=cfg.get("save_content_to_file", False),
+            llm_template=cfg["llm_template"],
+            temperature=init["temperature"],
+            has_thinking=init["has_thinking"],
+            scraper=init["scraper"],
+            stream=stream,
+            llm_manager=init["llm_manager"],
+            use_cache=use_cache,
+            metrics=metrics,
+            knowledge_base_min_confidence=init["knowledge_base_min_confidence"],
+            dedup=init["dedup"],
+            packer=init["packer"],
+            incremental_stable_pages=init["incremental_stable_pages"],
+        )
+    finally:
+        close_components(init)
+
+    prometheus_path = cfg.get("metrics", {}).get("prometheus_path")
+    if prometheus_path:
+        registry = MetricsRegistry()
+        registry.observe(metrics)
+        registry.write_prometheus(prometheus_path)
 
     return {
         "final_answer": final_answer,
         "status": status,
+        "sources": sources,
+        "metrics": metrics.to_dict(),
     }
 
 
-def handle_batch_mode():
+def format_metrics_row(metrics):
+    """Metrics columns of the csv of the batch mode, see METRICS_COLUMNS"""
+    row = metrics.to_row() if metrics is not None else {}
+    return CSV_SEPARATOR.join(str(row.get(column, "")) for column in METRICS_COLUMNS)
+
+
+def handle_batch_mode(use_cache=True):
     print("[INFO] Batch mode enabled.")
 
     language = (
@@ -201,31 +801,51 @@ def handle_batch_mode():
 
     init = init_components(CONFIG_FILE)
     cfg = init["config"]
+    scraper = init["scraper"]
+    if scraper.browser_pool is not None:
+        print("[INFO] Starting the browser pool...")
+        scraper.browser_pool.warm_up()
 
     output_file = input_file.replace(".txt", "_answers.csv")
 
+    metrics_cfg = cfg.get("metrics", {})
+    metrics_format = metrics_cfg.get("batch_format", "jsonl")
+    if metrics_format not in SUPPORTED_METRICS_FORMATS:
+        print(f"[WARNING] Unsupported metrics format: {metrics_format}, using none.")
+        metrics_format = "none"
+    metrics_file = input_file.replace(".txt", "_metrics.jsonl")
+    registry = MetricsRegistry()
+
     # list of query with warnings
     warning_list = []
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        for q in questions:
-            query = f"{template} {q}" if expand else q
-            print(f"[INFO] Processing: {query}")
-
-            answer, status = execute_answer_using_web(
-                query=query,
-                max_pages=cfg["max_pages"],
-                language=language,
-                search_engine=cfg["search_engine"],
-                retriever=init["retrieval"],
-                llm_provider=cfg["llm_provider"],
-                model_name=cfg["final_answer_model"],
-                max_chunk=cfg["max_chunk"],
-                save_content_to_file=cfg.get("save_content_to_file", False),
-                llm_template=cfg["llm_template"],
-                temperature=init["temperature"],
-                has_thinking=init["has_thinking"],
+    queries = [f"{template} {q}" if expand else q for q in questions]
+    pipeline = build_batch_pipeline(language, init, use_cache=use_cache)
+
+    with (
+        open(output_file, "w", encoding="utf-8") as f,
+        (
+            open(metrics_file, "w", encoding="utf-8")
+            if metrics_format == "jsonl"
+            else nullcontext()
+        ) as metrics_f,
+    ):
+        if metrics_format == "csv":
+            f.write(
+                CSV_SEPARATOR.join(["query", "answer", "sources"] + METRICS_COLUMNS)
+                + "\n"
             )
+
+        for query, result in pipeline.run(queries):
+            if isinstance(result, StageError):
+                answer = ""
+                status = f"ERROR in {result.stage}: {result.error}"
+                sources = []
+                metrics = None
+            else:
+                answer, status, sources, metrics = result
+                registry.observe(metrics)
+
             answer = re.sub(
                 CSV_SEPARATOR, " -", answer
             )  # Replace CSV separator in answer to avoid issues
@@ -235,13 +855,107 @@ def handle_batch_mode():
             else:
                 print(f"[OK] {query} - Answer: {answer}")
 
-            f.write(f"{query}" + CSV_SEPARATOR + f"{answer}\n")
+            row = f"{query}" + CSV_SEPARATOR + f"{answer}"
+            if metrics_format == "csv":
+                if metrics is None:
+                    # keep the error in the status column
+                    metrics = QueryMetrics(query)
+                    metrics.finish(re.sub(CSV_SEPARATOR, " -", status))
+                # a separator in a url is percent-encoded, it does not split the row
+                row += CSV_SEPARATOR + re.sub(CSV_SEPARATOR, "%3B", " ".join(sources))
+                row += CSV_SEPARATOR + format_metrics_row(metrics)
+            f.write(row + "\n")
+
+            if metrics_format == "jsonl":
+                record = (
+                    metrics.to_dict()
+                    if metrics is not None
+                    else {"query": query, "status": status}
+                )
+                record["sources"] = sources
+                metrics_f.write(json.dumps(record) + "\n")
+
+    print("[INFO] Pipeline stats:")
+    print(pipeline.format_stats())
+
+    if metrics_cfg.get("prometheus_path"):
+        registry.write_prometheus(metrics_cfg["prometheus_path"])
+        print(f"[INFO] Prometheus metrics saved to {metrics_cfg['prometheus_path']}")
+
+    if scraper.search_cache is not None:
+        stats = scraper.search_cache.stats()
+        print(
+            f"[INFO] Search cache: {stats['hits']} hits, "
+            f"{stats['negative_hits']} empty hits, {stats['misses']} misses"
+        )
+    if init["llm_manager"].answer_cache is not None:
+        stats = init["llm_manager"].answer_cache.stats()
+        print(f"[INFO] Answer cache: {stats['hits']} hits, {stats['misses']} misses")
+    close_components(init)
 
     if warning_list:
         print("\n[WARNING] Some queries had issues:")
         print("\n".join(warning_list))
 
     print(f"[OK] Answers saved to {output_file}")
+    if metrics_format == "jsonl":
+        print(f"[OK] Metrics saved to {metrics_file}")
+
+
+def handle_serve_mode():
+    """
+    Answer the questions sent to a local JSON HTTP API, see pipeline/answer_server.py.
+    The components are built once, so the embedding model, the browsers and the LLM
+    stay loaded between questions
+    """
+    init = init_components(CONFIG_FILE)
+    cfg = init["config"]
+    server_cfg = cfg.get("server", {})
+    if init["scraper"].browser_pool is not None:
+        print("[INFO] Starting the browser pool...")
+        init["scraper"].browser_pool.warm_up()
+
+    def answer(query, language, use_cache, metrics):
+        print(f"[INFO] Processing: {query}")
+        return execute_answer_using_web(
+            query=query,
+            max_pages=cfg["max_pages"],
+            language=language,
+            search_engine=cfg["search_engine"],
+            retriever=init["retrieval"],
+            llm_provider=cfg["llm_provider"],
+            model_name=cfg["final_answer_model"],
+            max_chunk=cfg["max_chunk"],
+            save_content_to_file=cfg.get("save_content_to_file", False),
+            llm_template=cfg["llm_template"],
+            temperature=init["temperature"],
+            has_thinking=init["has_thinking"],
+            scraper=init["scraper"],
+            llm_manager=init["llm_manager"],
+            use_cache=use_cache,
+            metrics=metrics,
+            knowledge_base_min_confidence=init["knowledge_base_min_confidence"],
+            dedup=init["dedup"],
+            packer=init["packer"],
+            incremental_stable_pages=init["incremental_stable_pages"],
+        )
+
+    server = AnswerServer(
+        answer,
+        host=server_cfg.get("host", "127.0.0.1"),
+        port=server_cfg.get("port", 8765),
+        workers=server_cfg.get("workers", 2),
+        queue_size=server_cfg.get("queue_size", 16),
+        timeout=server_cfg.get("timeout", 120),
+        max_abandoned=server_cfg.get("max_abandoned"),
+    )
+    print(f"[OK] Serving on {server.base_url}/answer, press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[INFO] Server stopped.")
+    finally:
+        close_components(init)
 
 
 if __name__ == "__main__":
@@ -256,16 +970,57 @@ if __name__ == "__main__":
         "--list-language", action="store_true", help="List supported languages."
     )
     parser.add_argument("-b", "--batch", action="store_true", help="Enable batch mode.")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Answer the questions sent to a local HTTP API.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not reuse cached answers, generate them again.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer while it is generated.",
+    )
     args = parser.parse_args()
 
     if args.batch:
-        handle_batch_mode()
+        handle_batch_mode(use_cache=not args.no_cache)
+    elif args.serve:
+        handle_serve_mode()
     elif not args.q and not args.list_language:
         print("[ERROR] Please provide a question with -q")
         exit(1)
     else:
-        answer = answer_using_web(CONFIG_FILE, args.q, args.l, args.list_language)
+        answer = answer_using_web(
+            CONFIG_FILE,
+            args.q,
+            args.l,
+            args.list_language,
+            stream=args.stream,
+            use_cache=not args.no_cache,
+        )
         if not args.list_language:
-            print(f"\n[OK] Final answer with status {answer['status']}:\n")
-            print(answer["final_answer"])
+            if args.stream:
+                # the answer has already been printed while generated
+                print(f"[OK] Final answer with status {answer['status']}")
+            else:
+                print(f"\n[OK] Final answer with status {answer['status']}:\n")
+                print(answer["final_answer"])
+            if answer["sources"]:
+                print("\n[INFO] Sources:")
+                print("\n".join(f"- {url}" for url in answer["sources"]))
+            durations = answer["metrics"]["durations"]
+            timings = ", ".join(
+                f"{stage} {durations[stage]:.2f}s"
+                for stage in STAGES
+                if stage in durations
+            )
+            print(
+                f"\n[INFO] Timings: {timings} "
+                f"(total {answer['metrics']['total_seconds']:.2f}s)"
+            )
             print("\n[INFO] Done.")
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench.bench_retrieval_modes import load_document
+from bench.local_web import FIXTURES_DIR, PAGES_DIR
+from retrieve.chunking import PageChunker
+from retrieve.embedding_backend import EmbeddingBackend
+
+"""
+Compare the variants of the embedding model (see retrieve/embedding_backend.py)
+on a fixed corpus: the chunks of the fixture pages and the fixture questions.
+For every variant: time to load the model, chunks encoded per second and recall,
+the share of the top --max-chunk chunks of every question found by the reference
+variant (the first one, torch/fp32 by default) that the variant also finds.
+A variant is backend/precision or backend/precision/truncate_dim, every variant
+runs in its own process.
+
+    python -m bench.bench_embedding_backends --threads 4
+    python -m bench.bench_embedding_backends --variants torch/fp32 torch/fp32/256
+"""
+
+DEFAULT_VARIANTS: list[str] = [
+    "torch/fp32",
+    "torch/int8",
+    "onnx/fp32",
+    "onnx/int8",
+    "torch/fp32/256",
+]
+
+
+def load_corpus(pages_dir: str, questions_path: str) -> tuple[list[str], list[str]]:
+    # same chunks of the retrievers
+    document: str = load_document(pages_dir)
+    chunks: list[str] = [
+        document[record.start : record.end]
+        for record in PageChunker(chunk_size=800, chunk_overlap=50).iter_chunks(
+            document
+        )
+    ]
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions: list[str] = [line.strip() for line in f if line.strip()]
+    return chunks, questions
+
+
+def parse_variant(variant: str, threads: int) -> EmbeddingBackend:
+    parts: list[str] = variant.split("/")
+    return EmbeddingBackend(
+        backend=parts[0],
+        precision=parts[1] if len(parts) > 1 else "fp32",
+        threads=threads,
+        truncate_dim=int(parts[2]) if len(parts) > 2 else None,
+    )
+
+
+def run_variant(args: argparse.Namespace) -> dict:
+    """Measure one variant, called in a separate process"""
+    import torch
+
+    chunks, questions = load_corpus(args.pages, args.questions)
+    backend: EmbeddingBackend = parse_variant(args.worker, args.threads)
+
+    start: float = time.perf_counter()
+    embedder = backend.load(args.embedding_model)
+    load_seconds: float = time.perf_counter() - start
+    embedder.encode_document(chunks[: args.batch_size], batch_size=args.batch_size)
+
+    best: float = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        chunks_embeddings = embedder.encode_document(
+            chunks, batch_size=args.batch_size, convert_to_tensor=True
+        )
+        best = min(best, time.perf_counter() - start)
+
+    queries_embeddings = embedder.encode_query(
+        questions, batch_size=args.batch_size, convert_to_tensor=True
+    )
+    scores = embedder.similarity(queries_embeddings, chunks_embeddings)
+    top_k: int = min(args.max_chunk, len(chunks))
+    top: list[list[int]] = torch.topk(scores, k=top_k, dim=1).indices.tolist()
+
+    return {
+        "variant": args.worker,
+        "dim": int(chunks_embeddings.shape[1]),
+        "chunks": len(chunks),
+        "load_seconds": load_seconds,
+        "chunks_per_second": len(chunks) / best,
+        "top": top,
+    }
+
+
+def recall(reference: list[list[int]], results: list[list[int]]) -> float:
+    expected: int = sum(len(top) for top in reference)
+    if not expected:
+        return 1.0
+    found: int = sum(
+        len(set(top) & set(other)) for top, other in zip(reference, results)
+    )
+    return found / expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embedding backends.")
+    parser.add_argument("--variants", type=str, nargs="+", default=DEFAULT_VARIANTS)
+    parser.add_argument("--pages", type=str, default=PAGES_DIR)
+    parser.add_argument(
+        "--questions",
+        type=str,
+        default=os.path.join(FIXTURES_DIR, "questions.txt"),
+    )
+    parser.add_argument(
+        "--embedding-model", type=str, default="Qwen/Qwen3-Embedding-0.6B"
+    )
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-chunk", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_variant(args)))
+        sys.exit(0)
+
+    options: list[str] = [
+        "--pages",
+        args.pages,
+        "--questions",
+        args.questions,
+        "--embedding-model",
+        args.embedding_model,
+        "--threads",
+        str(args.threads),
+        "--batch-size",
+        str(args.batch_size),
+        "--max-chunk",
+        str(args.max_chunk),
+        "--repeat",
+        str(args.repeat),
+    ]
+    runs: list[dict] = []
+    for variant in args.variants:
+        output: subprocess.CompletedProcess = subprocess.run(
+            [sys.executable, "-m", "bench.bench_embedding_backends", "--worker"]
+            + [variant]
+            + options,
+            capture_output=True,
+            text=True,
+        )
+        if output.returncode != 0:
+            error: str = (output.stderr.strip().splitlines() or ["unknown error"])[-1]
+            print(f"[WARNING] {variant} failed, skipped: {error}")
+            continue
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    if not runs:
+        print("[ERROR] No variant could run.")
+        sys.exit(1)
+
+    reference: dict = runs[0]
+    for run in runs:
+        speedup: float = run["chunks_per_second"] / reference["chunks_per_second"]
+        print(
+            f"[OK] {run['variant']} ({run['dim']}d): "
+            f"{run['chunks_per_second']:.1f} chunks/s ({speedup:.2f}x), "
+            f"recall@{args.max_chunk} {recall(reference['top'], run['top']):.2f} "
+            f"vs {reference['variant']}, load {run['load_seconds']:.1f}s"
+        )
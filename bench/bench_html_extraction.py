@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from bench.local_web import PAGES_DIR
+from web.html_extraction import SUPPORTED_HTML_ENGINES, get_extractor
+
+"""
+Compare the html engines of web/html_extraction.py on a large page: time to get
+the Wikipedia paragraphs, the text of the page and the DuckDuckGo results, and
+the memory needed to get the paragraphs. "full_tree" is the code used before the
+engines: a whole BeautifulSoup tree built with html.parser, the reference of the
+speedup.
+Every engine runs in its own process, so the peak memory of one engine does not
+hide the others. The page is built from the fixture pages, repeated with the
+menus, tables and scripts of a real Wikipedia page, until it is --size-mb large.
+
+    python -m bench.bench_html_extraction --size-mb 5
+"""
+
+SKIPPED_TAGS: list[str] = ["script", "style", "nav", "header", "footer", "aside"]
+
+
+class FullTreeExtractor:
+    name: str = "full_tree"
+
+    def get_paragraphs(self, html: str) -> list[str]:
+        soup = BeautifulSoup(html, "html.parser")
+        return [
+            text
+            for block in soup.find_all(["p", "dd"])
+            if (text := block.get_text(strip=False))
+        ]
+
+    def get_text(self, html: str, skipped_tags: list[str]) -> str:
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup(skipped_tags):
+            tag.decompose()
+        return (soup.find("main") or soup.body or soup).get_text("\n")
+
+    def get_ddg_results(self, html: str, max_results: int) -> list[str]:
+        soup = BeautifulSoup(html, "html.parser")
+        return [
+            i.find("a", {"class": "result__url"}).get("href")
+            for i in soup.find_all("div", {"class": "links_main"})
+        ][:max_results]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    to_mb: float = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / to_mb
+
+
+def build_page(size_mb: float) -> str:
+    """A Wikipedia-like page of about size_mb megabytes"""
+    rng: random.Random = random.Random(0)
+    sections: list[str] = []
+    for file_name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, file_name), "r", encoding="utf-8") as f:
+            sections.append(f.read())
+
+    parts: list[str] = ["<html><head><style>body { margin: 0 }</style></head><body>"]
+    size: int = 0
+    while size < size_mb * 1024 * 1024:
+        section: str = rng.choice(sections)
+        filler: str = "".join(
+            f"<tr><td>{rng.random()}</td><td><a href='/wiki/{n}'>{n}</a></td></tr>"
+            for n in range(20)
+        )
+        part: str = (
+            "<nav><ul>"
+            + "".join(f"<li><a href='/wiki/{n}'>item {n}</a></li>" for n in range(30))
+            + "</ul></nav>"
+            + f"<div class='mw-content'>{section}<table>{filler}</table>"
+            + "<dl><dt>term</dt><dd>a definition <b>with</b> markup</dd></dl>"
+            + "<script>var data = {'key': 'value'};</script></div>"
+        )
+        parts.append(part)
+        size += len(part)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def build_ddg_page(results: int) -> str:
+    blocks: list[str] = []
+    for n in range(results):
+        url: str = f"https://example.com/page/{n}"
+        blocks.append(
+            '<div class="result results_links web-result">'
+            '<div class="links_main links_deep result__body">'
+            f'<h2 class="result__title"><a class="result__a" href="{url}">'
+            f"Result {n}</a></h2>"
+            f'<a class="result__snippet" href="{url}">Snippet of the result {n}</a>'
+            f'<a class="result__url" href="{url}">{url}</a></div></div>'
+        )
+    return f"<html><body>{''.join(blocks)}</body></html>"
+
+
+def best_time(function, repeat: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_engine(engine: str, size_mb: float, repeat: int) -> dict:
+    """Measure one engine, called in a separate process"""
+    extractor = FullTreeExtractor() if engine == "full_tree" else get_extractor(engine)
+    page: str = build_page(size_mb)
+    ddg_page: str = build_ddg_page(30)
+
+    # the memory is measured first, before the other calls raise the peak
+    rss_before: float = peak_rss_mb()
+    paragraphs: list[str] = extractor.get_paragraphs(page)
+    rss_after: float = peak_rss_mb()
+
+    return {
+        "engine": extractor.name,
+        "page_mb": round(len(page.encode("utf-8")) / 1024 / 1024, 2),
+        "paragraphs": len(paragraphs),
+        "paragraphs_chars": sum(len(text) for text in paragraphs),
+        "paragraphs_seconds": best_time(
+            lambda: extractor.get_paragraphs(page), repeat
+        ),
+        "text_seconds": best_time(
+            lambda: extractor.get_text(page, SKIPPED_TAGS), repeat
+        ),
+        "ddg_seconds": best_time(
+            lambda: extractor.get_ddg_results(ddg_page, 10), repeat * 10
+        ),
+        "paragraphs_peak_mb": round(rss_after - rss_before, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the html engines.")
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--engines",
+        type=str,
+        nargs="+",
+        default=["full_tree"]
+        + [engine for engine in SUPPORTED_HTML_ENGINES if engine != "auto"],
+    )
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_engine(args.worker, args.size_mb, args.repeat)))
+        sys.exit(0)
+
+    runs: list[dict] = []
+    for engine in args.engines:
+        output: subprocess.CompletedProcess = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "bench.bench_html_extraction",
+                "--worker",
+                engine,
+                "--size-mb",
+                str(args.size_mb),
+                "--repeat",
+                str(args.repeat),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        run: dict = json.loads(output.stdout.strip().splitlines()[-1])
+        if run["engine"] != engine:
+            print(f"[WARNING] {engine} is not installed, skipped.")
+            continue
+        runs.append(run)
+
+    baseline: dict = next((run for run in runs if run["engine"] == "full_tree"), None)
+    for run in runs:
+        speedup: str = (
+            f" ({baseline['paragraphs_seconds'] / run['paragraphs_seconds']:.1f}x)"
+            if baseline
+            else ""
+        )
+        print(
+            f"[OK] {run['engine']} on {run['page_mb']}MB: "
+            f"paragraphs {run['paragraphs_seconds'] * 1000:.0f}ms{speedup} "
+            f"using {run['paragraphs_peak_mb']}MB, "
+            f"text {run['text_seconds'] * 1000:.0f}ms, "
+            f"ddg results {run['ddg_seconds'] * 1000:.2f}ms, "
+            f"{run['paragraphs']} paragraphs ({run['paragraphs_chars']} chars)"
+        )
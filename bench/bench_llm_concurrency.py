@@ -0,0 +1,94 @@
+import argparse
+import time
+
+from bench.fake_ollama import FakeOllamaServer
+from llm.llm_manager import LLMManager
+
+"""
+Throughput of LLMManager.answer_queries against the fake Ollama server, for an
+increasing number of requests in flight.
+
+    python -m bench.bench_llm_concurrency --parallel 4 --requests 32
+"""
+
+TEMPLATE: str = (
+    "Answer in {language}.\n\nQUESTION:\n{question}\n\nDOCUMENT:\n{document}"
+)
+
+
+def run(
+    requests: int,
+    parallel: int,
+    in_flight_values: list[int],
+    prefill_latency: float,
+    token_latency: float,
+    failure_rate: float,
+) -> list[dict]:
+    results: list[dict] = []
+    with FakeOllamaServer(
+        prefill_latency=prefill_latency,
+        token_latency=token_latency,
+        parallel=parallel,
+        failure_rate=failure_rate,
+    ) as server:
+        for in_flight in in_flight_values:
+            manager: LLMManager = LLMManager(
+                "ollama",
+                "fake",
+                0.3,
+                TEMPLATE,
+                False,
+                base_url=server.base_url,
+                max_in_flight=in_flight,
+                max_retries=5,
+                retry_backoff=0.05,
+            )
+            dicts: list[dict[str, str]] = [
+                {"language": "english", "question": f"question {i}", "document": ""}
+                for i in range(requests)
+            ]
+
+            start: float = time.perf_counter()
+            answers: list[str] = manager.answer_queries(dicts)
+            elapsed: float = time.perf_counter() - start
+
+            assert len(answers) == requests and all(answers)
+            results.append(
+                {
+                    "in_flight": in_flight,
+                    "seconds": round(elapsed, 3),
+                    "requests_per_second": round(requests / elapsed, 2),
+                }
+            )
+            print(
+                f"[OK] in flight {in_flight}: {elapsed:.2f}s, "
+                f"{requests / elapsed:.2f} requests/s"
+            )
+
+        print(
+            f"[INFO] Server: {server.requests} requests, {server.failures} failures, "
+            f"max {server.max_in_flight} generating together"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent LLM requests.")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument(
+        "--parallel", type=int, default=4, help="OLLAMA_NUM_PARALLEL of the server."
+    )
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--prefill-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    run(
+        args.requests,
+        args.parallel,
+        args.in_flight,
+        args.prefill_latency,
+        args.token_latency,
+        args.failure_rate,
+    )
@@ -0,0 +1,116 @@
+import argparse
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from bench.local_web import FIXTURES_DIR, PAGES_DIR
+from pipeline.metrics import QueryMetrics
+from retrieve.bm25_retrieval import BM25Retriever
+from retrieve.st_retrieval import SentenceTransformerRetriever
+
+"""
+Compare the retrieval modes on the same documents: time, chunks encoded by the
+embedding model and how many of the chunks chosen by sentence_transformers are
+also chosen by hybrid and bm25 (recall).
+Every question gets all the pages together, the other pages act as noise; use
+--pages with a folder of .html/.md/.txt files to test larger pages.
+
+    python -m bench.bench_retrieval_modes --candidates 5 10 50
+"""
+
+
+def load_document(pages_dir: str) -> str:
+    texts: list[str] = []
+    for file_name in sorted(os.listdir(pages_dir)):
+        path: str = os.path.join(pages_dir, file_name)
+        with open(path, "r", encoding="utf-8") as f:
+            content: str = f.read()
+        if file_name.endswith(".html"):
+            texts.append(BeautifulSoup(content, "html.parser").get_text("\n"))
+        elif file_name.endswith((".md", ".txt")):
+            texts.append(content)
+    return "\n\n".join(texts)
+
+
+def run_mode(name, retriever, document, questions, max_chunk) -> dict:
+    results: list[list[str]] = []
+    encoded: int = 0
+    start: float = time.perf_counter()
+    for question in questions:
+        metrics: QueryMetrics = QueryMetrics(question)
+        results.append(
+            retriever.get_relevant_chunks(document, question, max_chunk, metrics)
+        )
+        if not isinstance(retriever, BM25Retriever):
+            encoded += metrics.counters.get(
+                "candidate_chunks", metrics.counters.get("chunks", 0)
+            )
+    elapsed: float = time.perf_counter() - start
+    return {
+        "mode": name,
+        "seconds": elapsed,
+        "chunks_encoded": encoded,
+        "results": results,
+    }
+
+
+def recall(reference: list[list[str]], results: list[list[str]]) -> float:
+    expected: int = sum(len(chunks) for chunks in reference)
+    if not expected:
+        return 1.0
+    found: int = sum(
+        len(set(chunks) & set(other)) for chunks, other in zip(reference, results)
+    )
+    return found / expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval modes.")
+    parser.add_argument("--pages", type=str, default=PAGES_DIR)
+    parser.add_argument(
+        "--questions",
+        type=str,
+        default=os.path.join(FIXTURES_DIR, "questions.txt"),
+    )
+    parser.add_argument(
+        "--embedding-model", type=str, default="Qwen/Qwen3-Embedding-0.6B"
+    )
+    parser.add_argument("--max-chunk", type=int, default=5)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 50])
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions: list[str] = [line.strip() for line in f if line.strip()]
+    document: str = load_document(args.pages)
+
+    runs: list[dict] = [
+        run_mode(
+            "sentence_transformers",
+            SentenceTransformerRetriever(args.embedding_model),
+            document,
+            questions,
+            args.max_chunk,
+        )
+    ]
+    for candidates in args.candidates:
+        runs.append(
+            run_mode(
+                f"hybrid ({candidates} candidates)",
+                SentenceTransformerRetriever(
+                    args.embedding_model, lexical_candidates=candidates
+                ),
+                document,
+                questions,
+                args.max_chunk,
+            )
+        )
+    runs.append(run_mode("bm25", BM25Retriever(), document, questions, args.max_chunk))
+
+    reference: list[list[str]] = runs[0]["results"]
+    for run in runs:
+        print(
+            f"[OK] {run['mode']}: {run['seconds']:.2f}s, "
+            f"{run['chunks_encoded']} chunks encoded, "
+            f"recall {recall(reference, run['results']):.2f}"
+        )
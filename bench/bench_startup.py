@@ -0,0 +1,179 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.fake_ollama import FakeOllamaServer
+from bench.local_web import LocalWebServer
+
+"""
+Startup time of the CLI. Every measure runs in a new process, so nothing is
+already imported:
+- import: `import answer_using_web`, with the slowest modules it imports
+- list: `python answer_using_web.py --list-language`
+- query: a single question, like `-q`, from the start of the process to the
+  answer, with the embedding model and the LLM chain loaded before the search
+  (eager) or while searching (background). The search engine and the pages are
+  served by bench/local_web.py, the LLM by bench/fake_ollama.py, the caches are
+  disabled.
+
+    python -m bench.bench_startup --repeat 3
+"""
+
+QUESTION: str = "What is SQLite?"
+
+
+def run_query_worker(ddg_url: str, ollama_url: str, eager: bool) -> dict:
+    """One cold -q query, called in a separate process"""
+    start: float = time.perf_counter()
+    import answer_using_web as app
+    from pipeline.metrics import QueryMetrics
+
+    import_seconds: float = time.perf_counter() - start
+
+    config: dict = app.parse_config_json(app.CONFIG_FILE)
+    config["search_engine"] = "ddg_custom"
+    config["ddg_custom_url"] = ddg_url
+    config["ollama_base_url"] = ollama_url
+    config["max_pages"] = 1
+    config["save_content_to_file"] = False
+    for section in [
+        "page_cache",
+        "search_cache",
+        "embedding_cache",
+        "answer_cache",
+        "knowledge_base",
+    ]:
+        config[section] = {**config.get(section, {}), "enabled": False}
+    # remember the domains only in memory
+    config["http_fetch"] = {**config.get("http_fetch", {}), "domain_memory_path": ""}
+
+    start = time.perf_counter()
+    init: dict = app.init_components_from_config(config, load_in_background=not eager)
+    init_seconds: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cfg: dict = init["config"]
+    _, status, _ = app.execute_answer_using_web(
+        query=QUESTION,
+        max_pages=cfg["max_pages"],
+        language="english",
+        search_engine=cfg["search_engine"],
+        retriever=init["retrieval"],
+        llm_provider=cfg["llm_provider"],
+        model_name=cfg["final_answer_model"],
+        max_chunk=cfg["max_chunk"],
+        save_content_to_file=False,
+        llm_template=cfg["llm_template"],
+        temperature=init["temperature"],
+        has_thinking=init["has_thinking"],
+        scraper=init["scraper"],
+        llm_manager=init["llm_manager"],
+        metrics=QueryMetrics(QUESTION),
+        dedup=init["dedup"],
+        packer=init["packer"],
+        incremental_stable_pages=init["incremental_stable_pages"],
+    )
+    answer_seconds: float = time.perf_counter() - start
+    app.close_components(init)
+
+    return {
+        "status": status,
+        "import_seconds": import_seconds,
+        "init_seconds": init_seconds,
+        "answer_seconds": answer_seconds,
+    }
+
+
+def timed_run(command: list[str]) -> tuple[float, str]:
+    """Wall time of the command and its last line of output"""
+    start: float = time.perf_counter()
+    output: subprocess.CompletedProcess = subprocess.run(
+        command, capture_output=True, text=True
+    )
+    seconds: float = time.perf_counter() - start
+    if output.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{output.stderr}")
+    lines: list[str] = output.stdout.strip().splitlines()
+    return seconds, lines[-1] if lines else ""
+
+
+def slowest_imports(module: str, count: int = 5) -> list[tuple[str, float]]:
+    """The modules imported directly by module that took longer, with -X importtime"""
+    output: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    imports: list[tuple[str, float]] = []
+    for line in output.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts: list[str] = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name: str = parts[2].rstrip()
+        # the modules imported by module have two more spaces than it
+        if len(name) - len(name.lstrip()) != 3:
+            continue
+        imports.append((name.strip(), int(parts[1]) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the startup time.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-query", action="store_true")
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_query_worker(*args.worker, eager=args.eager)))
+        sys.exit(0)
+
+    import_times: list[float] = [
+        timed_run([sys.executable, "-c", "import answer_using_web"])[0]
+        for _ in range(args.repeat)
+    ]
+    print(f"[OK] import answer_using_web: {statistics.median(import_times):.2f}s")
+    for name, seconds in slowest_imports("answer_using_web"):
+        print(f"    {name}: {seconds:.2f}s")
+
+    list_times: list[float] = [
+        timed_run([sys.executable, "answer_using_web.py", "--list-language"])[0]
+        for _ in range(args.repeat)
+    ]
+    print(f"[OK] --list-language: {statistics.median(list_times):.2f}s")
+
+    if args.skip_query:
+        sys.exit(0)
+
+    with LocalWebServer() as web, FakeOllamaServer() as llm:
+        for mode in ["eager", "background"]:
+            runs: list[dict] = []
+            for _ in range(args.repeat):
+                command: list[str] = [
+                    sys.executable,
+                    "-m",
+                    "bench.bench_startup",
+                    "--worker",
+                    web.ddg_url,
+                    llm.base_url,
+                ]
+                seconds, line = timed_run(
+                    command + ["--eager"] if mode == "eager" else command
+                )
+                runs.append({**json.loads(line), "seconds": seconds})
+
+            def median(key: str) -> float:
+                return statistics.median(run[key] for run in runs)
+
+            print(
+                f"[OK] -q with {mode} loading: {median('seconds'):.2f}s "
+                f"(import {median('import_seconds'):.2f}s, "
+                f"init {median('init_seconds'):.2f}s, "
+                f"answer {median('answer_seconds'):.2f}s), "
+                f"status {runs[-1]['status']}"
+            )
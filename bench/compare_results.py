@@ -0,0 +1,61 @@
+import argparse
+import json
+
+"""
+Compare two result files of bench/run_benchmark.py (before and after a change).
+
+    python -m bench.compare_results before.json after.json
+"""
+
+
+def delta(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before: dict, after: dict) -> None:
+    print(f"[INFO] {before.get('git_commit', '?')} -> {after.get('git_commit', '?')}")
+    for mode in ("single", "batch"):
+        if mode not in before or mode not in after:
+            continue
+        old, new = before[mode], after[mode]
+        print(
+            f"\n{mode}: {old['questions_per_second']:.2f} -> "
+            f"{new['questions_per_second']:.2f} questions/s "
+            f"({delta(old['questions_per_second'], new['questions_per_second'])})"
+        )
+
+        old_stages: dict = dict(old["stages"])
+        new_stages: dict = dict(new["stages"])
+        if "end_to_end" in old and "end_to_end" in new:
+            old_stages["end_to_end"] = old["end_to_end"]
+            new_stages["end_to_end"] = new["end_to_end"]
+        for stage in old_stages.keys() & new_stages.keys():
+            for key in ("p50", "p95"):
+                print(
+                    f"  {stage} {key}: {old_stages[stage][key]:.3f}s -> "
+                    f"{new_stages[stage][key]:.3f}s "
+                    f"({delta(old_stages[stage][key], new_stages[stage][key])})"
+                )
+
+    for process in ("self", "children"):
+        old_rss: float = before["peak_rss_mb"][process]
+        new_rss: float = after["peak_rss_mb"][process]
+        print(
+            f"peak RSS {process}: {old_rss:.0f} -> {new_rss:.0f} MB "
+            f"({delta(old_rss, new_rss)})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark results.")
+    parser.add_argument("before", type=str)
+    parser.add_argument("after", type=str)
+    args = parser.parse_args()
+
+    with open(args.before, "r", encoding="utf-8") as f:
+        before_results: dict = json.load(f)
+    with open(args.after, "r", encoding="utf-8") as f:
+        after_results: dict = json.load(f)
+    compare(before_results, after_results)
@@ -0,0 +1,215 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+Minimal stand-in of the Ollama HTTP API (/api/generate, /api/chat, /api/tags),
+answering with a fixed text after a configurable latency.
+It is used to measure the throughput of the tool without a real model:
+parallel limits how many requests are generated at the same time, like
+OLLAMA_NUM_PARALLEL, the other requests wait in queue.
+"""
+
+
+class FakeOllamaServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        prefill_latency: float = 0.2,
+        token_latency: float = 0.01,
+        answer: str = "This is a fake answer generated for benchmarking purposes.",
+        parallel: int = 1,
+        failure_rate: float = 0.0,
+    ) -> None:
+        """
+        Every request waits prefill_latency seconds, then returns the words of answer
+        one every token_latency seconds. A share failure_rate of the requests fails
+        with 503 before the generation, to test the retries.
+        port=0 picks a free port, see base_url
+        """
+        self.prefill_latency: float = prefill_latency
+        self.token_latency: float = token_latency
+        self.answer: str = answer
+        self.failure_rate: float = failure_rate
+        self.slots: threading.Semaphore = threading.Semaphore(parallel)
+
+        self.requests: int = 0
+        self.failures: int = 0
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+        server = self
+
+        class Handler(_FakeOllamaHandler):
+            fake = server
+
+        self.__httpd: ThreadingHTTPServer = ThreadingHTTPServer((host, port), Handler)
+        self.__httpd.daemon_threads = True
+        self.__thread: threading.Thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Serve in a background thread"""
+        self.__thread = threading.Thread(
+            target=self.__httpd.serve_forever, name="fake-ollama", daemon=True
+        )
+        self.__thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.__httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    fake: FakeOllamaServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def __send_json(self, status: int, body: dict) -> None:
+        data: bytes = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self.__send_json(200, {"models": [{"name": "fake", "model": "fake"}]})
+        elif self.path == "/api/version":
+            self.__send_json(200, {"version": "0.0.0-fake"})
+        elif self.path == "/":
+            self.__send_json(200, {"status": "Ollama is running"})
+        else:
+            self.__send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.__send_json(404, {"error": "not found"})
+            return
+
+        length: int = int(self.headers.get("Content-Length", 0))
+        request: dict = json.loads(self.rfile.read(length) or b"{}")
+        fake: FakeOllamaServer = self.fake
+
+        with fake.lock:
+            fake.requests += 1
+            failed: bool = random.random() < fake.failure_rate
+            if failed:
+                fake.failures += 1
+        if failed:
+            self.__send_json(503, {"error": "server busy"})
+            return
+
+        with fake.slots:
+            with fake.lock:
+                fake.in_flight += 1
+                fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+            try:
+                self.__generate(request, chat=self.path == "/api/chat")
+            finally:
+                with fake.lock:
+                    fake.in_flight -= 1
+
+    def __message(self, request: dict, text: str, done: bool, chat: bool) -> dict:
+        message: dict = {
+            "model": request.get("model", "fake"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done,
+        }
+        if chat:
+            message["message"] = {"role": "assistant", "content": text}
+        else:
+            message["response"] = text
+        if done:
+            message["done_reason"] = "stop"
+            message["eval_count"] = len(self.fake.answer.split())
+        return message
+
+    def __generate(self, request: dict, chat: bool) -> None:
+        fake: FakeOllamaServer = self.fake
+        start: float = time.perf_counter()
+        time.sleep(fake.prefill_latency)
+        words: list[str] = fake.answer.split(" ")
+
+        if not request.get("stream", True):
+            time.sleep(fake.token_latency * len(words))
+            body: dict = self.__message(request, fake.answer, True, chat)
+            body["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            self.__send_json(200, body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for i, word in enumerate(words):
+            text: str = word if i == 0 else f" {word}"
+            self.__write_chunk(self.__message(request, text, False, chat))
+            time.sleep(fake.token_latency)
+
+        last: dict = self.__message(request, "", True, chat)
+        last["total_duration"] = int((time.perf_counter() - start) * 1e9)
+        self.__write_chunk(last)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def __write_chunk(self, message: dict) -> None:
+        data: bytes = (json.dumps(message) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument(
+        "--prefill-latency", type=float, default=0.2, help="Seconds before the answer."
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.01, help="Seconds between tokens."
+    )
+    parser.add_argument(
+        "--parallel", type=int, default=1, help="Requests generated together."
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="Share of 503 responses."
+    )
+    args = parser.parse_args()
+
+    fake_server = FakeOllamaServer(
+        host=args.host,
+        port=args.port,
+        prefill_latency=args.prefill_latency,
+        token_latency=args.token_latency,
+        parallel=args.parallel,
+        failure_rate=args.failure_rate,
+    )
+    print(f"[INFO] Fake Ollama listening on {fake_server.base_url}")
+    try:
+        fake_server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Stopped.")
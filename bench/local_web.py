@@ -0,0 +1,162 @@
+import html
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+"""
+Local stand-in of the web used by the offline benchmark:
+- /pages/<name>.html serves the fixture pages of bench/fixtures/pages
+- /html answers like the html endpoint of DuckDuckGo parsed by DuckDuckGoScraper,
+  the results are the fixture pages sharing the most words with the query
+"""
+
+FIXTURES_DIR: str = os.path.join(os.path.dirname(__file__), "fixtures")
+PAGES_DIR: str = os.path.join(FIXTURES_DIR, "pages")
+
+
+def _words(text: str) -> set[str]:
+    return {word for word in re.findall(r"\w+", text.lower()) if len(word) > 2}
+
+
+class LocalWebServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        page_latency: float = 0.0,
+        search_latency: float = 0.0,
+    ) -> None:
+        """
+        page_latency and search_latency (seconds) simulate the network delay.
+        port=0 picks a free port, see base_url
+        """
+        self.page_latency: float = page_latency
+        self.search_latency: float = search_latency
+        self.page_requests: int = 0
+        self.search_requests: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+        self.pages: dict[str, bytes] = {}
+        self.__page_words: dict[str, set[str]] = {}
+        self.__page_titles: dict[str, str] = {}
+        for file_name in sorted(os.listdir(PAGES_DIR)):
+            if not file_name.endswith(".html"):
+                continue
+            with open(os.path.join(PAGES_DIR, file_name), "rb") as f:
+                content: bytes = f.read()
+            text: str = content.decode("utf-8")
+            title = re.search(r"<title>(.*?)</title>", text, flags=re.DOTALL)
+            self.pages[file_name] = content
+            self.__page_words[file_name] = _words(re.sub(r"<[^>]+>", " ", text))
+            self.__page_titles[file_name] = (
+                html.unescape(title.group(1)) if title else file_name
+            )
+
+        server = self
+
+        class Handler(_LocalWebHandler):
+            web = server
+
+        self.__httpd: ThreadingHTTPServer = ThreadingHTTPServer((host, port), Handler)
+        self.__httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ddg_url(self) -> str:
+        return f"{self.base_url}/html"
+
+    def search(self, query: str, max_results: int = 10) -> list[str]:
+        """Names of the pages sharing at least a word with the query, best first"""
+        query_words: set[str] = _words(query)
+        scores: list[tuple[int, str]] = [
+            (len(query_words & words), name)
+            for name, words in self.__page_words.items()
+        ]
+        scores.sort(key=lambda score: (-score[0], score[1]))
+        return [name for score, name in scores if score > 0][:max_results]
+
+    def render_search_page(self, query: str) -> str:
+        results: list[str] = []
+        for name in self.search(query):
+            url: str = f"{self.base_url}/pages/{name}"
+            title: str = html.escape(self.__page_titles[name])
+            results.append(
+                f"""
+<div class="result results_links results_links_deep web-result">
+  <div class="links_main links_deep result__body">
+    <h2 class="result__title"><a class="result__a" href="{url}">{title}</a></h2>
+    <a class="result__snippet" href="{url}">{title}</a>
+    <a class="result__url" href="{url}">{url}</a>
+  </div>
+</div>"""
+            )
+        return f"<html><body>{''.join(results)}</body></html>"
+
+    def start(self) -> "LocalWebServer":
+        threading.Thread(
+            target=self.__httpd.serve_forever, name="local-web", daemon=True
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __enter__(self) -> "LocalWebServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+class _LocalWebHandler(BaseHTTPRequestHandler):
+    web: LocalWebServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def __send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __search(self, query: str) -> None:
+        with self.web.lock:
+            self.web.search_requests += 1
+        time.sleep(self.web.search_latency)
+        body: bytes = self.web.render_search_page(query).encode("utf-8")
+        self.__send(200, body, "text/html; charset=utf-8")
+
+    def do_GET(self) -> None:
+        path, _, query_string = self.path.partition("?")
+        if path == "/html":
+            self.__search(parse_qs(query_string).get("q", [""])[0])
+            return
+
+        name: str = path.removeprefix("/pages/")
+        if not path.startswith("/pages/") or name not in self.web.pages:
+            self.__send(404, b"<html><body>Not found</body></html>", "text/html")
+            return
+
+        with self.web.lock:
+            self.web.page_requests += 1
+        time.sleep(self.web.page_latency)
+        self.__send(200, self.web.pages[name], "text/html; charset=utf-8")
+
+    def do_POST(self) -> None:
+        if self.path != "/html":
+            self.__send(404, b"", "text/plain")
+            return
+        length: int = int(self.headers.get("Content-Length", 0))
+        form: dict = parse_qs(self.rfile.read(length).decode("utf-8"))
+        self.__search(form.get("q", [""])[0])
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from answer_using_web import (
+    CONFIG_FILE,
+    build_batch_pipeline,
+    close_components,
+    execute_answer_using_web,
+    init_components_from_config,
+    parse_config_json,
+)
+from bench.fake_ollama import FakeOllamaServer
+from bench.local_web import FIXTURES_DIR, LocalWebServer
+from pipeline.metrics import STAGES, QueryMetrics
+from pipeline.staged_executor import StageError
+
+"""
+Offline end-to-end benchmark: the search engine and the pages are served by
+bench/local_web.py, the LLM by bench/fake_ollama.py, while scraping (browser),
+retrieval (embedding model) and the rest of the code are the real ones.
+The embedding model must already be in the Hugging Face cache.
+
+    python -m bench.run_benchmark --output before.json
+    python -m bench.compare_results before.json after.json
+"""
+
+LANGUAGE: str = "english"
+
+
+def percentile(values: list[float], q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation"""
+    if not values:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    position: float = (len(ordered) - 1) * q / 100
+    lower: int = int(position)
+    upper: int = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(durations: list[float]) -> dict[str, float]:
+    return {
+        "count": len(durations),
+        "p50": round(percentile(durations, 50), 4),
+        "p95": round(percentile(durations, 95), 4),
+        "mean": round(sum(durations) / len(durations), 4) if durations else 0.0,
+        "total": round(sum(durations), 4),
+    }
+
+
+def summarize_stages(metrics: list[QueryMetrics]) -> dict[str, dict[str, float]]:
+    """p50/p95 of every stage recorded in the metrics of the queries"""
+    summary: dict[str, dict[str, float]] = {}
+    for stage in STAGES:
+        durations: list[float] = [
+            m.durations[stage] for m in metrics if stage in m.durations
+        ]
+        if durations:
+            summary[stage] = summarize(durations)
+    return summary
+
+
+def sum_counters(metrics: list[QueryMetrics]) -> dict[str, int]:
+    totals: dict[str, int] = {}
+    for m in metrics:
+        for name, value in m.counters.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def peak_rss_mb() -> dict[str, float]:
+    # ru_maxrss is in KB on Linux, children are the browsers already closed
+    to_mb: float = 1024
+    if sys.platform == "darwin":
+        to_mb = 1024 * 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / to_mb, 1),
+        "children": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / to_mb, 1
+        ),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def build_config(args, web: LocalWebServer, llm: FakeOllamaServer, cache_dir: str):
+    config: dict = parse_config_json(args.config)
+    config["search_engine"] = "ddg_custom"
+    config["ddg_custom_url"] = web.ddg_url
+    config["ollama_base_url"] = llm.base_url
+    config["max_pages"] = args.max_pages
+    config["save_content_to_file"] = False
+    if args.embedding_model:
+        config["embedding_model"] = args.embedding_model
+
+    # the caches start empty in a temporary directory, so that runs are comparable,
+    # the knowledge base is used only when enabled in the config
+    for section, key, name, enabled in [
+        ("page_cache", "directory", "pages", True),
+        ("search_cache", "path", "search.sqlite", True),
+        ("embedding_cache", "directory", "embeddings", True),
+        ("answer_cache", "path", "answers.sqlite", True),
+        (
+            "knowledge_base",
+            "directory",
+            "knowledge_base",
+            config.get("knowledge_base", {}).get("enabled", False),
+        ),
+    ]:
+        config[section] = {
+            **config.get(section, {}),
+            "enabled": args.caches and enabled,
+            key: os.path.join(cache_dir, name),
+        }
+    config["http_fetch"] = {
+        **config.get("http_fetch", {}),
+        "domain_memory_path": os.path.join(cache_dir, "fetch_tiers.sqlite"),
+    }
+    # the local stand-in of DuckDuckGo does not need the rate limit
+    config["ddg_custom_session"] = {
+        **config.get("ddg_custom_session", {}),
+        "requests_per_second": 1000,
+        "burst": 1000,
+    }
+    return config
+
+
+def run_single(init: dict, questions: list[str]) -> dict:
+    cfg: dict = init["config"]
+    all_metrics: list[QueryMetrics] = []
+    statuses: dict[str, int] = {}
+    start: float = time.perf_counter()
+    for question in questions:
+        metrics: QueryMetrics = QueryMetrics(question)
+        _, status, _ = execute_answer_using_web(
+            query=question,
+            max_pages=cfg["max_pages"],
+            language=LANGUAGE,
+            search_engine=cfg["search_engine"],
+            retriever=init["retrieval"],
+            llm_provider=cfg["llm_provider"],
+            model_name=cfg["final_answer_model"],
+            max_chunk=cfg["max_chunk"],
+            save_content_to_file=False,
+            llm_template=cfg["llm_template"],
+            temperature=init["temperature"],
+            has_thinking=init["has_thinking"],
+            scraper=init["scraper"],
+            llm_manager=init["llm_manager"],
+            metrics=metrics,
+            knowledge_base_min_confidence=init["knowledge_base_min_confidence"],
+            dedup=init["dedup"],
+            packer=init["packer"],
+            incremental_stable_pages=init["incremental_stable_pages"],
+        )
+        all_metrics.append(metrics)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed: float = time.perf_counter() - start
+
+    return {
+        "questions": len(questions),
+        "seconds": round(elapsed, 3),
+        "questions_per_second": round(len(questions) / elapsed, 3),
+        "end_to_end": summarize([m.total_seconds for m in all_metrics]),
+        "stages": summarize_stages(all_metrics),
+        "counters": sum_counters(all_metrics),
+        "statuses": statuses,
+    }
+
+
+def run_batch(init: dict, questions: list[str]) -> dict:
+    pipeline = build_batch_pipeline(LANGUAGE, init)
+    all_metrics: list[QueryMetrics] = []
+    statuses: dict[str, int] = {}
+    start: float = time.perf_counter()
+    for _, result in pipeline.run(questions):
+        if isinstance(result, StageError):
+            status: str = "ERROR"
+        else:
+            _, status, _, metrics = result
+            all_metrics.append(metrics)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed: float = time.perf_counter() - start
+
+    return {
+        "questions": len(questions),
+        "seconds": round(elapsed, 3),
+        "questions_per_second": round(len(questions) / elapsed, 3),
+        "end_to_end": summarize([m.total_seconds for m in all_metrics]),
+        "stages": summarize_stages(all_metrics),
+        "counters": sum_counters(all_metrics),
+        "pipeline": [stats.to_dict() for stats in pipeline.stats],
+        "statuses": statuses,
+    }
+
+
+def main(args) -> dict:
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions: list[str] = [line.strip() for line in f if line.strip()]
+    questions = (questions * args.repeat)[: len(questions) * args.repeat]
+
+    with (
+        LocalWebServer(page_latency=args.page_latency) as web,
+        FakeOllamaServer(
+            prefill_latency=args.llm_prefill_latency,
+            token_latency=args.llm_token_latency,
+            parallel=args.llm_parallel,
+        ) as llm,
+        tempfile.TemporaryDirectory(prefix="answer_bench_") as cache_dir,
+    ):
+        config: dict = build_config(args, web, llm, cache_dir)
+
+        start: float = time.perf_counter()
+        init: dict = init_components_from_config(config)
+        init_seconds: float = time.perf_counter() - start
+
+        results: dict = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "settings": {
+                "questions": len(questions),
+                "max_pages": config["max_pages"],
+                "max_chunk": config["max_chunk"],
+                "embedding_model": config["embedding_model"],
+                "caches": args.caches,
+                "page_latency": args.page_latency,
+                "llm_prefill_latency": args.llm_prefill_latency,
+                "llm_token_latency": args.llm_token_latency,
+                "llm_parallel": args.llm_parallel,
+            },
+            "init_seconds": round(init_seconds, 3),
+        }
+        try:
+            if args.mode in ("single", "both"):
+                print(f"[INFO] Single mode on {len(questions)} questions...")
+                results["single"] = run_single(init, questions)
+            if args.mode in ("batch", "both"):
+                print(f"[INFO] Batch mode on {len(questions)} questions...")
+                results["batch"] = run_batch(init, questions)
+        finally:
+            close_components(init)
+
+        results["requests"] = {
+            "search": web.search_requests,
+            "pages": web.page_requests,
+            "llm": llm.requests,
+        }
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def print_results(results: dict) -> None:
+    for mode in ("single", "batch"):
+        if mode not in results:
+            continue
+        mode_results: dict = results[mode]
+        print(
+            f"\n[OK] {mode}: {mode_results['questions_per_second']:.2f} questions/s "
+            f"({mode_results['seconds']:.1f}s), statuses {mode_results['statuses']}"
+        )
+        stages: dict = dict(mode_results["stages"])
+        stages["end_to_end"] = mode_results["end_to_end"]
+        for stage, values in stages.items():
+            print(
+                f"  {stage}: p50 {values['p50']:.3f}s, p95 {values['p95']:.3f}s, "
+                f"{values['count']} calls"
+            )
+    print(f"\n[INFO] Peak RSS (MB): {results['peak_rss_mb']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark.")
+    parser.add_argument("--config", type=str, default=CONFIG_FILE)
+    parser.add_argument(
+        "--questions",
+        type=str,
+        default=os.path.join(FIXTURES_DIR, "questions.txt"),
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the questions.")
+    parser.add_argument(
+        "--mode", type=str, choices=["single", "batch", "both"], default="both"
+    )
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument(
+        "--embedding-model", type=str, help="Replace the model of the config."
+    )
+    parser.add_argument(
+        "--caches",
+        action="store_true",
+        help="Enable the caches (they start empty).",
+    )
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--llm-prefill-latency", type=float, default=0.3)
+    parser.add_argument("--llm-token-latency", type=float, default=0.01)
+    parser.add_argument("--llm-parallel", type=int, default=1)
+    parser.add_argument(
+        "--output", type=str, default="bench_results.json", help="JSON results file."
+    )
+    args = parser.parse_args()
+
+    benchmark_results: dict = main(args)
+    print_results(benchmark_results)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(benchmark_results, f, indent=2)
+    print(f"[OK] Results saved to {args.output}")
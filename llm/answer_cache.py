@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+"""
+Persistent cache of the answers of the LLM, stored in sqlite.
+An answer is reused only if the model, the temperature, the template and the
+rendered prompt (so also the question and the retrieved chunks) are all the same.
+"""
+
+
+class AnswerCache:
+    def __init__(self, path: str, max_size_mb: float = 50) -> None:
+        if max_size_mb <= 0:
+            raise ValueError("max_size_mb must be greater than 0")
+
+        self.path: str = path
+        self.max_size_bytes: int = int(max_size_mb * 1024 * 1024)
+        self.hits: int = 0
+        self.misses: int = 0
+
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.__db.execute("CREATE INDEX IF NOT EXISTS lru ON answers (last_access)")
+        self.__db.commit()
+
+    @staticmethod
+    def get_key(model_name: str, temperature: float, template: str, prompt: str) -> str:
+        template_hash: str = hashlib.sha256(template.encode("utf-8")).hexdigest()
+        payload: str = json.dumps([model_name, temperature, template_hash, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT answer FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.__db.execute(
+                "UPDATE answers SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.__db.commit()
+            return row[0]
+
+    def put(self, key: str, answer: str) -> None:
+        size: int = len(answer.encode("utf-8"))
+        if size > self.max_size_bytes:
+            return
+
+        with self.__lock:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                (key, answer, size, time.time()),
+            )
+            self.__evict()
+            self.__db.commit()
+
+    def __evict(self) -> None:
+        """Remove the least recently used answers until the cache fits max_size_mb"""
+        total: int = self.__db.execute("SELECT SUM(size) FROM answers").fetchone()[0]
+        total = total or 0
+        while total > self.max_size_bytes:
+            row = self.__db.execute(
+                "SELECT key, size FROM answers ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self.__db.execute("DELETE FROM answers WHERE key = ?", (row[0],))
+            total -= row[1]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
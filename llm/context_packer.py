@@ -0,0 +1,97 @@
+import re
+
+from pipeline.metrics import QueryMetrics
+
+"""
+Packing of the relevant chunks into the token budget of the model, so the size of
+the prompt (and the prefill time of the model) does not depend on how long the
+chunks are, and a small context is never exceeded.
+The tokens are estimated without the tokenizer of the model, on the safe side: a
+word of up to 6 letters is one token, longer words, numbers and symbols count
+more, every character of the scripts without spaces (Chinese, Japanese, Korean)
+is one token.
+"""
+
+_TOKEN_PATTERN: re.Pattern = re.compile(
+    r"[^\W\d_\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]{1,6}|\d{1,3}|\S"
+)
+# the end of a sentence followed by spaces, or the end of a line
+_SENTENCE_END: re.Pattern = re.compile(
+    r"(?<=[.!?\u3002\uff01\uff1f])\s+|[^\S\n]*\n\s*"
+)
+
+CHUNK_SEPARATOR: str = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+class ContextPacker:
+    def __init__(
+        self, template: str, context_tokens: int, answer_tokens: int = 512
+    ) -> None:
+        """
+        context_tokens is the context of the model, answer_tokens the part of it
+        kept free for the answer; the rest is used by the template and the chunks
+        """
+        if answer_tokens < 0 or context_tokens <= answer_tokens:
+            raise ValueError("context_tokens must be greater than answer_tokens")
+        self.template: str = template
+        self.context_tokens: int = context_tokens
+        self.answer_tokens: int = answer_tokens
+
+    def budget(self, values: dict[str, str]) -> int:
+        """Tokens left for the document by the template filled with values"""
+        prompt: str = self.template.format(**{**values, "document": ""})
+        return self.context_tokens - self.answer_tokens - estimate_tokens(prompt)
+
+    @staticmethod
+    def __trim(chunk: str, budget: int) -> str:
+        """
+        The longest start of the chunk made of whole sentences or lines within
+        budget, cut from the original text so the line breaks are kept
+        """
+        end: int = 0
+        for match in _SENTENCE_END.finditer(chunk):
+            if estimate_tokens(chunk[: match.start()]) > budget:
+                break
+            end = match.start()
+        return chunk[:end]
+
+    def pack(
+        self,
+        chunks: list[str],
+        values: dict[str, str],
+        metrics: QueryMetrics = None,
+    ) -> str:
+        """
+        The document of the template filled with values (language, question): the
+        chunks, from the most relevant, while they fit in the budget. The first
+        chunk that does not fit is cut at the end of a sentence or line, the chunks
+        after it are used only if they are short enough
+        """
+        budget: int = self.budget(values)
+        separator_tokens: int = estimate_tokens(CHUNK_SEPARATOR)
+        packed: list[str] = []
+        trimmed: int = 0
+        for chunk in chunks:
+            available: int = budget - (separator_tokens if packed else 0)
+            tokens: int = estimate_tokens(chunk)
+            if tokens > available:
+                trimmed += 1
+                chunk = self.__trim(chunk, available)
+                if not chunk:
+                    continue
+                tokens = estimate_tokens(chunk)
+            packed.append(chunk)
+            budget = available - tokens
+
+        if trimmed:
+            print(
+                f"[INFO] {trimmed} of {len(chunks)} chunks cut or left out "
+                f"to fit the context of {self.context_tokens} tokens."
+            )
+        if metrics is not None:
+            metrics.count("trimmed_chunks", trimmed)
+        return CHUNK_SEPARATOR.join(packed)
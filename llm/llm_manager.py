@@ -1,11 +1,74 @@
+import random
 import re
-from typing import Any
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Iterator
 
-from langchain.prompts import ChatPromptTemplate
+from pipeline.metrics import QueryMetrics
+
+from .answer_cache import AnswerCache
+from .context_packer import estimate_tokens
+
+if TYPE_CHECKING:
+    from langchain.prompts import ChatPromptTemplate
+
+
+class ThinkingFilter:
+    """
+    Removes <think>...</think> from a text received in pieces, a tag can also be
+    split between two pieces
+    """
+
+    __OPEN_TAG: str = "<think>"
+    __CLOSE_TAG: str = "</think>"
+
+    def __init__(self) -> None:
+        self.__buffer: str = ""
+        self.__inside: bool = False
+
+    @staticmethod
+    def __partial_tag_length(text: str, tag: str) -> int:
+        """Length of the longest end of text that could be the start of tag"""
+        for length in range(min(len(text), len(tag) - 1), 0, -1):
+            if tag.startswith(text[-length:]):
+                return length
+        return 0
+
+    def feed(self, text: str) -> str:
+        """Add a piece of text and return the part that can already be shown"""
+        self.__buffer += text
+        visible: str = ""
+
+        while self.__buffer:
+            tag: str = self.__CLOSE_TAG if self.__inside else self.__OPEN_TAG
+            idx: int = self.__buffer.find(tag)
+            if idx >= 0:
+                if not self.__inside:
+                    visible += self.__buffer[:idx]
+                self.__buffer = self.__buffer[idx + len(tag) :]
+                self.__inside = not self.__inside
+                continue
+
+            keep: int = self.__partial_tag_length(self.__buffer, tag)
+            if not self.__inside:
+                visible += self.__buffer[: len(self.__buffer) - keep]
+            self.__buffer = self.__buffer[len(self.__buffer) - keep :]
+            break
+
+        return visible
+
+    def flush(self) -> str:
+        """Return what is left at the end of the text, an unclosed thinking is dropped"""
+        visible: str = "" if self.__inside else self.__buffer
+        self.__buffer = ""
+        return visible
 
 
 class LLMManager:
     __SUPPORTED_PROVIDERS: list[str] = ["ollama"]
+    # http status codes returned by an overloaded or restarting server
+    __TRANSIENT_STATUS_CODES: set[int] = {408, 429, 500, 502, 503, 504}
 
     def __init__(
         self,
@@ -14,7 +77,25 @@ class LLMManager:
         temperature: float,
         template: str,
         thinking_enabled: bool,
+        answer_cache: AnswerCache = None,
+        base_url: str = None,
+        max_in_flight: int = 1,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        load_in_background: bool = False,
+        context_tokens: int = None,
     ) -> None:
+        """
+        The manager can be reused for any number of queries. If answer_cache is given,
+        a prompt already answered is not sent to the model again.
+        answer_queries keeps up to max_in_flight requests running, set it to the
+        OLLAMA_NUM_PARALLEL of the server. A request failing with a transient error
+        is retried max_retries times, waiting retry_backoff * 2^attempt seconds.
+        With load_in_background langchain is imported and the chain is built by a
+        thread, the first answer waits for it.
+        context_tokens sets the context of the model (num_ctx of Ollama), by default
+        the one of the server
+        """
         if provider not in self.__SUPPORTED_PROVIDERS:
             raise ValueError(
                 f"Unsupported provider: {provider}. Supported providers are: {
@@ -26,24 +107,91 @@ class LLMManager:
         self.model_name: str = model_name
         self.temperature: float = temperature
         self.thinking_enabled: bool = thinking_enabled
-        self.chain = self.__initialize_llm(template)
-
-    def __initialize_llm(self, template: str) -> Any:
+        self.template: str = template
+        self.answer_cache: AnswerCache = answer_cache
+        self.base_url: str = base_url
+        self.max_in_flight: int = max_in_flight
+        self.max_retries: int = max_retries
+        self.retry_backoff: float = retry_backoff
+        self.context_tokens: int = context_tokens
         if not template:
             raise ValueError(
                 "Template cannot be empty. Please provide a valid template."
             )
+        self.__chain: Future = Future()
+        if load_in_background:
+            threading.Thread(
+                target=self.__initialize_llm,
+                args=(template,),
+                name="llm-chain",
+                daemon=True,
+            ).start()
+        else:
+            self.__initialize_llm(template)
+            self.__chain.result()
+        # timings of the last stream_answer, in seconds
+        self.last_stream_timings: dict[str, float] = {}
 
-        if self.provider == "ollama":
-            from langchain_ollama import OllamaLLM
+    def __initialize_llm(self, template: str) -> None:
+        try:
+            # langchain takes about a second to import
+            from langchain.prompts import ChatPromptTemplate
 
-            model = OllamaLLM(model=self.model_name, temperature=self.temperature)
-        else:
-            raise Exception("Unable the initialize the model.")
+            if self.provider == "ollama":
+                from langchain_ollama import OllamaLLM
+
+                model = OllamaLLM(
+                    model=self.model_name,
+                    temperature=self.temperature,
+                    base_url=self.base_url,
+                    num_ctx=self.context_tokens,
+                )
+            else:
+                raise Exception("Unable the initialize the model.")
+
+            self.__prompt: ChatPromptTemplate = ChatPromptTemplate.from_template(
+                template
+            )
+            self.__chain.set_result(self.__prompt | model)
+        except BaseException as e:
+            self.__chain.set_exception(e)
+
+    @property
+    def chain(self) -> Any:
+        """The prompt and the model, waiting for them if they are still loading"""
+        return self.__chain.result()
 
-        prompt: ChatPromptTemplate = ChatPromptTemplate.from_template(template)
-        chain = prompt | model
-        return chain
+    def __get_cache_key(self, prompt: str) -> str:
+        return AnswerCache.get_key(
+            self.model_name, self.temperature, self.template, prompt
+        )
+
+    def __lookup_cache(
+        self,
+        dict_for_template: dict[str, str],
+        use_cache: bool,
+        metrics: QueryMetrics,
+    ) -> tuple[str, str]:
+        """
+        Returns the cache key (None without cache) and the cached answer (None if
+        missing or not to be used), recording the prompt size and the hit in metrics
+        """
+        if self.answer_cache is None and metrics is None:
+            return None, None
+
+        self.__chain.result()  # the prompt is built with the chain
+        prompt: str = self.__prompt.format(**dict_for_template)
+        if metrics is not None:
+            metrics.count("prompt_chars", len(prompt))
+            metrics.count("prompt_tokens", estimate_tokens(prompt))
+        if self.answer_cache is None:
+            return None, None
+
+        cache_key: str = self.__get_cache_key(prompt)
+        cached_answer: str = self.answer_cache.get(cache_key) if use_cache else None
+        if cached_answer is not None and metrics is not None:
+            metrics.count("answer_cache_hits")
+        return cache_key, cached_answer
 
     def __remove_thinking_from_text(self, text: str) -> str:
         """
@@ -54,13 +202,97 @@ class LLMManager:
             return text
         return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
 
-    def answer_query(self, dict_for_template: dict[str, str]) -> str:
+    def answer_query(
+        self,
+        dict_for_template: dict[str, str],
+        use_cache: bool = True,
+        metrics: QueryMetrics = None,
+    ) -> str:
         """
         Using a dict containing the required field for the template, invoke the llm and
-        return its response
+        return its response.
+        With use_cache=False the cached answer is ignored and replaced by a new one.
+        If metrics is given, the generation time and the sizes are recorded in it
         """
+        start: float = time.perf_counter()
+        cache_key, answer = self.__lookup_cache(dict_for_template, use_cache, metrics)
+
+        if answer is None:
+            answer = self.__invoke(dict_for_template)
+            if cache_key is not None:
+                self.answer_cache.put(cache_key, answer)
+
+        if metrics is not None:
+            metrics.add_duration("generation", time.perf_counter() - start)
+            metrics.count("answer_chars", len(answer))
+        return answer
+
+    def answer_queries(
+        self,
+        dicts_for_template: list[dict[str, str]],
+        use_cache: bool = True,
+        max_in_flight: int = None,
+    ) -> list[str]:
+        """
+        Answer many queries keeping up to max_in_flight (default: the one of the
+        manager) requests running at the same time on the server.
+        Returns the answers in the same order of dicts_for_template
+        """
+        max_in_flight = max_in_flight or self.max_in_flight
+        if max_in_flight <= 1 or len(dicts_for_template) <= 1:
+            return [
+                self.answer_query(d, use_cache=use_cache) for d in dicts_for_template
+            ]
+
+        with ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="llm"
+        ) as executor:
+            return list(
+                executor.map(
+                    lambda d: self.answer_query(d, use_cache=use_cache),
+                    dicts_for_template,
+                )
+            )
+
+    def __is_transient_error(self, error: Exception) -> bool:
+        """Errors that may disappear by trying again: network problems, busy server"""
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+
         try:
-            response: str = self.chain.invoke(dict_for_template)
+            import httpx
+
+            if isinstance(error, httpx.TransportError):
+                return True
+        except ImportError:
+            pass
+
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+        return status_code in self.__TRANSIENT_STATUS_CODES
+
+    def __invoke_with_retries(self, dict_for_template: dict[str, str]) -> str:
+        attempt: int = 0
+        while True:
+            try:
+                return self.chain.invoke(dict_for_template)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.__is_transient_error(e):
+                    raise
+                # exponential backoff with jitter, so that the retries of many
+                # requests do not hit the server at the same time
+                delay: float = self.retry_backoff * (2**attempt)
+                delay *= random.uniform(0.5, 1.5)
+                print(
+                    f"[WARNING] LLM request failed ({e}), retrying in {delay:.1f}s..."
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def __invoke(self, dict_for_template: dict[str, str]) -> str:
+        try:
+            response: str = self.__invoke_with_retries(dict_for_template)
         except Exception as e:
             raise RuntimeError(
                 f"Error invoking the LLM chain: {
@@ -72,3 +304,88 @@ class LLMManager:
             return self.__remove_thinking_from_text(response)
 
         return response.strip()
+
+    def stream_answer(
+        self,
+        dict_for_template: dict[str, str],
+        use_cache: bool = True,
+        metrics: QueryMetrics = None,
+    ) -> Iterator[str]:
+        """
+        Same as answer_query, but yield the answer while it is generated.
+        The thinking of the model is never yielded. When the generator is exhausted,
+        last_stream_timings contains the time to the first yielded token and the
+        total generation time, also recorded in metrics if given
+        """
+        cache_key, cached_answer = self.__lookup_cache(
+            dict_for_template, use_cache, metrics
+        )
+        if cached_answer is not None:
+            self.last_stream_timings = {
+                "time_to_first_token": 0.0,
+                "total_time": 0.0,
+            }
+            if metrics is not None:
+                metrics.count("answer_chars", len(cached_answer))
+            yield cached_answer
+            return
+
+        pieces: list[str] = []
+        for piece in self.__stream(dict_for_template):
+            pieces.append(piece)
+            yield piece
+
+        answer: str = "".join(pieces).strip()
+        if cache_key is not None:
+            self.answer_cache.put(cache_key, answer)
+        if metrics is not None:
+            timings: dict[str, float] = self.last_stream_timings
+            metrics.add_duration("first_token", timings["time_to_first_token"])
+            metrics.add_duration("generation", timings["total_time"])
+            metrics.count("answer_chars", len(answer))
+
+    def __stream(self, dict_for_template: dict[str, str]) -> Iterator[str]:
+        thinking_filter: ThinkingFilter = ThinkingFilter()
+        start: float = time.perf_counter()
+        first_token_time: float = None
+        started: bool = False
+
+        self.last_stream_timings = {}
+        try:
+            for piece in self.chain.stream(dict_for_template):
+                text: str = (
+                    thinking_filter.feed(piece) if self.thinking_enabled else piece
+                )
+                if not started:
+                    # the same as strip() of answer_query, at the start of the answer
+                    text = text.lstrip()
+                    started = bool(text)
+                if not text:
+                    continue
+
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start
+                yield text
+
+            if self.thinking_enabled:
+                text = thinking_filter.flush()
+                if not started:
+                    text = text.lstrip()
+                if text:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - start
+                    yield text
+        except Exception as e:
+            raise RuntimeError(
+                f"Error streaming the LLM chain: {
+                    e
+                }. Check the provider and the template are correctly formatted."
+            )
+
+        total_time: float = time.perf_counter() - start
+        self.last_stream_timings = {
+            "time_to_first_token": (
+                first_token_time if first_token_time is not None else total_time
+            ),
+            "total_time": total_time,
+        }
@@ -0,0 +1,366 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+from .metrics import MetricsRegistry, QueryMetrics
+
+"""
+Local JSON HTTP API that answers questions with components kept warm for the
+whole life of the process:
+- POST /answer {"query", "language", "timeout", "use_cache"} answers
+  {"final_answer", "status", "sources", "metrics", "coalesced"}, sources are the
+  urls of the pages the answer is based on
+- GET /health returns the state of the queue and the counters of the server
+- GET /metrics returns the metrics of the answered queries and of the server, in
+  the Prometheus text format
+The requests wait in a bounded queue served by a pool of workers; when the queue
+is full the server answers 503 at once. A request arriving while an identical one
+(same query, language and use_cache) is still queued or running waits for that one
+instead of being answered again.
+A question can not be stopped while it is answered: when all its requests timed
+out, its worker is replaced by a new one, so the slow questions do not hold the
+workers of the next ones, at most max_abandoned times at once.
+"""
+
+# (query, language, use_cache, metrics) -> (answer, status, sources)
+AnswerFn = Callable[[str, str, bool, QueryMetrics], tuple[str, str, list[str]]]
+
+
+class _Job:
+    def __init__(self, key: tuple, query: str, language: str, use_cache: bool) -> None:
+        self.key: tuple = key
+        self.query: str = query
+        self.language: str = language
+        self.use_cache: bool = use_cache
+        self.metrics: QueryMetrics = QueryMetrics(query)
+        self.future: Future = Future()
+        # requests waiting for this job, it is dropped if they all give up
+        self.waiters: int = 1
+        # running while nobody waits for it, its worker has been replaced
+        self.abandoned: bool = False
+        self.finished: bool = False
+
+
+class AnswerServer:
+    __COUNTERS: list[str] = ["requests", "coalesced", "rejected", "timeouts", "errors"]
+
+    def __init__(
+        self,
+        answer_fn: AnswerFn,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        workers: int = 2,
+        queue_size: int = 16,
+        timeout: float = 120.0,
+        registry: MetricsRegistry = None,
+        max_abandoned: int = None,
+    ) -> None:
+        """
+        answer_fn answers a single query, it is called by workers threads at the
+        same time. timeout is the default of the requests that do not set their own,
+        in seconds. max_abandoned is the most questions still running after all
+        their requests timed out that get a new worker, by default workers.
+        port=0 picks a free port, see base_url
+        """
+        if workers <= 0:
+            raise ValueError("workers must be greater than 0")
+        if queue_size <= 0:
+            raise ValueError("queue_size must be greater than 0")
+        if max_abandoned is not None and max_abandoned < 0:
+            raise ValueError("max_abandoned must be 0 or greater")
+
+        self.workers: int = workers
+        self.queue_size: int = queue_size
+        self.timeout: float = timeout
+        self.max_abandoned: int = workers if max_abandoned is None else max_abandoned
+        self.registry: MetricsRegistry = registry or MetricsRegistry()
+        self.__answer_fn: AnswerFn = answer_fn
+
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__in_flight: dict[tuple, _Job] = {}
+        self.__running: int = 0
+        self.__abandoned: int = 0
+        self.__counters: dict[str, int] = {name: 0 for name in self.__COUNTERS}
+        self.__started_at: float = time.time()
+        self.__workers: list[threading.Thread] = []
+        self.__server_thread: threading.Thread = None
+        self.__stopped: threading.Event = threading.Event()
+
+        server = self
+
+        class Handler(_AnswerHandler):
+            api = server
+
+        self.__httpd: ThreadingHTTPServer = ThreadingHTTPServer((host, port), Handler)
+        self.__httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __start_worker(self) -> None:
+        thread: threading.Thread = threading.Thread(
+            target=self.__work,
+            name=f"answer-worker-{len(self.__workers)}",
+            daemon=True,
+        )
+        self.__workers.append(thread)
+        thread.start()
+
+    def start(self) -> "AnswerServer":
+        """Start the workers and serve in a background thread"""
+        for _ in range(self.workers):
+            self.__start_worker()
+        self.__server_thread = threading.Thread(
+            target=self.__httpd.serve_forever, name="answer-server", daemon=True
+        )
+        self.__server_thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve until stop() is called or the process is interrupted (Ctrl+C)"""
+        self.start()
+        try:
+            self.__stopped.wait()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop accepting requests, the running ones are completed first"""
+        if self.__server_thread is not None and not self.__stopped.is_set():
+            self.__stopped.set()
+            self.__httpd.shutdown()
+            self.__server_thread.join()
+            with self.__lock:
+                workers: list[threading.Thread] = list(self.__workers)
+            for _ in workers:
+                self.__queue.put(None)
+            for thread in workers:
+                thread.join()
+        self.__httpd.server_close()
+
+    def __enter__(self) -> "AnswerServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def __count(self, name: str) -> None:
+        with self.__lock:
+            self.__counters[name] += 1
+
+    def submit(
+        self, query: str, language: str, use_cache: bool = True
+    ) -> tuple[Optional[_Job], bool]:
+        """
+        Queue the query, or join the identical one already queued or running.
+        Returns the job (None if the queue is full) and True if it was joined
+        """
+        # the case of the query matters (names, acronyms), the one of the language
+        # does not
+        key: tuple = (query, language.lower(), use_cache)
+        with self.__lock:
+            self.__counters["requests"] += 1
+            job: _Job = self.__in_flight.get(key)
+            if job is not None:
+                job.waiters += 1
+                self.__counters["coalesced"] += 1
+                return job, True
+
+            job = _Job(key, query, language, use_cache)
+            try:
+                self.__queue.put_nowait(job)
+            except queue.Full:
+                self.__counters["rejected"] += 1
+                return None, False
+            self.__in_flight[key] = job
+            return job, False
+
+    def wait(self, job: _Job, timeout: float) -> dict[str, Any]:
+        """
+        The answer of the job, raises TimeoutError after timeout seconds.
+        A job still queued when all its requests gave up is never started, a
+        running one gets its worker replaced
+        """
+        try:
+            return job.future.result(timeout)
+        except TimeoutError:
+            with self.__lock:
+                self.__counters["timeouts"] += 1
+                job.waiters -= 1
+                if job.waiters > 0:
+                    raise
+                if job.future.cancel():
+                    self.__in_flight.pop(job.key, None)
+                elif (
+                    not job.abandoned
+                    and not job.finished
+                    and self.__abandoned < self.max_abandoned
+                    and not self.__stopped.is_set()
+                ):
+                    job.abandoned = True
+                    self.__abandoned += 1
+                    self.__start_worker()
+            raise
+
+    def __work(self) -> None:
+        while True:
+            job: _Job = self.__queue.get()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            with self.__lock:
+                self.__running += 1
+            try:
+                answer, status, sources = self.__answer_fn(
+                    job.query, job.language, job.use_cache, job.metrics
+                )
+                job.metrics.finish(status)
+                result: dict[str, Any] = {
+                    "final_answer": answer,
+                    "status": status,
+                    "sources": sources,
+                    "metrics": job.metrics.to_dict(),
+                }
+                error: Exception = None
+            except Exception as e:
+                print(f"[ERROR] Error while answering '{job.query}': {e}")
+                job.metrics.finish("ERROR")
+                error = e
+                self.__count("errors")
+
+            self.registry.observe(job.metrics)
+            # the next identical request is a new job, it may have new web content
+            with self.__lock:
+                self.__running -= 1
+                job.finished = True
+                if self.__in_flight.get(job.key) is job:
+                    del self.__in_flight[job.key]
+                abandoned: bool = job.abandoned
+                if abandoned:
+                    # another worker took its place
+                    self.__abandoned -= 1
+                    self.__workers.remove(threading.current_thread())
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+            if abandoned:
+                return
+
+    def health(self) -> dict[str, Any]:
+        with self.__lock:
+            return {
+                "status": "stopping" if self.__stopped.is_set() else "ok",
+                "uptime_seconds": round(time.time() - self.__started_at, 1),
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self.__queue.qsize(),
+                "running": self.__running,
+                "abandoned": self.__abandoned,
+                **self.__counters,
+            }
+
+    def format_prometheus(self) -> str:
+        """Metrics of the queries followed by the ones of the server"""
+        p: str = self.registry.prefix
+        health: dict[str, Any] = self.health()
+        lines: list[str] = [self.registry.format_prometheus().rstrip("\n")]
+        for name in self.__COUNTERS:
+            lines.append(f"# TYPE {p}_server_{name}_total counter")
+            lines.append(f"{p}_server_{name}_total {health[name]}")
+        for name in ["queued", "running", "abandoned"]:
+            lines.append(f"# TYPE {p}_server_{name} gauge")
+            lines.append(f"{p}_server_{name} {health[name]}")
+        return "\n".join(lines) + "\n"
+
+
+class _AnswerHandler(BaseHTTPRequestHandler):
+    api: AnswerServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def __send(self, status: int, data: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __send_json(self, status: int, body: dict) -> None:
+        self.__send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self.__send_json(200, self.api.health())
+        elif self.path == "/metrics":
+            self.__send(
+                200,
+                self.api.format_prometheus().encode("utf-8"),
+                "text/plain; version=0.0.4",
+            )
+        else:
+            self.__send_json(404, {"error": "not found"})
+
+    def __read_request(self) -> dict:
+        """The json body, raises ValueError if it is not a valid request"""
+        length: int = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid json: {e}")
+        if not isinstance(request, dict):
+            raise ValueError("the body must be a json object")
+
+        query = request.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("query is required")
+        if not isinstance(request.get("language", "global"), str):
+            raise ValueError("language must be a string")
+        timeout = request.get("timeout", self.api.timeout)
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError("timeout must be a number greater than 0")
+        return request
+
+    def do_POST(self) -> None:
+        if self.path != "/answer":
+            self.__send_json(404, {"error": "not found"})
+            return
+
+        try:
+            request: dict = self.__read_request()
+        except ValueError as e:
+            self.__send_json(400, {"error": str(e)})
+            return
+
+        timeout: float = request.get("timeout", self.api.timeout)
+        job, coalesced = self.api.submit(
+            request["query"].strip(),
+            request.get("language", "global"),
+            bool(request.get("use_cache", True)),
+        )
+        if job is None:
+            self.__send_json(503, {"error": "too many requests in queue"})
+            return
+
+        try:
+            result: dict = self.api.wait(job, timeout)
+        except TimeoutError:
+            self.__send_json(504, {"error": f"no answer after {timeout}s"})
+            return
+        except Exception as e:
+            self.__send_json(500, {"error": str(e)})
+            return
+        self.__send_json(200, {**result, "coalesced": coalesced})
@@ -0,0 +1,234 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+"""
+Metrics of the answer of a query: the duration of every stage (knowledge base,
+search and its http requests, page fetch, cleaning, chunking, near-duplicate
+removal, lexical ranking, embedding, similarity and top-k, generation and its
+first token), the bytes and chunks that went through them, the cache hits and the
+status of every page.
+MetricsRegistry sums the metrics of many queries and formats them for Prometheus.
+"""
+
+# stages in the order they run, also the order of the csv columns
+STAGES: list[str] = [
+    "index",
+    "search",
+    "search_request",
+    "fetch",
+    "clean",
+    "chunk",
+    "dedup",
+    "lexical",
+    "embed",
+    "similarity",
+    "generation",
+    # part of generation, only when the answer is streamed
+    "first_token",
+]
+COUNTERS: list[str] = [
+    "links",
+    "search_errors",
+    "search_skipped",
+    "search_hedges",
+    "search_requests",
+    "search_throttled",
+    "search_rate_limited",
+    "pages_ok",
+    "pages_failed",
+    "page_cache_hits",
+    "pages_http",
+    "pages_cancelled",
+    "bytes_fetched",
+    "bytes_cleaned",
+    "duplicate_pages",
+    "chunks",
+    "duplicate_chunks",
+    "candidate_chunks",
+    "embedding_cache_hits",
+    "embedding_cache_misses",
+    "relevant_chunks",
+    "trimmed_chunks",
+    "prompt_chars",
+    "prompt_tokens",
+    "answer_chars",
+    "answer_cache_hits",
+]
+
+
+class QueryMetrics:
+    def __init__(self, query: str = "") -> None:
+        """
+        Shared by all the components working on the same query, so every method
+        can be called from any thread. Durations of the same stage are summed
+        """
+        self.query: str = query
+        self.status: str = ""
+        self.total_seconds: float = 0.0
+        self.durations: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.pages: list[dict[str, Any]] = []
+        self.__start: float = time.perf_counter()
+        self.__lock: threading.Lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_duration(stage, time.perf_counter() - start)
+
+    def add_duration(self, stage: str, seconds: float) -> None:
+        with self.__lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_page(
+        self,
+        url: str,
+        status: str,
+        seconds: float,
+        size: int = 0,
+        cached: bool = False,
+        tier: str = "",
+    ) -> None:
+        """
+        status is ok, empty, timeout or error, size the bytes of the raw page and
+        tier how it was fetched (http or browser, empty for the cached pages)
+        """
+        with self.__lock:
+            self.pages.append(
+                {
+                    "url": url,
+                    "status": status,
+                    "seconds": round(seconds, 4),
+                    "bytes": size,
+                    "cached": cached,
+                    "tier": tier,
+                }
+            )
+        self.count("pages_ok" if status == "ok" else "pages_failed")
+        self.count("bytes_fetched", size)
+        if cached:
+            self.count("page_cache_hits")
+        if tier == "http":
+            self.count("pages_http")
+
+    def finish(self, status: str) -> None:
+        """Set the final status of the query and stop the total timer"""
+        self.status = status
+        self.total_seconds = time.perf_counter() - self.__start
+
+    def to_dict(self) -> dict[str, Any]:
+        with self.__lock:
+            return {
+                "query": self.query,
+                "status": self.status,
+                "total_seconds": round(self.total_seconds, 4),
+                "durations": {
+                    stage: round(seconds, 4)
+                    for stage, seconds in self.durations.items()
+                },
+                "counters": dict(self.counters),
+                "pages": list(self.pages),
+            }
+
+    def to_row(self) -> dict[str, Any]:
+        """Flat version for the csv: status, total and a column per stage and counter"""
+        row: dict[str, Any] = {
+            "status": self.status,
+            "total_seconds": round(self.total_seconds, 4),
+        }
+        with self.__lock:
+            for stage in STAGES:
+                row[f"{stage}_seconds"] = round(self.durations.get(stage, 0.0), 4)
+            for name in COUNTERS:
+                row[name] = self.counters.get(name, 0)
+        return row
+
+
+class MetricsRegistry:
+    """Totals of many QueryMetrics, exported in the Prometheus text format"""
+
+    __BUCKETS: tuple[float, ...] = (
+        0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf
+    )
+
+    def __init__(self, prefix: str = "answer_with_web") -> None:
+        self.prefix: str = prefix
+        self.__lock: threading.Lock = threading.Lock()
+        # stage -> [count of every bucket, sum, count]
+        self.__histograms: dict[str, list] = {}
+        self.__counters: dict[str, int] = {}
+        self.__queries: dict[str, int] = {}
+        self.__pages: dict[str, int] = {}
+
+    def __observe_duration(self, stage: str, seconds: float) -> None:
+        histogram: list = self.__histograms.setdefault(
+            stage, [[0] * len(self.__BUCKETS), 0.0, 0]
+        )
+        for i, bound in enumerate(self.__BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def observe(self, metrics: QueryMetrics) -> None:
+        data: dict[str, Any] = metrics.to_dict()
+        with self.__lock:
+            self.__queries[data["status"]] = self.__queries.get(data["status"], 0) + 1
+            self.__observe_duration("total", data["total_seconds"])
+            for stage, seconds in data["durations"].items():
+                self.__observe_duration(stage, seconds)
+            for name, value in data["counters"].items():
+                self.__counters[name] = self.__counters.get(name, 0) + value
+            for page in data["pages"]:
+                self.__pages[page["status"]] = self.__pages.get(page["status"], 0) + 1
+
+    def format_prometheus(self) -> str:
+        p: str = self.prefix
+        lines: list[str] = []
+        with self.__lock:
+            lines.append(f"# TYPE {p}_queries_total counter")
+            for status, value in sorted(self.__queries.items()):
+                lines.append(f'{p}_queries_total{{status="{status}"}} {value}')
+
+            lines.append(f"# TYPE {p}_pages_total counter")
+            for status, value in sorted(self.__pages.items()):
+                lines.append(f'{p}_pages_total{{status="{status}"}} {value}')
+
+            for name, value in sorted(self.__counters.items()):
+                lines.append(f"# TYPE {p}_{name}_total counter")
+                lines.append(f"{p}_{name}_total {value}")
+
+            lines.append(f"# TYPE {p}_stage_seconds histogram")
+            for stage, (buckets, total, count) in sorted(self.__histograms.items()):
+                for bound, value in zip(self.__BUCKETS, buckets):
+                    le: str = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                    lines.append(
+                        f'{p}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {value}'
+                    )
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write the metrics to path, e.g. for the textfile collector of node_exporter.
+        The file is replaced at once, so a scrape never reads it half written
+        """
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path: str = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(self.format_prometheus())
+        os.replace(temporary_path, path)
@@ -0,0 +1,258 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+"""
+Run items through a chain of stages connected by bounded queues.
+Every stage has its own pool of worker threads, so while an item is in a stage the
+following items can already be in the previous ones.
+"""
+
+
+class _Stop:
+    pass
+
+
+_STOP = _Stop()
+
+
+class StageError:
+    """Placeholder of an item whose processing raised, it skips the next stages"""
+
+    def __init__(self, stage: str, error: BaseException) -> None:
+        self.stage: str = stage
+        self.error: BaseException = error
+
+    def __repr__(self) -> str:
+        return f"StageError({self.stage}: {self.error!r})"
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        concurrency: int = 1,
+        batch_size: int = 1,
+    ) -> None:
+        """
+        fn takes an item and returns the item for the next stage.
+        With batch_size > 1, fn takes a list of items (as many as are ready, up to
+        batch_size) and returns a list of results of the same length
+        """
+        if concurrency <= 0:
+            raise ValueError("concurrency must be greater than 0")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0")
+
+        self.name: str = name
+        self.fn: Callable = fn
+        self.concurrency: int = concurrency
+        self.batch_size: int = batch_size
+
+
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.items: int = 0
+        self.errors: int = 0
+        self.busy_seconds: float = 0.0
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+        self.max_queue_depth: int = 0
+        self.__depth_sum: int = 0
+        self.__depth_samples: int = 0
+        self.__lock: threading.Lock = threading.Lock()
+
+    def record_depth(self, depth: int) -> None:
+        with self.__lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self.__depth_sum += depth
+            self.__depth_samples += 1
+
+    def record_run(self, start: float, end: float, items: int, errors: int) -> None:
+        with self.__lock:
+            self.items += items
+            self.errors += errors
+            self.busy_seconds += end - start
+            if self.first_start is None or start < self.first_start:
+                self.first_start = start
+            if self.last_end is None or end > self.last_end:
+                self.last_end = end
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return self.__depth_sum / self.__depth_samples if self.__depth_samples else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items per second while the stage was active"""
+        if self.first_start is None or self.last_end <= self.first_start:
+            return 0.0
+        return self.items / (self.last_end - self.first_start)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "throughput": round(self.throughput, 3),
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": round(self.mean_queue_depth, 2),
+        }
+
+
+class StagedPipeline:
+    def __init__(self, stages: list[Stage], queue_size: int = 8) -> None:
+        if not stages:
+            raise ValueError("At least one stage is required")
+        if queue_size <= 0:
+            raise ValueError("queue_size must be greater than 0")
+
+        self.stages: list[Stage] = stages
+        self.queue_size: int = queue_size
+        self.stats: list[StageStats] = [StageStats(stage.name) for stage in stages]
+
+    def __worker(
+        self,
+        stage_index: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        remaining_workers: list[int],
+        lock: threading.Lock,
+    ) -> None:
+        stage: Stage = self.stages[stage_index]
+        stats: StageStats = self.stats[stage_index]
+        stopped: bool = False
+
+        while not stopped:
+            stats.record_depth(inbox.qsize())
+            first = inbox.get()
+            if first is _STOP:
+                break
+
+            # take the other items that are already waiting, without blocking
+            batch: list = [first]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+
+            for index, result in self.__run_stage(stage, stats, batch):
+                outbox.put((index, result))
+
+        # the last worker of the stage stops the workers of the next stage
+        with lock:
+            remaining_workers[stage_index] -= 1
+            last_worker: bool = remaining_workers[stage_index] == 0
+        if last_worker:
+            next_workers: int = (
+                self.stages[stage_index + 1].concurrency
+                if stage_index + 1 < len(self.stages)
+                else 1
+            )
+            for _ in range(next_workers):
+                outbox.put(_STOP)
+
+    def __run_stage(
+        self, stage: Stage, stats: StageStats, batch: list[tuple[int, Any]]
+    ) -> list[tuple[int, Any]]:
+        failed: list[tuple[int, Any]] = [
+            (index, item) for index, item in batch if isinstance(item, StageError)
+        ]
+        todo: list[tuple[int, Any]] = [
+            (index, item) for index, item in batch if not isinstance(item, StageError)
+        ]
+        if not todo:
+            return failed
+
+        start: float = time.perf_counter()
+        errors: int = 0
+        try:
+            if stage.batch_size > 1:
+                results: list = list(stage.fn([item for _, item in todo]))
+                if len(results) != len(todo):
+                    raise RuntimeError(
+                        f"Stage {stage.name} returned {len(results)} results "
+                        f"for {len(todo)} items"
+                    )
+            else:
+                results = [stage.fn(todo[0][1])]
+            done = [(index, result) for (index, _), result in zip(todo, results)]
+        except Exception as e:
+            print(f"[ERROR] Stage {stage.name} failed: {e}")
+            done = [(index, StageError(stage.name, e)) for index, _ in todo]
+            errors = len(todo)
+        stats.record_run(start, time.perf_counter(), len(todo), errors)
+
+        return failed + done
+
+    def run(self, inputs: Iterable) -> Iterator[tuple[Any, Any]]:
+        """
+        Process the inputs and yield (input, result) in the same order of inputs,
+        as soon as every result is ready. A result is a StageError if a stage raised
+        """
+        queues: list[queue.Queue] = [
+            queue.Queue(maxsize=self.queue_size) for _ in self.stages
+        ]
+        results: queue.Queue = queue.Queue()
+        outboxes: list[queue.Queue] = queues[1:] + [results]
+        remaining_workers: list[int] = [stage.concurrency for stage in self.stages]
+        lock: threading.Lock = threading.Lock()
+        inputs = list(inputs)
+
+        def feed() -> None:
+            for index, item in enumerate(inputs):
+                queues[0].put((index, item))
+            for _ in range(self.stages[0].concurrency):
+                queues[0].put(_STOP)
+
+        threads: list[threading.Thread] = [
+            threading.Thread(target=feed, name="pipeline-feeder", daemon=True)
+        ]
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.concurrency):
+                threads.append(
+                    threading.Thread(
+                        target=self.__worker,
+                        args=(i, queues[i], outboxes[i], remaining_workers, lock),
+                        name=f"pipeline-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        # the results arrive out of order, keep them until the previous ones are ready
+        pending: dict[int, Any] = {}
+        next_index: int = 0
+        while next_index < len(inputs):
+            message = results.get()
+            if message is _STOP:
+                break
+            index, result = message
+            pending[index] = result
+            while next_index in pending:
+                yield inputs[next_index], pending.pop(next_index)
+                next_index += 1
+
+        for thread in threads:
+            thread.join()
+
+    def format_stats(self) -> str:
+        lines: list[str] = []
+        for stats in self.stats:
+            lines.append(
+                f"  {stats.name}: {stats.items} items ({stats.errors} errors), "
+                f"{stats.throughput:.2f} items/s, busy {stats.busy_seconds:.1f}s, "
+                f"queue depth max {stats.max_queue_depth} "
+                f"avg {stats.mean_queue_depth:.1f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,182 @@
+import math
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+from pipeline.metrics import QueryMetrics
+
+from .chunking import ChunkRecord, PageChunker, as_pages, chunk_text
+from .dedup import NearDuplicateFilter
+
+"""
+Lexical retrieval with BM25, computed on the chunks of the pages of every query.
+It needs no model, so it is used alone (bm25 retrieval mode) or to keep only the
+best candidate chunks before the embedding model (hybrid retrieval mode).
+"""
+
+_TOKEN_PATTERN: re.Pattern = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_scores(
+    query: str, chunks: list[str], k1: float = 1.5, b: float = 0.75
+) -> np.ndarray:
+    """BM25 score of every chunk for the query, the chunks are the whole collection"""
+    if not chunks:
+        return np.zeros(0)
+
+    counts: list[Counter] = [Counter(tokenize(chunk)) for chunk in chunks]
+    lengths: np.ndarray = np.array([sum(c.values()) for c in counts], dtype=np.float64)
+    average_length: float = float(lengths.mean()) or 1.0
+    # the part of the denominator that does not depend on the term
+    length_norm: np.ndarray = k1 * (1 - b + b * lengths / average_length)
+
+    scores: np.ndarray = np.zeros(len(chunks))
+    for term in set(tokenize(query)):
+        frequencies: np.ndarray = np.array(
+            [c.get(term, 0) for c in counts], dtype=np.float64
+        )
+        document_frequency: int = int(np.count_nonzero(frequencies))
+        if document_frequency == 0:
+            continue
+        idf: float = math.log(
+            1 + (len(chunks) - document_frequency + 0.5) / (document_frequency + 0.5)
+        )
+        scores += idf * frequencies * (k1 + 1) / (frequencies + length_norm)
+    return scores
+
+
+class BM25Retriever:
+    # same chunks of SentenceTransformerRetriever
+    __chunker: PageChunker = PageChunker(chunk_size=800, chunk_overlap=50)
+
+    def __init__(
+        self, k1: float = 1.5, b: float = 0.75, dedup: NearDuplicateFilter = None
+    ) -> None:
+        """With dedup the near-duplicate chunks of every query are ranked once"""
+        self.k1: float = k1
+        self.b: float = b
+        self.__dedup: NearDuplicateFilter = dedup
+
+    def close(self) -> None:
+        """Nothing to release, same interface of SentenceTransformerRetriever"""
+
+    def rank_chunks(
+        self, query: str, chunks: list[str]
+    ) -> tuple[list[int], list[float]]:
+        """Indices of the chunks from the best to the worst, and their scores"""
+        scores: np.ndarray = bm25_scores(query, chunks, self.k1, self.b)
+        # stable, so the chunks with the same score keep the order of the page
+        order: np.ndarray = np.argsort(-scores, kind="stable")
+        return order.tolist(), scores[order].tolist()
+
+    # ** MAIN METHOD
+    def get_relevant_chunks(
+        self,
+        data: str,
+        query: str,
+        max_chunk: int,
+        metrics: QueryMetrics = None,
+        pages: list[dict[str, str]] = None,
+    ) -> list[str]:
+        return self.get_relevant_chunks_batch(
+            [(data, query)],
+            max_chunk,
+            metrics=[metrics] if metrics else None,
+            pages=[pages] if pages is not None else None,
+        )[0]
+
+    def get_relevant_records(
+        self,
+        data: str,
+        query: str,
+        max_chunk: int,
+        metrics: QueryMetrics = None,
+        pages: list[dict[str, str]] = None,
+    ) -> list[ChunkRecord]:
+        """Same as get_relevant_chunks, see get_relevant_records_batch"""
+        return self.get_relevant_records_batch(
+            [(data, query)],
+            max_chunk,
+            metrics=[metrics] if metrics else None,
+            pages=[pages] if pages is not None else None,
+        )[0]
+
+    def get_relevant_chunks_batch(
+        self,
+        items: list[tuple[str, str]],
+        max_chunk: int,
+        batch_size: int = 32,
+        metrics: list[QueryMetrics] = None,
+        pages: list[list[dict[str, str]]] = None,
+    ) -> list[list[str]]:
+        """
+        Same interface of SentenceTransformerRetriever (batch_size is not used).
+        A chunk is relevant if it contains at least a word of the query
+        """
+        records_per_item: list[list[ChunkRecord]] = self.get_relevant_records_batch(
+            items, max_chunk, batch_size, metrics, pages
+        )
+        return [
+            [
+                chunk_text(
+                    record, as_pages(document, pages[i] if pages is not None else None)
+                )
+                for record in records
+            ]
+            for i, ((document, _), records) in enumerate(zip(items, records_per_item))
+        ]
+
+    def get_relevant_records_batch(
+        self,
+        items: list[tuple[str, str]],
+        max_chunk: int,
+        batch_size: int = 32,
+        metrics: list[QueryMetrics] = None,
+        pages: list[list[dict[str, str]]] = None,
+    ) -> list[list[ChunkRecord]]:
+        """
+        Same as get_relevant_chunks_batch, but every relevant chunk is a ChunkRecord
+        with its BM25 score, see SentenceTransformerRetriever
+        """
+        if metrics is None:
+            metrics = [QueryMetrics() for _ in items]
+
+        results: list[list[ChunkRecord]] = []
+        for i, ((document, query), item_metrics) in enumerate(zip(items, metrics)):
+            item_pages: list[dict[str, str]] = as_pages(
+                document, pages[i] if pages is not None else None
+            )
+            with item_metrics.measure("chunk"):
+                records: list[ChunkRecord] = list(self.__chunker.iter_pages(item_pages))
+                chunks: list[str] = [
+                    chunk_text(record, item_pages) for record in records
+                ]
+            item_metrics.count("chunks", len(chunks))
+            if self.__dedup is not None:
+                with item_metrics.measure("dedup"):
+                    kept: list[int] = self.__dedup.keep(chunks)
+                item_metrics.count("duplicate_chunks", len(chunks) - len(kept))
+                records = [records[j] for j in kept]
+                chunks = [chunks[j] for j in kept]
+
+            start: float = time.perf_counter()
+            order, scores = self.rank_chunks(query, chunks)
+            relevant_records: list[ChunkRecord] = [
+                records[j]._replace(score=score)
+                for j, score in zip(order[:max_chunk], scores)
+                if score > 0
+            ]
+            item_metrics.add_duration("lexical", time.perf_counter() - start)
+            item_metrics.count("relevant_chunks", len(relevant_records))
+
+            if not relevant_records:
+                print("[ERROR] No relevant chunks found.")
+            results.append(relevant_records)
+
+        return results
@@ -0,0 +1,147 @@
+from collections import deque
+from typing import Iterable, Iterator, NamedTuple
+
+"""
+Chunking of the scraped pages one page at a time, without joining them in a
+single document: a chunk is a ChunkRecord, the page it comes from and its
+offsets in the content of the page, its text is read only when needed (encoding,
+BM25, dedup) with chunk_text. The chunks are the same of langchain's
+RecursiveCharacterTextSplitter with the same chunk_size and chunk_overlap, so the
+embeddings already cached stay valid, but they are produced while the page is
+scanned and only the pieces of the chunk being built are kept in memory.
+"""
+
+
+class ChunkRecord(NamedTuple):
+    page: int  # index of the page in the list given to the chunker
+    start: int
+    end: int
+    score: float = 0.0
+
+
+class PageChunker:
+    def __init__(
+        self,
+        chunk_size: int = 800,
+        chunk_overlap: int = 50,
+        separators: list[str] = None,
+    ) -> None:
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be greater than 0")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be between 0 and chunk_size")
+        self.chunk_size: int = chunk_size
+        self.chunk_overlap: int = chunk_overlap
+        # from the strongest break, "" splits anywhere
+        self.separators: list[str] = separators or ["\n\n", "\n", " ", ""]
+
+    def iter_chunks(self, text: str, page: int = 0) -> Iterator[ChunkRecord]:
+        """The chunks of text, in order"""
+        for start, end in self.__split(text, 0, len(text), self.separators):
+            yield ChunkRecord(page, start, end)
+
+    def iter_pages(self, pages: list[dict[str, str]]) -> Iterator[ChunkRecord]:
+        """The chunks of every page ({"url", "content"}), page after page"""
+        for i, page in enumerate(pages):
+            if page["content"]:
+                yield from self.iter_chunks(page["content"], i)
+
+    @staticmethod
+    def __pieces(
+        text: str, start: int, end: int, separator: str
+    ) -> Iterator[tuple[int, int]]:
+        """Pieces of text[start:end], every piece but the first starts with separator"""
+        if not separator:
+            for i in range(start, end):
+                yield i, i + 1
+            return
+
+        piece_start: int = start
+        position: int = text.find(separator, start, end)
+        while position != -1:
+            if position > piece_start:
+                yield piece_start, position
+            piece_start = position
+            position = text.find(separator, position + len(separator), end)
+        if end > piece_start:
+            yield piece_start, end
+
+    @staticmethod
+    def __strip(text: str, start: int, end: int) -> tuple[int, int]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def __split(
+        self, text: str, start: int, end: int, separators: list[str]
+    ) -> Iterator[tuple[int, int]]:
+        # the first separator found in the text, the next ones split the long pieces
+        separator: str = separators[-1]
+        next_separators: list[str] = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                next_separators = separators[i + 1 :]
+                break
+
+        # the consecutive short pieces are merged up to chunk_size, a chunk starts
+        # with the last pieces of the one before, up to chunk_overlap characters
+        current: deque[tuple[int, int]] = deque()
+        total: int = 0
+        for piece_start, piece_end in self.__pieces(text, start, end, separator):
+            length: int = piece_end - piece_start
+            if length >= self.chunk_size:
+                if current:
+                    yield from self.__merged(text, current)
+                    current.clear()
+                    total = 0
+                if next_separators:
+                    yield from self.__split(
+                        text, piece_start, piece_end, next_separators
+                    )
+                else:
+                    yield piece_start, piece_end
+                continue
+
+            if total + length > self.chunk_size and current:
+                yield from self.__merged(text, current)
+                while total > self.chunk_overlap or (
+                    total + length > self.chunk_size and total > 0
+                ):
+                    first_start, first_end = current.popleft()
+                    total -= first_end - first_start
+            current.append((piece_start, piece_end))
+            total += length
+        if current:
+            yield from self.__merged(text, current)
+
+    def __merged(
+        self, text: str, pieces: deque[tuple[int, int]]
+    ) -> Iterable[tuple[int, int]]:
+        """The chunk made of the consecutive pieces, without the spaces around it"""
+        start, end = self.__strip(text, pieces[0][0], pieces[-1][1])
+        return [(start, end)] if start < end else []
+
+
+def as_pages(document: str, pages: list[dict[str, str]] = None) -> list[dict[str, str]]:
+    """The pages, or the document as a single page without url"""
+    return pages if pages is not None else [{"url": "", "content": document}]
+
+
+def chunk_text(record: ChunkRecord, pages: list[dict[str, str]]) -> str:
+    return pages[record.page]["content"][record.start : record.end]
+
+
+def source_urls(records: list[ChunkRecord], pages: list[dict[str, str]]) -> list[str]:
+    """The urls of the pages of the chunks, once, in the order of the chunks"""
+    urls: dict[str, None] = {}
+    for record in records:
+        url: str = pages[record.page]["url"]
+        if url:
+            urls[url] = None
+    return list(urls)
@@ -0,0 +1,103 @@
+import hashlib
+import re
+
+import numpy as np
+
+"""
+Near-duplicate detection with SimHash: every text gets a 64 bit fingerprint
+built from its word shingles, two texts are near duplicates if their
+fingerprints differ in at most max_distance bits. Mirrors, syndicated copies of
+the same article and the boilerplate repeated by the pages of a site end up with
+the same or almost the same fingerprint, while a different text has about half
+of the bits different.
+The fingerprints are split in max_distance + 1 bands: two fingerprints within
+max_distance bits have at least one band identical, so only the texts sharing a
+band are compared.
+"""
+
+_TOKEN_PATTERN: re.Pattern = re.compile(r"\w+")
+_BITS: int = 64
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64 bit SimHash of the word shingles of text (lowercase)"""
+    tokens: list[str] = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) > shingle_size:
+        tokens = [
+            " ".join(tokens[i : i + shingle_size])
+            for i in range(len(tokens) - shingle_size + 1)
+        ]
+    if not tokens:
+        return 0
+
+    # not hash(), it changes at every run and so would the dropped texts
+    hashes: np.ndarray = np.frombuffer(
+        b"".join(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            for token in tokens
+        ),
+        dtype=np.uint8,
+    )
+    # [n_shingles, 64] bits, +1 for the shingles with the bit set and -1 otherwise
+    bits: np.ndarray = np.unpackbits(hashes).reshape(-1, _BITS)
+    votes: np.ndarray = bits.sum(axis=0, dtype=np.int64) * 2 - len(tokens)
+    return int(np.packbits(votes > 0).view(">u8")[0])
+
+
+class NearDuplicateFilter:
+    def __init__(self, max_distance: int = 6, shingle_size: int = 3) -> None:
+        """
+        max_distance is the number of different bits of two near duplicates: with
+        6 a chunk with 1% of the words changed or a footer added is dropped, while
+        different chunks of the same topic are about 25 bits apart
+        """
+        if not 0 <= max_distance < _BITS:
+            raise ValueError(f"max_distance must be between 0 and {_BITS - 1}")
+        if shingle_size <= 0:
+            raise ValueError("shingle_size must be greater than 0")
+        self.max_distance: int = max_distance
+        self.shingle_size: int = shingle_size
+
+        bands: int = max_distance + 1
+        bounds: list[int] = [_BITS * i // bands for i in range(bands + 1)]
+        # (shift, mask) of every band
+        self.__bands: list[tuple[int, int]] = [
+            (start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])
+        ]
+
+    def keep(self, texts: list[str], seen: "SeenTexts" = None) -> list[int]:
+        """
+        Indices of the texts to keep, in order: a text is dropped if it is a near
+        duplicate of a text before it. With seen the texts kept by the previous
+        calls with the same seen count as before these ones
+        """
+        if seen is None:
+            seen = SeenTexts()
+        kept: list[int] = []
+        for i, text in enumerate(texts):
+            fingerprint: int = simhash(text, self.shingle_size)
+            keys: list[tuple[int, int]] = [
+                (band, (fingerprint >> shift) & mask)
+                for band, (shift, mask) in enumerate(self.__bands)
+            ]
+            if any(
+                (fingerprint ^ seen.fingerprints[j]).bit_count() <= self.max_distance
+                for key in keys
+                for j in seen.buckets.get(key, [])
+            ):
+                continue
+
+            for key in keys:
+                seen.buckets.setdefault(key, []).append(len(seen.fingerprints))
+            seen.fingerprints.append(fingerprint)
+            kept.append(i)
+        return kept
+
+
+class SeenTexts:
+    """Fingerprints of the texts kept by NearDuplicateFilter.keep"""
+
+    def __init__(self) -> None:
+        self.fingerprints: list[int] = []
+        # (band, value of the band) -> positions in fingerprints
+        self.buckets: dict[tuple[int, int], list[int]] = {}
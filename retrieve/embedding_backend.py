@@ -0,0 +1,152 @@
+import os
+import platform
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+"""
+How the embedding model runs, for the machines without a GPU:
+- backend: torch (PyTorch, the default) or onnx (ONNX Runtime, needs
+  `pip install sentence-transformers[onnx]`). The ONNX model is exported once and
+  saved in onnx_directory
+- precision: fp32 or int8. int8 quantizes the weights of the linear layers, with
+  torch while loading, with onnx once, saved next to the exported model
+- threads: CPU threads used by the model, 0 keeps the default (all the cores)
+- truncate_dim: keep only the first truncate_dim dimensions of the embeddings
+  (Matryoshka models like Qwen3-Embedding), smaller and faster to compare
+The embeddings of every variant are different, so the embedding cache and the
+knowledge base keep them apart, see model_id.
+"""
+
+SUPPORTED_EMBEDDING_BACKENDS: list[str] = ["torch", "onnx"]
+SUPPORTED_EMBEDDING_PRECISIONS: list[str] = ["fp32", "int8"]
+
+
+def get_onnx_quantization() -> str:
+    """The int8 kernels of ONNX Runtime matching this CPU"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            flags: str = f.read()
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+class EmbeddingBackend:
+    def __init__(
+        self,
+        backend: str = "torch",
+        precision: str = "fp32",
+        threads: int = 0,
+        truncate_dim: int = None,
+        onnx_directory: str = ".cache/onnx",
+    ) -> None:
+        if backend not in SUPPORTED_EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"Unsupported embedding backend: {backend}. "
+                f"Supported backends are: {SUPPORTED_EMBEDDING_BACKENDS}"
+            )
+        if precision not in SUPPORTED_EMBEDDING_PRECISIONS:
+            raise ValueError(
+                f"Unsupported embedding precision: {precision}. "
+                f"Supported precisions are: {SUPPORTED_EMBEDDING_PRECISIONS}"
+            )
+        if threads < 0:
+            raise ValueError("threads must be 0 or greater")
+        if truncate_dim is not None and truncate_dim <= 0:
+            raise ValueError("truncate_dim must be greater than 0")
+
+        self.backend: str = backend
+        self.precision: str = precision
+        self.threads: int = threads
+        self.truncate_dim: int = truncate_dim
+        self.onnx_directory: str = onnx_directory
+
+    def model_id(self, model_name: str) -> str:
+        """model_name with the variant, the default variant is just model_name"""
+        variant: list[str] = []
+        if self.backend != "torch":
+            variant.append(self.backend)
+        if self.precision != "fp32":
+            variant.append(self.precision)
+        if self.truncate_dim:
+            variant.append(f"{self.truncate_dim}d")
+        return "@".join([model_name] + variant)
+
+    def load(self, model_name: str) -> "SentenceTransformer":
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+        if self.backend == "onnx":
+            return self.__load_onnx(model_name)
+
+        # the int8 kernels of torch run only on the CPU
+        device: str = (
+            "cuda"
+            if torch.cuda.is_available() and self.precision == "fp32"
+            else "cpu"
+        )
+        embedder: SentenceTransformer = SentenceTransformer(
+            model_name, device=device, truncate_dim=self.truncate_dim
+        )
+        if self.precision == "int8":
+            embedder = torch.ao.quantization.quantize_dynamic(
+                embedder, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return embedder
+
+    def __load_onnx(self, model_name: str) -> "SentenceTransformer":
+        from sentence_transformers import SentenceTransformer
+
+        directory: str = os.path.join(
+            self.onnx_directory, re.sub(r"[^\w.-]", "_", model_name)
+        )
+        file_name: str = "onnx/model.onnx"
+        if not os.path.exists(os.path.join(directory, file_name)):
+            print(f"[INFO] Exporting {model_name} to ONNX, only the first time...")
+            SentenceTransformer(model_name, device="cpu", backend="onnx").save(
+                directory
+            )
+
+        if self.precision == "int8":
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            quantization: str = get_onnx_quantization()
+            file_name = f"onnx/model_qint8_{quantization}.onnx"
+            if not os.path.exists(os.path.join(directory, file_name)):
+                print(f"[INFO] Quantizing {model_name} ({quantization})...")
+                export_dynamic_quantized_onnx_model(
+                    SentenceTransformer(directory, device="cpu", backend="onnx"),
+                    quantization,
+                    directory,
+                )
+
+        model_kwargs: dict = {
+            "file_name": file_name,
+            "provider": "CPUExecutionProvider",
+        }
+        if self.threads:
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = session_options
+
+        return SentenceTransformer(
+            directory,
+            device="cpu",
+            backend="onnx",
+            truncate_dim=self.truncate_dim,
+            model_kwargs=model_kwargs,
+        )
@@ -0,0 +1,242 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+"""
+Persistent cache of the chunk embeddings.
+The vectors are stored as float16 rows of a memory-mapped file, a sqlite index maps
+the hash of (model name, chunk text) to its row. When the file reaches its size
+budget, the rows of the least recently used chunks are reused.
+"""
+
+
+class EmbeddingCache:
+    __INDEX_FILE: str = "index.sqlite"
+    __VECTORS_FILE: str = "embeddings.f16"
+    __GROW_ROWS: int = 4096
+
+    def __init__(self, directory: str, dim: int, max_size_mb: float = 500) -> None:
+        if dim <= 0:
+            raise ValueError("dim must be greater than 0")
+        if max_size_mb <= 0:
+            raise ValueError("max_size_mb must be greater than 0")
+
+        # every dimension has its own files, so that models of different size
+        # can share the same cache directory
+        self.directory: str = os.path.join(directory, f"{dim}d")
+        self.dim: int = dim
+        self.capacity: int = max(1, int(max_size_mb * 1024 * 1024) // (dim * 2))
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = sqlite3.connect(
+            os.path.join(self.directory, self.__INDEX_FILE), check_same_thread=False
+        )
+        self.__db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.__db.execute(
+            "CREATE INDEX IF NOT EXISTS lru ON embeddings (last_access)"
+        )
+        self.__db.commit()
+
+        self.__vectors_path: str = os.path.join(self.directory, self.__VECTORS_FILE)
+        self.__vectors: np.memmap = None
+        self.__rows: int = 0
+        self.__shrink()
+        self.__open_vectors()
+
+    @staticmethod
+    def get_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def __shrink(self) -> None:
+        """
+        Fit the cache in capacity when max_size_mb was lowered since the last run:
+        the least recently used rows are evicted and the rows left above capacity
+        are moved into the free rows below it. The rows of the index past the end
+        of the vectors file (e.g. the file was deleted) are dropped
+        """
+        row_size: int = self.dim * 2
+        file_rows: int = (
+            os.path.getsize(self.__vectors_path) // row_size
+            if os.path.exists(self.__vectors_path)
+            else 0
+        )
+        max_slot: int = self.__db.execute(
+            "SELECT COALESCE(MAX(slot), -1) FROM embeddings"
+        ).fetchone()[0]
+        if file_rows <= self.capacity and max_slot < min(self.capacity, file_rows):
+            return
+
+        # rows never written, e.g. the file was deleted
+        self.__db.execute("DELETE FROM embeddings WHERE slot >= ?", (file_rows,))
+        used: int = self.__db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if used > self.capacity:
+            self.__db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (used - self.capacity,),
+            )
+        slots: list[tuple[str, int]] = self.__db.execute(
+            "SELECT key, slot FROM embeddings"
+        ).fetchall()
+        # the rows are allocated in order, the free ones must stay at the end
+        taken: set[int] = {slot for _, slot in slots}
+        free: list[int] = [slot for slot in range(len(slots)) if slot not in taken]
+        moved: list[tuple[str, int]] = [
+            (key, slot) for key, slot in slots if slot >= len(slots)
+        ]
+        if moved:
+            vectors: np.memmap = np.memmap(
+                self.__vectors_path,
+                dtype=np.float16,
+                mode="r+",
+                shape=(file_rows, self.dim),
+            )
+            for (key, slot), new_slot in zip(moved, free):
+                vectors[new_slot] = vectors[slot]
+            vectors.flush()
+            del vectors
+            self.__db.executemany(
+                "UPDATE embeddings SET slot = ? WHERE key = ?",
+                [(new_slot, key) for (key, _), new_slot in zip(moved, free)],
+            )
+        self.__db.commit()
+
+        with open(self.__vectors_path, "ab") as f:
+            f.truncate(len(slots) * row_size)
+
+    def __open_vectors(self, min_rows: int = 0) -> None:
+        """(Re)map the vectors file, growing it to hold at least min_rows rows"""
+        row_size: int = self.dim * 2
+        current_rows: int = (
+            os.path.getsize(self.__vectors_path) // row_size
+            if os.path.exists(self.__vectors_path)
+            else 0
+        )
+        rows: int = current_rows
+        if min_rows > current_rows:
+            rows = min(self.capacity, max(min_rows, current_rows + self.__GROW_ROWS))
+            with open(self.__vectors_path, "ab") as f:
+                f.truncate(rows * row_size)
+
+        if self.__vectors is not None:
+            self.__vectors.flush()
+            self.__vectors = None
+
+        self.__rows = rows
+        if rows:
+            self.__vectors = np.memmap(
+                self.__vectors_path, dtype=np.float16, mode="r+", shape=(rows, self.dim)
+            )
+
+    def __select_slots(self, keys: list[str]) -> list[tuple[str, int]]:
+        rows: list[tuple[str, int]] = []
+        # sqlite limits the number of parameters of a query
+        for start in range(0, len(keys), 500):
+            batch: list[str] = keys[start : start + 500]
+            placeholders: str = ",".join("?" * len(batch))
+            rows.extend(
+                self.__db.execute(
+                    f"SELECT key, slot FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+            )
+        return rows
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Return the cached embeddings (as float32) of the keys found in the cache"""
+        if not keys:
+            return {}
+
+        found: dict[str, np.ndarray] = {}
+        with self.__lock:
+            slots: dict[str, int] = dict(self.__select_slots(keys))
+
+            if not slots:
+                return found
+
+            for key, slot in slots.items():
+                if slot < self.__rows:
+                    found[key] = np.asarray(self.__vectors[slot], dtype=np.float32)
+
+            now: float = time.time()
+            self.__db.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self.__db.commit()
+
+        return found
+
+    def __free_slots(self, count: int) -> list[int]:
+        """Find count rows to write into, evicting the least recently used if needed"""
+        used: int = self.__db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        new_slots: list[int] = []
+        if used < self.capacity:
+            # the rows are always allocated in order, so the first unused row is `used`
+            new_slots = list(range(used, min(self.capacity, used + count)))
+
+        evicted: list[int] = []
+        if len(new_slots) < count:
+            rows = self.__db.execute(
+                "SELECT key, slot FROM embeddings ORDER BY last_access LIMIT ?",
+                (count - len(new_slots),),
+            ).fetchall()
+            self.__db.executemany(
+                "DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows]
+            )
+            evicted = [slot for _, slot in rows]
+
+        return new_slots + evicted
+
+    def put_many(self, keys: list[str], embeddings: np.ndarray) -> None:
+        if len(keys) != len(embeddings):
+            raise ValueError("keys and embeddings must have the same length")
+
+        # a single call can not store more than the whole cache
+        keys = keys[-self.capacity :]
+        embeddings = np.asarray(embeddings)[-self.capacity :]
+
+        with self.__lock:
+            known: set[str] = {key for key, _ in self.__select_slots(keys)}
+
+            new_items: dict[str, np.ndarray] = {}
+            for key, embedding in zip(keys, embeddings):
+                if key not in known:
+                    new_items[key] = embedding
+            if not new_items:
+                return
+
+            slots: list[int] = self.__free_slots(len(new_items))
+            if max(slots) >= self.__rows:
+                self.__open_vectors(max(slots) + 1)
+
+            now: float = time.time()
+            for slot, embedding in zip(slots, new_items.values()):
+                self.__vectors[slot] = np.asarray(embedding, dtype=np.float16)
+            self.__vectors.flush()
+
+            self.__db.executemany(
+                "INSERT INTO embeddings (key, slot, last_access) VALUES (?, ?, ?)",
+                [(key, slot, now) for key, slot in zip(new_items, slots)],
+            )
+            self.__db.commit()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__vectors is not None:
+                self.__vectors.flush()
+                self.__vectors = None
+            self.__db.close()
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+"""
+Local knowledge base: every chunk embedded while answering is kept, with its
+normalized embedding and the url of its page, so later questions can be answered
+without going back to the web.
+The embeddings are float16 rows of a memory-mapped file that only grows, a sqlite
+table maps every row to its chunk and url. The search is exact (flat): the rows
+are read in blocks and scored with a single matrix product per block.
+"""
+
+
+class KnowledgeBase:
+    __CHUNKS_FILE: str = "chunks.sqlite"
+    __VECTORS_FILE: str = "vectors.f16"
+    __GROW_ROWS: int = 4096
+    # rows scored together by search, 16384 rows of 1024 float32 are 64MB
+    __SEARCH_BLOCK_ROWS: int = 16384
+
+    def __init__(self, directory: str, model_name: str, dim: int) -> None:
+        """
+        The embeddings of different models are not comparable, so every model has
+        its own index inside directory
+        """
+        if dim <= 0:
+            raise ValueError("dim must be greater than 0")
+
+        self.directory: str = os.path.join(
+            directory, re.sub(r"[^\w.-]", "_", model_name)
+        )
+        self.dim: int = dim
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = sqlite3.connect(
+            os.path.join(self.directory, self.__CHUNKS_FILE), check_same_thread=False
+        )
+        self.__db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                text TEXT NOT NULL,
+                added_at REAL NOT NULL
+            )
+            """
+        )
+        self.__db.commit()
+        self.size: int = self.__db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+        self.__vectors_path: str = os.path.join(self.directory, self.__VECTORS_FILE)
+        self.__vectors: np.memmap = None
+        self.__rows: int = 0
+        self.__open_vectors()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def __get_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __open_vectors(self, min_rows: int = 0) -> None:
+        """(Re)map the vectors file, growing it to hold at least min_rows rows"""
+        row_size: int = self.dim * 2
+        current_rows: int = (
+            os.path.getsize(self.__vectors_path) // row_size
+            if os.path.exists(self.__vectors_path)
+            else 0
+        )
+        rows: int = current_rows
+        if min_rows > current_rows:
+            rows = max(min_rows, current_rows + self.__GROW_ROWS)
+            with open(self.__vectors_path, "ab") as f:
+                f.truncate(rows * row_size)
+
+        if self.__vectors is not None:
+            self.__vectors.flush()
+            self.__vectors = None
+
+        self.__rows = rows
+        if rows:
+            self.__vectors = np.memmap(
+                self.__vectors_path, dtype=np.float16, mode="r+", shape=(rows, self.dim)
+            )
+
+    @staticmethod
+    def __normalize(embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms: np.ndarray = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def add(self, chunks: list[str], urls: list[str], embeddings: np.ndarray) -> int:
+        """Store the chunks not already in the index, returns how many were added"""
+        if not (len(chunks) == len(urls) == len(embeddings)):
+            raise ValueError("chunks, urls and embeddings must have the same length")
+        if not chunks:
+            return 0
+
+        embeddings = self.__normalize(embeddings)
+        hashes: list[str] = [self.__get_hash(chunk) for chunk in chunks]
+        with self.__lock:
+            known: set[str] = set()
+            # sqlite limits the number of parameters of a query
+            for start in range(0, len(hashes), 500):
+                batch: list[str] = hashes[start : start + 500]
+                placeholders: str = ",".join("?" * len(batch))
+                known.update(
+                    row[0]
+                    for row in self.__db.execute(
+                        f"SELECT hash FROM chunks WHERE hash IN ({placeholders})",
+                        batch,
+                    )
+                )
+
+            new_items: dict[str, int] = {}
+            for i, chunk_hash in enumerate(hashes):
+                if chunk_hash not in known and chunk_hash not in new_items:
+                    new_items[chunk_hash] = i
+            if not new_items:
+                return 0
+
+            first_row: int = self.size
+            if first_row + len(new_items) > self.__rows:
+                self.__open_vectors(first_row + len(new_items))
+            indices: list[int] = list(new_items.values())
+            self.__vectors[first_row : first_row + len(indices)] = embeddings[
+                indices
+            ].astype(np.float16)
+            self.__vectors.flush()
+
+            now: float = time.time()
+            self.__db.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+                [
+                    (first_row + n, hashes[i], urls[i], chunks[i], now)
+                    for n, i in enumerate(indices)
+                ],
+            )
+            self.__db.commit()
+            self.size += len(indices)
+            return len(indices)
+
+    def search(
+        self, query_embeddings: np.ndarray, top_k: int
+    ) -> list[list[dict[str, Any]]]:
+        """
+        The top_k most similar chunks (cosine similarity) of every query, best first,
+        as dicts with score, text and url
+        """
+        queries: np.ndarray = self.__normalize(query_embeddings)
+        with self.__lock:
+            size: int = self.size
+            if size == 0 or top_k <= 0:
+                return [[] for _ in queries]
+
+            best_scores: np.ndarray = np.empty((len(queries), 0), dtype=np.float32)
+            best_rows: np.ndarray = np.empty((len(queries), 0), dtype=np.int64)
+            for start in range(0, size, self.__SEARCH_BLOCK_ROWS):
+                end: int = min(size, start + self.__SEARCH_BLOCK_ROWS)
+                block: np.ndarray = np.asarray(
+                    self.__vectors[start:end], dtype=np.float32
+                )
+                scores: np.ndarray = queries @ block.T
+                rows: np.ndarray = np.broadcast_to(
+                    np.arange(start, end), scores.shape
+                )
+
+                # keep only the best top_k of the previous blocks and of this one
+                scores = np.concatenate([best_scores, scores], axis=1)
+                rows = np.concatenate([best_rows, rows], axis=1)
+                k: int = min(top_k, scores.shape[1])
+                keep: np.ndarray = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+                best_rows = np.take_along_axis(rows, keep, axis=1)
+
+            order: np.ndarray = np.argsort(-best_scores, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+            needed: list[int] = sorted({int(row) for row in best_rows.flatten()})
+            chunks: dict[int, tuple[str, str]] = {}
+            for start in range(0, len(needed), 500):
+                batch: list[int] = needed[start : start + 500]
+                placeholders: str = ",".join("?" * len(batch))
+                for row, url, text in self.__db.execute(
+                    f"SELECT row, url, text FROM chunks WHERE row IN ({placeholders})",
+                    batch,
+                ):
+                    chunks[row] = (url, text)
+
+        return [
+            [
+                {
+                    "score": float(score),
+                    "text": chunks[int(row)][1],
+                    "url": chunks[int(row)][0],
+                }
+                for score, row in zip(query_scores, query_rows)
+            ]
+            for query_scores, query_rows in zip(best_scores, best_rows)
+        ]
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__vectors is not None:
+                self.__vectors.flush()
+                self.__vectors = None
+            self.__db.close()
@@ -1,51 +1,613 @@
-import torch
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+import heapq
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable
+
+import numpy as np
+
+from pipeline.metrics import QueryMetrics
+
+from .bm25_retrieval import BM25Retriever
+from .chunking import ChunkRecord, PageChunker, as_pages, chunk_text
+from .dedup import NearDuplicateFilter, SeenTexts
+from .embedding_backend import EmbeddingBackend
+from .embedding_cache import EmbeddingCache
+from .knowledge_base import KnowledgeBase
+
+if TYPE_CHECKING:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+"""
+torch and sentence_transformers take seconds to import, they are imported with
+the model, see load_in_background
+"""
 
 
 class SentenceTransformerRetriever:
     # "Qwen/Qwen3-Embedding-0.6B"
 
-    __text_splitter: RecursiveCharacterTextSplitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=50,
-        length_function=len,
-        # separators=[
-        # ]
-    )
+    __chunker: PageChunker = PageChunker(chunk_size=800, chunk_overlap=50)
 
     __MIN_SCORE: float = 0.4  # Minimum similarity score to consider a chunk relevant
 
-    def __init__(self, model_name: str) -> None:
-        device: str = "cuda" if torch.cuda.is_available() else "cpu"
-        self.__embedder: SentenceTransformer = SentenceTransformer(model_name, device)
+    def __init__(
+        self,
+        model_name: str,
+        cache_directory: str = None,
+        cache_max_size_mb: float = 500,
+        lexical_candidates: int = None,
+        knowledge_base_directory: str = None,
+        load_in_background: bool = False,
+        dedup: NearDuplicateFilter = None,
+        backend: EmbeddingBackend = None,
+    ) -> None:
+        """
+        If cache_directory is given, the embeddings of the chunks are stored there
+        and a chunk already seen is never encoded again.
+        With lexical_candidates (hybrid retrieval) only the best lexical_candidates
+        chunks of every query according to BM25 are encoded and ranked by the model.
+        If knowledge_base_directory is given, every encoded chunk is also added to
+        the local knowledge base there, see search_knowledge_base.
+        With load_in_background the model is loaded (and warmed up) by a thread
+        while the caller goes on, e.g. searching the web, and the first method that
+        needs it waits for it.
+        With dedup the near-duplicate chunks of every query are dropped before
+        they are encoded, so the same paragraph cannot take more than one place.
+        backend sets how the model runs (ONNX, int8, threads, truncated embeddings),
+        by default PyTorch with the full embeddings
+        """
+        if lexical_candidates is not None and lexical_candidates <= 0:
+            raise ValueError("lexical_candidates must be greater than 0")
+        self.model_name: str = model_name
+        self.backend: EmbeddingBackend = backend or EmbeddingBackend()
+        # the name of the model in the embedding cache and in the knowledge base
+        self.model_id: str = self.backend.model_id(model_name)
+        self.lexical_candidates: int = lexical_candidates
+        self.__dedup: NearDuplicateFilter = dedup
+        self.__lexical_retriever: BM25Retriever = (
+            BM25Retriever() if lexical_candidates else None
+        )
+
+        self.__cache_directory: str = cache_directory
+        self.__cache_max_size_mb: float = cache_max_size_mb
+        self.__knowledge_base_directory: str = knowledge_base_directory
+        # the stores need the size of the embeddings, they are opened with the model
+        self.__embedding_cache: EmbeddingCache = None
+        self.__knowledge_base: KnowledgeBase = None
 
-    def __split_into_chunk(self, document: str) -> list[str]:
-        chunks = self.__text_splitter.split_text(document)
-        return chunks
+        # the fast tokenizers of the model fail if used by two threads at once
+        self.__encode_lock: threading.Lock = threading.Lock()
+        self.__model: Future = Future()
+        if load_in_background:
+            threading.Thread(
+                target=self.__load_model,
+                args=(True,),
+                name="embedding-model",
+                daemon=True,
+            ).start()
+        else:
+            self.__load_model(False)
+            # raise the errors of the loading here
+            self.__model.result()
 
-    # ** MAIN METHOD
-    def get_relevant_chunks(self, data: str, query: str, max_chunk: int) -> list[str]:
-        relevant_chunks: list[str] = []
-        chunks: list[str] = self.__split_into_chunk(data)
+    def __load_model(self, warm_up: bool) -> None:
+        try:
+            embedder: "SentenceTransformer" = self.backend.load(self.model_name)
+            dim: int = embedder.get_sentence_embedding_dimension()
+
+            if self.__cache_directory:
+                self.__embedding_cache = EmbeddingCache(
+                    self.__cache_directory, dim, max_size_mb=self.__cache_max_size_mb
+                )
+            if self.__knowledge_base_directory:
+                self.__knowledge_base = KnowledgeBase(
+                    self.__knowledge_base_directory, self.model_id, dim
+                )
+            if warm_up:
+                # the first call allocates the buffers of the model
+                embedder.encode_query(["warm up"], convert_to_numpy=True)
+            self.__model.set_result(embedder)
+        except BaseException as e:
+            self.__model.set_exception(e)
+
+    def __wait_for_model(self) -> "SentenceTransformer":
+        """The model, waiting for it if it is still loading"""
+        if not self.__model.done():
+            print("[INFO] Waiting for the embedding model...")
+        return self.__model.result()
+
+    @property
+    def __embedder(self) -> "SentenceTransformer":
+        return self.__wait_for_model()
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        if self.__knowledge_base_directory is None:
+            return None
+        self.__wait_for_model()
+        return self.__knowledge_base
+
+    def close(self) -> None:
+        """Flush and close the embedding cache and the knowledge base"""
+        # a model still loading opens them when it is ready
+        try:
+            self.__wait_for_model()
+        except Exception:
+            return
+        if self.__embedding_cache is not None:
+            self.__embedding_cache.close()
+            self.__embedding_cache = None
+        if self.__knowledge_base is not None:
+            self.__knowledge_base.close()
+            self.__knowledge_base = None
+
+    def __split_pages(
+        self, pages: list[dict[str, str]]
+    ) -> tuple[list[ChunkRecord], list[str]]:
+        """The chunks of the pages, page by page, and their text"""
+        records: list[ChunkRecord] = list(self.__chunker.iter_pages(pages))
+        return records, [chunk_text(record, pages) for record in records]
+
+    def __encode_chunks(
+        self, chunks: list[str], batch_size: int = 32
+    ) -> tuple["torch.Tensor", set[int]]:
+        """
+        Encode the chunks, only the ones missing from the cache go through the model.
+        Returns the embeddings and the indices of the chunks found in the cache
+        """
+        self.__wait_for_model()  # the cache is opened with the model
+        import torch
+
+        # encode_document sorts the texts by length before splitting them in batches,
+        # so passing all the chunks at once keeps the padding of every batch small
+        if self.__embedding_cache is None:
+            with self.__encode_lock:
+                embeddings = self.__embedder.encode_document(
+                    chunks, batch_size=batch_size, convert_to_tensor=True
+                )
+            return embeddings, set()
 
-        chunks_embeddings = self.__embedder.encode_document(
-            chunks, convert_to_tensor=True
+        keys: list[str] = [
+            EmbeddingCache.get_key(self.model_id, chunk) for chunk in chunks
+        ]
+        cached: dict[str, np.ndarray] = self.__embedding_cache.get_many(keys)
+
+        missing: list[int] = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            with self.__encode_lock:
+                new_embeddings: np.ndarray = self.__embedder.encode_document(
+                    [chunks[i] for i in missing],
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                )
+            self.__embedding_cache.put_many(
+                [keys[i] for i in missing], new_embeddings
+            )
+            for i, embedding in zip(missing, new_embeddings):
+                cached[keys[i]] = embedding
+
+        embeddings: np.ndarray = np.stack(
+            [np.asarray(cached[key], dtype=np.float32) for key in keys]
         )
+        missing_set: set[int] = set(missing)
+        cached_indices: set[int] = {
+            i for i in range(len(keys)) if i not in missing_set
+        }
+        return torch.from_numpy(embeddings).to(self.__embedder.device), cached_indices
 
-        top_k = min(max_chunk, len(chunks))
-        query_embedding = self.__embedder.encode_query(query, convert_to_tensor=True)
+    def __get_lexical_candidates(
+        self, query: str, chunks: list[str], metrics: QueryMetrics
+    ) -> list[int]:
+        """
+        Indices of the best lexical_candidates chunks for BM25, in the order of the
+        page. The chunks without any word of the query only fill the free places, so
+        a query in another language than the page still gets candidates
+        """
+        if len(chunks) <= self.lexical_candidates:
+            metrics.count("candidate_chunks", len(chunks))
+            return list(range(len(chunks)))
 
-        similarity_scores = self.__embedder.similarity(
-            query_embedding, chunks_embeddings
+        with metrics.measure("lexical"):
+            order, _ = self.__lexical_retriever.rank_chunks(query, chunks)
+            candidates: list[int] = sorted(order[: self.lexical_candidates])
+        metrics.count("candidate_chunks", len(candidates))
+        return candidates
+
+    def search_knowledge_base(
+        self,
+        queries: list[str],
+        max_chunk: int,
+        batch_size: int = 32,
+        metrics: list[QueryMetrics] = None,
+    ) -> list[tuple[list[str], float, list[str]]]:
+        """
+        Search the chunks of every query in the local knowledge base.
+        Returns for every query its relevant chunks, the score of the best one
+        (0.0 if the knowledge base is empty), to decide if the web is needed, and
+        the urls of the pages of the relevant chunks
+        """
+        if self.knowledge_base is None:
+            raise ValueError("The knowledge base is not enabled")
+        if metrics is None:
+            metrics = [QueryMetrics() for _ in queries]
+
+        start: float = time.perf_counter()
+        with self.__encode_lock:
+            queries_embeddings: np.ndarray = self.__embedder.encode_query(
+                queries, batch_size=batch_size, convert_to_numpy=True
+            )
+        found: list[list[dict]] = self.knowledge_base.search(
+            queries_embeddings, max_chunk
+        )
+        seconds: float = time.perf_counter() - start
+
+        results: list[tuple[list[str], float, list[str]]] = []
+        for chunks, item_metrics in zip(found, metrics):
+            item_metrics.add_duration("index", seconds)
+            relevant: list[dict] = [
+                chunk for chunk in chunks if chunk["score"] >= self.__MIN_SCORE
+            ]
+            urls: list[str] = [chunk["url"] for chunk in relevant if chunk["url"]]
+            results.append(
+                (
+                    [chunk["text"] for chunk in relevant],
+                    chunks[0]["score"] if chunks else 0.0,
+                    list(dict.fromkeys(urls)),
+                )
+            )
+        return results
+
+    # ** MAIN METHOD
+    def get_relevant_chunks(
+        self,
+        data: str,
+        query: str,
+        max_chunk: int,
+        metrics: QueryMetrics = None,
+        pages: list[dict[str, str]] = None,
+    ) -> list[str]:
+        return self.get_relevant_chunks_batch(
+            [(data, query)],
+            max_chunk,
+            metrics=[metrics] if metrics else None,
+            pages=[pages] if pages is not None else None,
+        )[0]
+
+    def get_relevant_records(
+        self,
+        data: str,
+        query: str,
+        max_chunk: int,
+        metrics: QueryMetrics = None,
+        pages: list[dict[str, str]] = None,
+    ) -> list[ChunkRecord]:
+        """Same as get_relevant_chunks, see get_relevant_records_batch"""
+        return self.get_relevant_records_batch(
+            [(data, query)],
+            max_chunk,
+            metrics=[metrics] if metrics else None,
+            pages=[pages] if pages is not None else None,
         )[0]
-        scores, indices = torch.topk(similarity_scores, k=top_k)
 
-        for score, idx in zip(scores, indices):
-            if score >= self.__MIN_SCORE:
-                relevant_chunks.append(chunks[idx])
+    def get_relevant_chunks_batch(
+        self,
+        items: list[tuple[str, str]],
+        max_chunk: int,
+        batch_size: int = 32,
+        metrics: list[QueryMetrics] = None,
+        pages: list[list[dict[str, str]]] = None,
+    ) -> list[list[str]]:
+        """
+        Same as calling get_relevant_chunks for every (document, query) pair, but the
+        chunks of all the documents and all the queries are encoded together in large
+        batches, and the scores of all the queries are computed in one pass.
+        metrics, if given, has the QueryMetrics of every pair: the embedding and the
+        similarity are shared, so every pair gets the duration of the whole batch.
+        pages, if given, has the scraped pages ({"url", "content"}) of every pair,
+        the document is then chunked page by page so every chunk knows its url.
+        Returns the relevant chunks of every pair, in the same order of items
+        """
+        records_per_item: list[list[ChunkRecord]] = self.get_relevant_records_batch(
+            items, max_chunk, batch_size, metrics, pages
+        )
+        return [
+            [chunk_text(record, item_pages) for record in records]
+            for records, item_pages in zip(
+                records_per_item, self.__pages_per_item(items, pages)
+            )
+        ]
+
+    @staticmethod
+    def __pages_per_item(
+        items: list[tuple[str, str]], pages: list[list[dict[str, str]]]
+    ) -> list[list[dict[str, str]]]:
+        return [
+            as_pages(document, pages[i] if pages is not None else None)
+            for i, (document, _) in enumerate(items)
+        ]
+
+    def get_relevant_records_batch(
+        self,
+        items: list[tuple[str, str]],
+        max_chunk: int,
+        batch_size: int = 32,
+        metrics: list[QueryMetrics] = None,
+        pages: list[list[dict[str, str]]] = None,
+    ) -> list[list[ChunkRecord]]:
+        """
+        Same as get_relevant_chunks_batch, but every relevant chunk is a ChunkRecord
+        with its score: the page is its index in the pages of the pair (as_pages,
+        the document is the only page without pages)
+        """
+        if not items:
+            return []
+        if metrics is None:
+            metrics = [QueryMetrics() for _ in items]
+        pages_per_item: list[list[dict[str, str]]] = self.__pages_per_item(
+            items, pages
+        )
+
+        records_per_item: list[list[ChunkRecord]] = []
+        chunks_per_item: list[list[str]] = []
+        for item_pages, item_metrics in zip(pages_per_item, metrics):
+            with item_metrics.measure("chunk"):
+                records, chunks = self.__split_pages(item_pages)
+            item_metrics.count("chunks", len(chunks))
+            if self.__dedup is not None:
+                with item_metrics.measure("dedup"):
+                    kept: list[int] = self.__dedup.keep(chunks)
+                item_metrics.count("duplicate_chunks", len(chunks) - len(kept))
+                records = [records[j] for j in kept]
+                chunks = [chunks[j] for j in kept]
+            records_per_item.append(records)
+            chunks_per_item.append(chunks)
 
-        if not relevant_chunks:
+        if self.__lexical_retriever is not None:
+            for i, ((_, query), item_metrics) in enumerate(zip(items, metrics)):
+                candidates: list[int] = self.__get_lexical_candidates(
+                    query, chunks_per_item[i], item_metrics
+                )
+                records_per_item[i] = [records_per_item[i][j] for j in candidates]
+                chunks_per_item[i] = [chunks_per_item[i][j] for j in candidates]
+
+        # the same chunk (e.g. the same page found by two queries) is encoded once
+        unique_chunks: dict[str, int] = {}
+        unique_urls: list[str] = []
+        indices_per_item: list[list[int]] = []
+        for records, chunks, item_pages in zip(
+            records_per_item, chunks_per_item, pages_per_item
+        ):
+            indices: list[int] = []
+            for record, chunk in zip(records, chunks):
+                if chunk not in unique_chunks:
+                    unique_chunks[chunk] = len(unique_chunks)
+                    unique_urls.append(item_pages[record.page]["url"])
+                indices.append(unique_chunks[chunk])
+            indices_per_item.append(indices)
+        if not unique_chunks:
             print("[ERROR] No relevant chunks found.")
+            return [[] for _ in items]
+
+        start: float = time.perf_counter()
+        chunks_embeddings, cached_indices = self.__encode_chunks(
+            list(unique_chunks), batch_size
+        )
+        with self.__encode_lock:
+            queries_embeddings = self.__embedder.encode_query(
+                [query for _, query in items],
+                batch_size=batch_size,
+                convert_to_tensor=True,
+            )
+        embed_seconds: float = time.perf_counter() - start
+
+        if self.knowledge_base is not None:
+            start = time.perf_counter()
+            added: int = self.knowledge_base.add(
+                list(unique_chunks), unique_urls, chunks_embeddings.cpu().numpy()
+            )
+            index_seconds: float = time.perf_counter() - start
+            for item_metrics in metrics:
+                item_metrics.add_duration("index", index_seconds)
+            if added:
+                print(f"[INFO] Added {added} chunks to the knowledge base.")
+        if self.__embedding_cache is not None:
+            for indices, item_metrics in zip(indices_per_item, metrics):
+                hits: int = sum(1 for index in indices if index in cached_indices)
+                item_metrics.count("embedding_cache_hits", hits)
+                item_metrics.count("embedding_cache_misses", len(indices) - hits)
+
+        import torch
+
+        start = time.perf_counter()
+        # [n_queries, n_unique_chunks]
+        similarity_scores = self.__embedder.similarity(
+            queries_embeddings, chunks_embeddings
+        )
+
+        # keep for every query only the scores of its own chunks, padded to the
+        # longest list with -inf so that the top k of all queries is a single call
+        max_len: int = max(len(indices) for indices in indices_per_item)
+        gather_indices = torch.zeros((len(items), max(max_len, 1)), dtype=torch.long)
+        padding = torch.full(gather_indices.shape, float("-inf"))
+        for row, indices in enumerate(indices_per_item):
+            if indices:
+                gather_indices[row, : len(indices)] = torch.tensor(indices)
+                padding[row, : len(indices)] = 0.0
+
+        item_scores = similarity_scores.gather(
+            1, gather_indices.to(similarity_scores.device)
+        ) + padding.to(similarity_scores.device)
+
+        top_k: int = max(1, min(max_chunk, max_len))
+        scores, positions = torch.topk(item_scores, k=top_k, dim=1)
+        scores, positions = scores.tolist(), positions.tolist()
+        similarity_seconds: float = time.perf_counter() - start
+
+        results: list[list[ChunkRecord]] = []
+        for row, records in enumerate(records_per_item):
+            relevant_records: list[ChunkRecord] = [
+                records[position]._replace(score=score)
+                for score, position in zip(scores[row], positions[row])
+                if score >= self.__MIN_SCORE
+            ]
+
+            if not relevant_records:
+                print("[ERROR] No relevant chunks found.")
+            results.append(relevant_records)
+
+            metrics[row].add_duration("embed", embed_seconds)
+            metrics[row].add_duration("similarity", similarity_seconds)
+            metrics[row].count("relevant_chunks", len(relevant_records))
+
+        return results
+
+    def start_incremental(
+        self,
+        query: str,
+        max_chunk: int,
+        stable_pages: int = 1,
+        batch_size: int = 32,
+        metrics: QueryMetrics = None,
+    ) -> "IncrementalSearch":
+        """
+        Find the relevant chunks of the query while its pages are still being
+        scraped: give every page to add_page as soon as it arrives, then get the
+        chunks with result(). See IncrementalSearch
+        """
+        return IncrementalSearch(
+            query,
+            max_chunk,
+            lambda search, page: self.__score_page(search, page, batch_size),
+            min_score=self.__MIN_SCORE,
+            stable_pages=stable_pages,
+            metrics=metrics,
+        )
+
+    def __score_page(
+        self, search: "IncrementalSearch", page: int, batch_size: int
+    ) -> list[ChunkRecord]:
+        """The new chunks of search.pages[page] with their score for the query"""
+        metrics: QueryMetrics = search.metrics
+        with metrics.measure("chunk"):
+            records, chunks = self.__split_pages([search.pages[page]])
+            records = [record._replace(page=page) for record in records]
+        metrics.count("chunks", len(chunks))
+        if self.__dedup is not None:
+            # also the chunks of the pages already scored are seen
+            with metrics.measure("dedup"):
+                kept: list[int] = self.__dedup.keep(chunks, search.seen)
+            metrics.count("duplicate_chunks", len(chunks) - len(kept))
+            records = [records[j] for j in kept]
+            chunks = [chunks[j] for j in kept]
+        if self.__lexical_retriever is not None:
+            candidates: list[int] = self.__get_lexical_candidates(
+                search.query, chunks, metrics
+            )
+            records = [records[j] for j in candidates]
+            chunks = [chunks[j] for j in candidates]
+        if not chunks:
             return []
-        return relevant_chunks
+
+        start: float = time.perf_counter()
+        chunks_embeddings, cached_indices = self.__encode_chunks(chunks, batch_size)
+        if search.query_embedding is None:
+            with self.__encode_lock:
+                search.query_embedding = self.__embedder.encode_query(
+                    [search.query], convert_to_tensor=True
+                )
+        metrics.add_duration("embed", time.perf_counter() - start)
+
+        if self.knowledge_base is not None:
+            with metrics.measure("index"):
+                added: int = self.knowledge_base.add(
+                    chunks,
+                    [search.pages[page]["url"]] * len(chunks),
+                    chunks_embeddings.cpu().numpy(),
+                )
+            if added:
+                print(f"[INFO] Added {added} chunks to the knowledge base.")
+        if self.__embedding_cache is not None:
+            metrics.count("embedding_cache_hits", len(cached_indices))
+            metrics.count("embedding_cache_misses", len(chunks) - len(cached_indices))
+
+        with metrics.measure("similarity"):
+            scores: list[float] = self.__embedder.similarity(
+                search.query_embedding, chunks_embeddings
+            )[0].tolist()
+        return [
+            record._replace(score=score) for record, score in zip(records, scores)
+        ]
+
+
+class IncrementalSearch:
+    def __init__(
+        self,
+        query: str,
+        max_chunk: int,
+        score_page: Callable[["IncrementalSearch", int], list[ChunkRecord]],
+        min_score: float,
+        stable_pages: int = 1,
+        metrics: QueryMetrics = None,
+    ) -> None:
+        """
+        Running top max_chunk chunks of the pages given to add_page.
+        score_page returns the new chunks of a page (its index in pages) with their
+        score. The search is complete when the top chunks are all above min_score
+        and did not change for stable_pages pages in a row
+        """
+        if max_chunk <= 0:
+            raise ValueError("max_chunk must be greater than 0")
+        if stable_pages <= 0:
+            raise ValueError("stable_pages must be greater than 0")
+        self.query: str = query
+        self.max_chunk: int = max_chunk
+        self.min_score: float = min_score
+        self.stable_pages: int = stable_pages
+        self.metrics: QueryMetrics = metrics or QueryMetrics(query)
+        # the pages given to add_page, the chunks point to them
+        self.pages: list[dict[str, str]] = []
+        # state of score_page: the chunks already seen and the query encoded once
+        self.seen: SeenTexts = SeenTexts()
+        self.query_embedding: Any = None
+
+        self.__score_page = score_page
+        # min-heap of (score, position of the chunk, chunk)
+        self.__top: list[tuple[float, int, ChunkRecord]] = []
+        self.__scored: int = 0
+        self.__stable: int = 0
+
+    def add_page(self, page: dict[str, str]) -> bool:
+        """Score the chunks of the page, True if the search is complete"""
+        self.pages.append(page)
+        before: set[int] = {position for _, position, _ in self.__top}
+        for record in self.__score_page(self, len(self.pages) - 1):
+            item: tuple[float, int, ChunkRecord] = (
+                record.score,
+                self.__scored,
+                record,
+            )
+            self.__scored += 1
+            if len(self.__top) < self.max_chunk:
+                heapq.heappush(self.__top, item)
+            elif record.score > self.__top[0][0]:
+                heapq.heapreplace(self.__top, item)
+
+        after: set[int] = {position for _, position, _ in self.__top}
+        complete: bool = (
+            len(self.__top) == self.max_chunk and self.__top[0][0] >= self.min_score
+        )
+        self.__stable = self.__stable + 1 if complete and after == before else 0
+        return self.__stable >= self.stable_pages
+
+    def result(self) -> list[ChunkRecord]:
+        """The relevant chunks, from the best, their page is in pages"""
+        best_first: list = sorted(self.__top, key=lambda item: (-item[0], item[1]))
+        relevant_records: list[ChunkRecord] = [
+            record for score, _, record in best_first if score >= self.min_score
+        ]
+        if not relevant_records:
+            print("[ERROR] No relevant chunks found.")
+        self.metrics.count("relevant_chunks", len(relevant_records))
+        return relevant_records
@@ -0,0 +1,68 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator
+
+import pytest
+
+"""
+Shared fixtures: local_server serves the responses of a handler function, so the
+http components are tested without the network
+"""
+
+# (method, path, body) -> (status, headers, body)
+Handler = Callable[[str, str, bytes], tuple[int, dict[str, str], bytes]]
+
+
+class LocalServer:
+    def __init__(self) -> None:
+        self.handler: Handler = lambda method, path, body: (404, {}, b"")
+        self.requests: list[tuple[str, str]] = []
+        self.client_ports: set[int] = set()
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def __answer(self, method: str) -> None:
+                length: int = int(self.headers.get("Content-Length") or 0)
+                body: bytes = self.rfile.read(length) if length else b""
+                server.requests.append((method, self.path))
+                server.client_ports.add(self.client_address[1])
+                status, headers, content = server.handler(method, self.path, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self) -> None:
+                self.__answer("GET")
+
+            def do_POST(self) -> None:
+                self.__answer("POST")
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, daemon=True
+        )
+        self.__thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.__server.server_port}"
+
+    def close(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+@pytest.fixture
+def local_server() -> Iterator[LocalServer]:
+    server: LocalServer = LocalServer()
+    yield server
+    server.close()
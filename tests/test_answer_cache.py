@@ -0,0 +1,54 @@
+import llm.answer_cache
+from llm.answer_cache import AnswerCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now: float = 1000.0
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+def test_key_changes_with_every_input():
+    key: str = AnswerCache.get_key("gemma3:4b", 0.3, "template", "prompt")
+    assert key == AnswerCache.get_key("gemma3:4b", 0.3, "template", "prompt")
+    assert key != AnswerCache.get_key("mistral-nemo", 0.3, "template", "prompt")
+    assert key != AnswerCache.get_key("gemma3:4b", 0.7, "template", "prompt")
+    assert key != AnswerCache.get_key("gemma3:4b", 0.3, "other", "prompt")
+    assert key != AnswerCache.get_key("gemma3:4b", 0.3, "template", "other")
+
+
+def test_put_and_get(tmp_path):
+    cache: AnswerCache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    cache.put("k1", "La città è Roma.")
+    assert cache.get("k1") == "La città è Roma."
+    assert cache.get("k2") is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    cache.close()
+
+    # persisted
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    assert cache.get("k1") == "La città è Roma."
+    cache.close()
+
+
+def test_least_recently_used_answers_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm.answer_cache, "time", FakeClock())
+    cache: AnswerCache = AnswerCache(
+        str(tmp_path / "answers.sqlite"), max_size_mb=25 / (1024 * 1024)
+    )
+    cache.put("a", "a" * 10)
+    cache.put("b", "b" * 10)
+    # a is now more recent than b
+    assert cache.get("a") is not None
+    cache.put("c", "c" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 10
+    assert cache.get("c") == "c" * 10
+
+    # larger than the whole cache
+    cache.put("d", "d" * 30)
+    assert cache.get("d") is None
+    cache.close()
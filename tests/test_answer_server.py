@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pipeline.answer_server import AnswerServer
+
+
+class SlowAnswers:
+    """answer_fn whose questions starting with "slow" wait for release"""
+
+    def __init__(self) -> None:
+        self.release: threading.Event = threading.Event()
+        self.calls: list[str] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def __call__(self, query, language, use_cache, metrics):
+        with self.lock:
+            self.calls.append(query)
+        if query.startswith("slow"):
+            self.release.wait(10)
+        return f"answer to {query}", "OK", ["https://a.com/"]
+
+
+def post(server: AnswerServer, body: dict) -> tuple[int, dict]:
+    request = urllib.request.Request(
+        f"{server.base_url}/answer", data=json.dumps(body).encode("utf-8")
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def answers():
+    slow_answers: SlowAnswers = SlowAnswers()
+    yield slow_answers
+    slow_answers.release.set()
+
+
+def test_answer(answers):
+    with AnswerServer(answers, port=0, workers=1) as server:
+        status, body = post(server, {"query": "What is SQLite?"})
+    assert status == 200
+    assert body["final_answer"] == "answer to What is SQLite?"
+    assert body["sources"] == ["https://a.com/"]
+    assert body["coalesced"] is False
+
+
+def test_invalid_request(answers):
+    with AnswerServer(answers, port=0, workers=1) as server:
+        assert post(server, {"query": ""})[0] == 400
+        assert post(server, {"query": "q", "timeout": -1})[0] == 400
+
+
+def test_identical_requests_are_coalesced(answers):
+    with AnswerServer(answers, port=0, workers=2) as server:
+        first, _ = server.submit("slow SQLite", "English")
+        same, coalesced = server.submit("slow SQLite", "english")
+        other_case, other_coalesced = server.submit("slow sqlite", "english")
+        assert same is first and coalesced
+        assert other_case is not first and not other_coalesced
+        answers.release.set()
+        assert server.wait(first, 5)["final_answer"] == "answer to slow SQLite"
+        assert server.wait(other_case, 5)["final_answer"] == "answer to slow sqlite"
+    assert sorted(answers.calls) == ["slow SQLite", "slow sqlite"]
+
+
+def test_timed_out_question_gets_its_worker_replaced(answers):
+    with AnswerServer(answers, port=0, workers=1, max_abandoned=1) as server:
+        status, _ = post(server, {"query": "slow 1", "timeout": 0.2})
+        assert status == 504
+        # the only worker is still busy with slow 1, a new one answers
+        status, body = post(server, {"query": "fast", "timeout": 2})
+        assert status == 200
+        assert server.health()["abandoned"] == 1
+
+        # over max_abandoned the worker is not replaced
+        assert post(server, {"query": "slow 2", "timeout": 0.2})[0] == 504
+        assert post(server, {"query": "fast 2", "timeout": 0.3})[0] == 504
+
+        answers.release.set()
+        assert post(server, {"query": "fast 3", "timeout": 5})[0] == 200
+        assert server.health()["abandoned"] == 0
+        assert server.health()["timeouts"] == 3
+
+
+def test_queue_full(answers):
+    with AnswerServer(answers, port=0, workers=1, queue_size=1) as server:
+        running, _ = server.submit("slow 1", "global")
+        while server.health()["running"] == 0:
+            time.sleep(0.01)
+        queued, _ = server.submit("slow 2", "global")
+        rejected, _ = server.submit("slow 3", "global")
+        assert running is not None and queued is not None and rejected is None
+        answers.release.set()
+        assert server.wait(queued, 5)["status"] == "OK"
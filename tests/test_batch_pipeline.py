@@ -0,0 +1,96 @@
+from answer_using_web import execute_answer_using_web, execute_answer_using_web_batch
+from retrieve.bm25_retrieval import BM25Retriever
+
+PAGES: dict[str, list[dict[str, str]]] = {
+    "sqlite": [
+        {"url": "https://a.com/", "content": "sqlite is a small database engine"},
+        {"url": "https://b.com/", "content": "postgres is a database server"},
+        {"url": "https://c.com/", "content": "sqlite stores a database in a file"},
+    ],
+    "rust": [{"url": "https://rust.com/", "content": "rust is a language"}],
+    "nothing": [],
+}
+
+
+class FakeScraper:
+    def get_scraped_pages(self, query, search_engine, max_pages, language, **kwargs):
+        return PAGES[query.split()[0]]
+
+
+class FakeLLMManager:
+    model_name: str = "fake"
+    max_in_flight: int = 2
+
+    def answer_query(self, dict_for_template, use_cache=True, metrics=None):
+        return dict_for_template["document"]
+
+
+class KnowledgeBaseRetriever(BM25Retriever):
+    """Knows the answer of the questions about rust"""
+
+    def search_knowledge_base(self, queries, max_chunk, metrics=None):
+        return [
+            (["stored"], 0.9, ["https://stored.com/"])
+            if query.startswith("rust")
+            else ([], 0.0, [])
+            for query in queries
+        ]
+
+
+def make_init(retriever: BM25Retriever, min_confidence: float = None) -> dict:
+    return {
+        "config": {"max_chunk": 2, "max_pages": 3, "search_engine": "ddg"},
+        "retrieval": retriever,
+        "scraper": FakeScraper(),
+        "llm_manager": FakeLLMManager(),
+        "knowledge_base_min_confidence": min_confidence,
+    }
+
+
+def answer_single(init: dict, query: str) -> tuple:
+    return execute_answer_using_web(
+        query,
+        3,
+        "english",
+        "ddg",
+        init["retrieval"],
+        "ollama",
+        "fake",
+        2,
+        False,
+        "{question}",
+        0.3,
+        False,
+        scraper=init["scraper"],
+        llm_manager=init["llm_manager"],
+        knowledge_base_min_confidence=init["knowledge_base_min_confidence"],
+    )
+
+
+def check_same_as_single(init: dict, queries: list[str]) -> list[tuple]:
+    batch: list[tuple] = execute_answer_using_web_batch(queries, "english", init)
+    for query, (answer, status, sources, metrics) in zip(queries, batch):
+        assert (answer, status, sources) == answer_single(init, query)
+        assert metrics.status == status
+    return batch
+
+
+def test_batch_sources_match_single_mode():
+    queries: list[str] = ["sqlite file", "sqlite database", "rust", "nothing"]
+    batch: list[tuple] = check_same_as_single(make_init(BM25Retriever()), queries)
+    # the page of the best chunk first, max_chunk chunks
+    assert [sources for _, _, sources, _ in batch] == [
+        ["https://c.com/", "https://a.com/"],
+        ["https://a.com/", "https://c.com/"],
+        ["https://rust.com/"],
+        [],
+    ]
+
+
+def test_batch_sources_from_the_knowledge_base():
+    init: dict = make_init(KnowledgeBaseRetriever(), min_confidence=0.75)
+    batch: list[tuple] = check_same_as_single(init, ["rust", "sqlite file"])
+    assert [(status, sources) for _, status, sources, _ in batch] == [
+        ("KNOWLEDGE_BASE", ["https://stored.com/"]),
+        ("OK", ["https://c.com/", "https://a.com/"]),
+    ]
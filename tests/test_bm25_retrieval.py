@@ -0,0 +1,120 @@
+import math
+import types
+
+import numpy as np
+import pytest
+
+from pipeline.metrics import QueryMetrics
+from retrieve.bm25_retrieval import BM25Retriever, bm25_scores, tokenize
+from retrieve.st_retrieval import SentenceTransformerRetriever
+
+CHUNKS: list[str] = [
+    "the cat sat on the mat",
+    "the dog chased the cat",
+    "a bird sang in the tree",
+    "the fish swam in the sea, the fish ate",
+]
+
+
+def test_tokenize():
+    assert tokenize("The Cat, the DOG's 2 bowls!") == [
+        "the", "cat", "the", "dog", "s", "2", "bowls"
+    ]
+
+
+def test_exact_term_ranking():
+    order, scores = BM25Retriever().rank_chunks("fish", CHUNKS)
+    assert order[0] == 3
+    assert scores[0] > 0 and scores[1:] == [0, 0, 0]
+
+    # the rarer word first, then the shorter of the chunks with the same word
+    order, _ = BM25Retriever().rank_chunks("cat bird", CHUNKS)
+    assert order[:3] == [2, 1, 0]
+
+
+def test_score_of_a_single_term():
+    k1: float = 1.5
+    b: float = 0.75
+    scores: np.ndarray = bm25_scores("dog", CHUNKS, k1, b)
+    lengths: list[int] = [len(tokenize(chunk)) for chunk in CHUNKS]
+    average_length: float = sum(lengths) / len(lengths)
+    idf: float = math.log(1 + (4 - 1 + 0.5) / (1 + 0.5))
+    expected: float = (
+        idf * (k1 + 1) / (1 + k1 * (1 - b + b * lengths[1] / average_length))
+    )
+    assert scores.tolist() == pytest.approx([0, expected, 0, 0])
+
+
+def test_term_in_every_chunk_has_a_small_idf():
+    # "the" is in every chunk: its idf is log(1 + 0.5 / 4.5), not negative
+    scores: np.ndarray = bm25_scores("the", CHUNKS)
+    assert np.all(scores > 0)
+    assert np.all(scores < bm25_scores("dog", CHUNKS)[1])
+    # it does not change the order given by the other words
+    order, _ = BM25Retriever().rank_chunks("the dog", CHUNKS)
+    assert order[0] == 1
+
+
+def test_empty_query():
+    for query in ("", "  ,.!"):
+        order, scores = BM25Retriever().rank_chunks(query, CHUNKS)
+        # every score is 0, the chunks keep the order of the page
+        assert order == [0, 1, 2, 3] and scores == [0, 0, 0, 0]
+
+
+def test_query_term_missing_from_the_corpus():
+    assert bm25_scores("unicorn", CHUNKS).tolist() == [0, 0, 0, 0]
+    assert bm25_scores("unicorn cat", CHUNKS).tolist() == pytest.approx(
+        bm25_scores("cat", CHUNKS).tolist()
+    )
+
+
+def test_no_chunks():
+    assert bm25_scores("cat", []).tolist() == []
+    assert BM25Retriever().rank_chunks("cat", []) == ([], [])
+
+
+def test_only_chunks_with_a_query_word_are_relevant():
+    content: str = "\n\n".join(CHUNKS)
+    retriever: BM25Retriever = BM25Retriever()
+    assert retriever.get_relevant_chunks(content, "unicorn", 5) == []
+    chunks: list[str] = retriever.get_relevant_chunks(content, "dog", 5)
+    assert len(chunks) == 1 and "dog" in chunks[0]
+
+
+def make_hybrid(lexical_candidates: int) -> SentenceTransformerRetriever:
+    """The candidates are chosen before the model is used"""
+    embedder = types.SimpleNamespace(get_sentence_embedding_dimension=lambda: 8)
+    backend = types.SimpleNamespace(
+        model_id=lambda model_name: model_name, load=lambda model_name: embedder
+    )
+    return SentenceTransformerRetriever(
+        "stub", lexical_candidates=lexical_candidates, backend=backend
+    )
+
+
+def get_candidates(
+    retriever: SentenceTransformerRetriever, query: str, metrics: QueryMetrics
+) -> list[int]:
+    return retriever._SentenceTransformerRetriever__get_lexical_candidates(
+        query, CHUNKS, metrics
+    )
+
+
+def test_hybrid_candidates_are_the_best_chunks_in_page_order():
+    metrics: QueryMetrics = QueryMetrics("q")
+    assert get_candidates(make_hybrid(2), "fish cat", metrics) == [1, 3]
+    assert metrics.counters["candidate_chunks"] == 2
+
+
+def test_hybrid_candidates_filled_with_chunks_without_query_words():
+    # a query in another language still gets lexical_candidates chunks
+    metrics: QueryMetrics = QueryMetrics("q")
+    assert get_candidates(make_hybrid(3), "dog", metrics) == [0, 1, 2]
+    assert get_candidates(make_hybrid(2), "pesce", metrics) == [0, 1]
+
+
+def test_hybrid_keeps_every_chunk_when_they_are_few():
+    metrics: QueryMetrics = QueryMetrics("q")
+    assert get_candidates(make_hybrid(10), "fish", metrics) == [0, 1, 2, 3]
+    assert metrics.counters["candidate_chunks"] == 4
@@ -0,0 +1,93 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+from web.browser_pool import BrowserPool
+
+
+class FakeCrawler:
+    """Stands in for crawl4ai.AsyncWebCrawler, no browser is launched"""
+
+    started: list["FakeCrawler"] = []
+
+    def __init__(self, config=None) -> None:
+        self.closed: bool = False
+
+    async def start(self) -> None:
+        FakeCrawler.started.append(self)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeCrawler.started = []
+    monkeypatch.setitem(
+        sys.modules,
+        "crawl4ai",
+        types.SimpleNamespace(AsyncWebCrawler=FakeCrawler),
+    )
+    browser_pool: BrowserPool = BrowserPool(lambda: None, size=1, recycle_after=3)
+    yield browser_pool
+    browser_pool.close()
+
+
+async def _use(pool: BrowserPool) -> FakeCrawler:
+    async with pool.acquire() as crawler:
+        return crawler
+
+
+async def _use_until_cancelled(pool: BrowserPool) -> None:
+    loaded: asyncio.Event = asyncio.Event()
+
+    async def load_page() -> None:
+        async with pool.acquire():
+            loaded.set()
+            await asyncio.sleep(10)
+
+    task: asyncio.Task = asyncio.create_task(load_page())
+    await loaded.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def _fail(pool: BrowserPool) -> None:
+    with pytest.raises(RuntimeError):
+        async with pool.acquire():
+            raise RuntimeError("crash")
+
+
+def test_cancelled_page_keeps_the_browser(pool):
+    first: FakeCrawler = pool.run(_use(pool))
+    pool.run(_use_until_cancelled(pool))
+    assert pool.run(_use(pool)) is first
+    assert not first.closed
+    assert len(FakeCrawler.started) == 1
+
+
+def test_failed_page_replaces_the_browser(pool):
+    first: FakeCrawler = pool.run(_use(pool))
+    pool.run(_fail(pool))
+    assert first.closed
+    second: FakeCrawler = pool.run(_use(pool))
+    assert second is not first
+    assert len(FakeCrawler.started) == 2
+
+
+def test_browser_recycled_after_pages(pool):
+    crawlers: list[FakeCrawler] = [pool.run(_use(pool)) for _ in range(4)]
+    assert crawlers[0] is crawlers[2]
+    assert crawlers[0].closed
+    assert crawlers[3] is not crawlers[0]
+
+
+def test_close_stops_the_browsers(pool):
+    crawler: FakeCrawler = pool.run(_use(pool))
+    pool.close()
+    assert crawler.closed
+    with pytest.raises(RuntimeError):
+        pool.run(_use(pool))
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from retrieve.chunking import ChunkRecord, PageChunker, chunk_text, source_urls
+
+WORDS: list[str] = ["a", "river", "the", "bridge", "internationalization", "x" * 90]
+BREAKS: list[str] = [" ", " ", " ", "\n", "\n\n", "  ", " \n "]
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    parts: list[str] = []
+    while sum(map(len, parts)) < length:
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice(BREAKS))
+    return "".join(parts)
+
+
+def test_chunks_are_offsets_into_the_page():
+    chunker: PageChunker = PageChunker(chunk_size=20, chunk_overlap=5)
+    pages: list[dict[str, str]] = [
+        {"url": "https://a.com", "content": "First page.\n\nIt has two parts."},
+        {"url": "https://b.com", "content": ""},
+        {"url": "https://c.com", "content": "Third page."},
+    ]
+    records: list[ChunkRecord] = list(chunker.iter_pages(pages))
+    assert [chunk_text(r, pages) for r in records] == [
+        "First page.",
+        "It has two parts.",
+        "Third page.",
+    ]
+    assert [r.page for r in records] == [0, 0, 2]
+    assert source_urls(records, pages) == ["https://a.com", "https://c.com"]
+
+
+@pytest.mark.parametrize(
+    "chunk_size, chunk_overlap", [(800, 50), (100, 20), (40, 0), (30, 29)]
+)
+def test_same_chunks_as_langchain(chunk_size, chunk_overlap):
+    text_splitters = pytest.importorskip("langchain_text_splitters")
+    splitter = text_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    chunker: PageChunker = PageChunker(chunk_size, chunk_overlap)
+    rng: random.Random = random.Random(chunk_size)
+    for length in [0, 10, chunk_size, chunk_size * 3, 5000]:
+        text: str = random_text(rng, length)
+        chunks: list[str] = [text[s:e] for _, s, e, _ in chunker.iter_chunks(text)]
+        assert chunks == splitter.split_text(text)
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        PageChunker(chunk_size=0)
+    with pytest.raises(ValueError):
+        PageChunker(chunk_size=10, chunk_overlap=10)
@@ -0,0 +1,63 @@
+import pytest
+
+from llm.context_packer import CHUNK_SEPARATOR, ContextPacker, estimate_tokens
+from pipeline.metrics import QueryMetrics
+
+TEMPLATE: str = "{question}\n{document}"
+
+
+def packer_for(document_tokens: int) -> ContextPacker:
+    """A packer that leaves document_tokens to the chunks of the question q"""
+    return ContextPacker(TEMPLATE, document_tokens + 1 + 10, answer_tokens=10)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("the cat") == 2
+    # long words, numbers and symbols count more
+    assert estimate_tokens("internationalization") == 4
+    assert estimate_tokens("12345 !") == 3
+    assert estimate_tokens("東京都") == 3
+
+
+def test_budget_leaves_room_for_template_and_answer():
+    packer: ContextPacker = packer_for(50)
+    assert packer.budget({"question": "q"}) == 50
+
+
+def test_chunks_that_fit_are_kept_in_order():
+    packer: ContextPacker = packer_for(50)
+    chunks: list[str] = ["first chunk.", "second chunk."]
+    assert packer.pack(chunks, {"question": "q"}) == CHUNK_SEPARATOR.join(chunks)
+
+
+def test_chunk_is_cut_at_sentence_end():
+    packer: ContextPacker = packer_for(10)
+    metrics: QueryMetrics = QueryMetrics("q")
+    chunks: list[str] = [
+        "One two three. Four five six. Seven eight nine.",
+        "Too long for what is left.",
+        "Short.",
+    ]
+    document: str = packer.pack(chunks, {"question": "q"}, metrics)
+    assert document == "One two three. Four five six.\n\nShort."
+    assert estimate_tokens(document) <= 10
+    assert metrics.counters["trimmed_chunks"] == 2
+
+
+def test_cut_keeps_lines_and_list_structure():
+    packer: ContextPacker = packer_for(9)
+    chunk: str = "Ingredients:\n- flour\n- two eggs\n\nMix them. Bake for an hour."
+    assert packer.pack([chunk], {"question": "q"}) == (
+        "Ingredients:\n- flour\n- two eggs"
+    )
+
+
+def test_chunk_without_sentence_end_within_budget_is_left_out():
+    packer: ContextPacker = packer_for(3)
+    assert packer.pack(["one two three four five"], {"question": "q"}) == ""
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        ContextPacker(TEMPLATE, 512, answer_tokens=512)
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import retrieve.dedup
+from retrieve.dedup import NearDuplicateFilter, SeenTexts, simhash
+
+ARTICLE: str = (
+    "The river flows through the old town and under seven stone bridges, the "
+    "oldest of them was built by the Romans and is still open to the traffic. "
+    "In spring the water rises and the lower streets are closed for some days, "
+    "while in summer the banks are full of people walking and fishing."
+)
+
+
+def test_simhash_is_stable_and_case_insensitive():
+    assert simhash(ARTICLE) == simhash(ARTICLE)
+    assert simhash(ARTICLE) == simhash(ARTICLE.upper())
+    assert simhash("") == 0
+
+
+def test_near_duplicates_are_close():
+    rng: random.Random = random.Random(0)
+    words: list[str] = [f"word{rng.randint(0, 5000)}" for _ in range(400)]
+    text: str = " ".join(words)
+    changed: str = " ".join(words[:200] + ["changed"] + words[201:])
+    other: str = " ".join(f"word{rng.randint(0, 5000)}" for _ in range(400))
+    assert (simhash(text) ^ simhash(changed)).bit_count() <= 6
+    assert (simhash(text) ^ simhash(text + " Share this page.")).bit_count() <= 6
+    assert (simhash(text) ^ simhash(other)).bit_count() > 20
+
+
+def test_keep_drops_later_duplicates():
+    dedup: NearDuplicateFilter = NearDuplicateFilter()
+    texts: list[str] = [ARTICLE, "Something else entirely.", ARTICLE + " Share."]
+    assert dedup.keep(texts) == [0, 1]
+
+    # the texts kept by the calls before count with the same seen
+    seen: SeenTexts = SeenTexts()
+    assert dedup.keep([ARTICLE], seen) == [0]
+    assert dedup.keep(["Something else entirely.", ARTICLE], seen) == [0]
+    assert dedup.keep([ARTICLE], SeenTexts()) == [0]
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 6])
+def test_bands_find_every_near_duplicate(monkeypatch, max_distance):
+    """The banded search drops the same texts as comparing every pair"""
+    monkeypatch.setattr(retrieve.dedup, "simhash", lambda text, size: int(text))
+    rng: random.Random = random.Random(max_distance)
+    fingerprints: list[int] = []
+    for _ in range(300):
+        if fingerprints and rng.random() < 0.5:
+            # a copy of a fingerprint before with a few bits flipped
+            fingerprint: int = rng.choice(fingerprints)
+            for bit in rng.sample(range(64), rng.randint(0, max_distance + 2)):
+                fingerprint ^= 1 << bit
+        else:
+            fingerprint = rng.getrandbits(64)
+        fingerprints.append(fingerprint)
+
+    expected: list[int] = []
+    for i, fingerprint in enumerate(fingerprints):
+        if all(
+            (fingerprint ^ fingerprints[j]).bit_count() > max_distance
+            for j in expected
+        ):
+            expected.append(i)
+
+    dedup: NearDuplicateFilter = NearDuplicateFilter(max_distance)
+    assert dedup.keep([str(f) for f in fingerprints]) == expected
+    assert 0 < len(expected) < len(fingerprints)
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(max_distance=64)
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(shingle_size=0)
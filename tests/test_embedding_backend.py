@@ -0,0 +1,68 @@
+import pytest
+
+from retrieve.embedding_backend import EmbeddingBackend
+from retrieve.embedding_cache import EmbeddingCache
+from retrieve.knowledge_base import KnowledgeBase
+
+MODEL: str = "Qwen/Qwen3-Embedding-0.6B"
+
+VARIANTS: list[dict] = [
+    {},
+    {"backend": "onnx"},
+    {"precision": "int8"},
+    {"backend": "onnx", "precision": "int8"},
+    {"truncate_dim": 256},
+    {"truncate_dim": 512},
+    {"backend": "onnx", "precision": "int8", "truncate_dim": 256},
+]
+
+
+def test_default_variant_is_the_model_name():
+    assert EmbeddingBackend().model_id(MODEL) == MODEL
+    # threads and the onnx directory do not change the embeddings
+    backend: EmbeddingBackend = EmbeddingBackend(threads=2, onnx_directory="x")
+    assert backend.model_id(MODEL) == MODEL
+
+
+def test_every_variant_has_its_own_model_id():
+    model_ids: list[str] = [
+        EmbeddingBackend(**variant).model_id(MODEL) for variant in VARIANTS
+    ]
+    assert len(set(model_ids)) == len(VARIANTS)
+    assert EmbeddingBackend("onnx", "int8", truncate_dim=256).model_id(MODEL) == (
+        f"{MODEL}@onnx@int8@256d"
+    )
+    # and so its own cache keys
+    keys: set[str] = {
+        EmbeddingCache.get_key(model_id, "chunk") for model_id in model_ids
+    }
+    assert len(keys) == len(VARIANTS)
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_same_config_same_model_id(variant):
+    first: EmbeddingBackend = EmbeddingBackend(**variant)
+    second: EmbeddingBackend = EmbeddingBackend(**variant)
+    assert first.model_id(MODEL) == second.model_id(MODEL)
+
+
+def test_every_variant_has_its_own_knowledge_base(tmp_path):
+    directories: set[str] = set()
+    for variant in VARIANTS:
+        knowledge_base: KnowledgeBase = KnowledgeBase(
+            str(tmp_path), EmbeddingBackend(**variant).model_id(MODEL), 8
+        )
+        directories.add(knowledge_base.directory)
+        knowledge_base.close()
+    assert len(directories) == len(VARIANTS)
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        EmbeddingBackend(backend="tensorflow")
+    with pytest.raises(ValueError):
+        EmbeddingBackend(precision="int4")
+    with pytest.raises(ValueError):
+        EmbeddingBackend(threads=-1)
+    with pytest.raises(ValueError):
+        EmbeddingBackend(truncate_dim=0)
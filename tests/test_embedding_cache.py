@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+
+from retrieve.embedding_cache import EmbeddingCache
+
+DIM: int = 4
+
+
+def size_mb(rows: int) -> float:
+    """max_size_mb of a cache of rows embeddings"""
+    return rows * DIM * 2 / (1024 * 1024)
+
+
+def vector(i: int) -> np.ndarray:
+    return np.full(DIM, i, dtype=np.float32)
+
+
+def put(cache: EmbeddingCache, ids: list[int]) -> None:
+    cache.put_many([f"k{i}" for i in ids], np.stack([vector(i) for i in ids]))
+
+
+def test_put_and_get(tmp_path):
+    cache: EmbeddingCache = EmbeddingCache(str(tmp_path), DIM, size_mb(10))
+    put(cache, [1, 2])
+    found = cache.get_many(["k1", "k2", "k3"])
+    assert sorted(found) == ["k1", "k2"]
+    np.testing.assert_array_equal(found["k2"], vector(2))
+    assert found["k2"].dtype == np.float32
+    cache.close()
+
+    # persisted
+    cache = EmbeddingCache(str(tmp_path), DIM, size_mb(10))
+    np.testing.assert_array_equal(cache.get_many(["k1"])["k1"], vector(1))
+    cache.close()
+
+
+def test_key_depends_on_model_and_text():
+    assert EmbeddingCache.get_key("a", "text") != EmbeddingCache.get_key("b", "text")
+    assert EmbeddingCache.get_key("a", "text") == EmbeddingCache.get_key("a", "text")
+
+
+def test_least_recently_used_rows_are_reused(tmp_path):
+    cache: EmbeddingCache = EmbeddingCache(str(tmp_path), DIM, size_mb(3))
+    put(cache, [1, 2, 3])
+    # k1 becomes the most recently used
+    cache.get_many(["k1"])
+    put(cache, [4])
+    assert sorted(cache.get_many([f"k{i}" for i in range(1, 5)])) == ["k1", "k3", "k4"]
+    np.testing.assert_array_equal(cache.get_many(["k4"])["k4"], vector(4))
+    cache.close()
+
+
+def test_put_more_than_the_capacity(tmp_path):
+    cache: EmbeddingCache = EmbeddingCache(str(tmp_path), DIM, size_mb(2))
+    put(cache, [1, 2, 3, 4])
+    assert sorted(cache.get_many(["k1", "k2", "k3", "k4"])) == ["k3", "k4"]
+    cache.close()
+
+
+def test_capacity_lowered_between_runs(tmp_path):
+    cache: EmbeddingCache = EmbeddingCache(str(tmp_path), DIM, size_mb(10))
+    put(cache, list(range(10)))
+    # the most recently used are the ones in the last rows
+    cache.get_many(["k8", "k9", "k1"])
+    cache.close()
+
+    cache = EmbeddingCache(str(tmp_path), DIM, size_mb(4))
+    assert cache.capacity == 4
+    keys: list[str] = [f"k{i}" for i in range(10)]
+    found = cache.get_many(keys)
+    assert len(found) == 4
+    assert {"k8", "k9", "k1"} <= set(found)
+    for key, embedding in found.items():
+        np.testing.assert_array_equal(embedding, vector(int(key[1:])))
+
+    # new rows stay within the capacity
+    put(cache, [20, 21, 22])
+    found = cache.get_many(keys + ["k20", "k21", "k22"])
+    assert len(found) == 4
+    np.testing.assert_array_equal(found["k22"], vector(22))
+    cache.close()
+    assert (tmp_path / f"{DIM}d" / "embeddings.f16").stat().st_size == 4 * DIM * 2
+
+
+def test_vectors_file_deleted_between_runs(tmp_path):
+    cache: EmbeddingCache = EmbeddingCache(str(tmp_path), DIM, size_mb(10))
+    put(cache, [1, 2, 3])
+    cache.close()
+    os.remove(os.path.join(str(tmp_path), f"{DIM}d", "embeddings.f16"))
+
+    cache = EmbeddingCache(str(tmp_path), DIM, size_mb(10))
+    assert cache.get_many(["k1", "k2", "k3"]) == {}
+    # the keys can be cached again
+    put(cache, [1, 2, 3])
+    found = cache.get_many(["k1", "k2", "k3"])
+    assert sorted(found) == ["k1", "k2", "k3"]
+    np.testing.assert_array_equal(found["k3"], vector(3))
+    cache.close()
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from bench.local_web import PAGES_DIR
+from web.html_extraction import (
+    LxmlExtractor,
+    SelectolaxExtractor,
+    SoupExtractor,
+    get_extractor,
+)
+
+SNIPPETS: list[str] = [
+    "<p>one</p><p>two</p>",
+    "<p>one<p>two",
+    "<p>one<p>two</p>three</p>",
+    "<p>a<script>var x = 1;</script>b</p>",
+    "<p>a<style>p { color: red }</style><template>t</template>b</p>",
+    "<p>a<!-- comment -->b</p>",
+    "<p>a<span>b</span><b>c</b>&amp; d<br>e</p>",
+    "<p>a<b>x</b>  \n <i>y</i></p>",
+    "<p>one<div>two</div>three</p>",
+    "<p>a<ul><li>b</li></ul>c",
+    "<p>a<table><tr><td>b</td></tr></table>",
+    "<p>a<h2>b</h2>",
+    "<p>a<section>b</section>c</p>",
+    "<dl><dt>term</dt><dd>a<p>b</p>c</dd></dl>",
+    "<dl><dd>a<dd>b</dl>",
+    "<p>a<dd>b</dd>",
+    "<p>città € 😀</p>",
+    "<p></p><p>  </p>",
+    "",
+]
+
+# lxml is the reference, selectolax follows the HTML5 rules (e.g. a section
+# closes a paragraph) so it is compared only on the pages
+ENGINES: list[str] = ["bs4", "selectolax"]
+
+
+def make_extractor(engine: str):
+    extractor_class = {"bs4": SoupExtractor, "selectolax": SelectolaxExtractor}
+    try:
+        return extractor_class[engine]()
+    except ImportError:
+        pytest.skip(f"{engine} is not installed")
+
+
+def read_pages() -> list[str]:
+    pages: list[str] = []
+    for name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, name), "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+@pytest.mark.parametrize("html", SNIPPETS)
+def test_bs4_paragraphs_match_lxml(html):
+    assert SoupExtractor().get_paragraphs(html) == LxmlExtractor().get_paragraphs(
+        html
+    )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_paragraphs_of_pages_match_lxml(engine):
+    extractor = make_extractor(engine)
+    for page in read_pages():
+        expected: list[str] = LxmlExtractor().get_paragraphs(page)
+        assert expected
+        assert extractor.get_paragraphs(page) == expected
+        assert extractor.get_paragraphs(page.encode("utf-8")) == expected
+
+
+def test_non_text_elements_are_stripped():
+    for extractor in (LxmlExtractor(), SoupExtractor()):
+        html: str = "<p>a<script>alert(1)</script>b<style>.x{}</style>c</p>"
+        assert extractor.get_paragraphs(html) == ["abc"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_ddg_results_match_lxml(engine):
+    extractor = make_extractor(engine)
+    html: str = """
+    <div class="links_main result__body">
+      <h2><a href="https://a.com">A</a></h2>
+      <a class="result__snippet">about a</a>
+      <a class="result__url" href="https://a.com">a.com</a>
+    </div>
+    <div class="links_main"><a class="badge--ad">Ad</a>
+      <h2><a href="https://ad.com">Ad</a></h2>
+      <a class="result__snippet">ad</a>
+      <a class="result__url" href="https://ad.com">ad.com</a>
+    </div>
+    <div class="links_main"><h2><a href="https://b.com">no url</a></h2></div>
+    """
+    expected: list[dict[str, str]] = LxmlExtractor().get_ddg_results(html, 5)
+    assert expected == [
+        {"title": "A", "description": "about a", "url": "https://a.com"}
+    ]
+    assert extractor.get_ddg_results(html, 5) == expected
+
+
+def test_get_extractor():
+    assert get_extractor("bs4").name == "bs4"
+    assert get_extractor("lxml").name == "lxml"
+    assert get_extractor().name in ("selectolax", "lxml")
+    with pytest.raises(ValueError):
+        get_extractor("regex")
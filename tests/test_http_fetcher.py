@@ -0,0 +1,205 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+import types
+
+from web.http_fetcher import (
+    BROWSER_TIER,
+    HTTP_TIER,
+    DomainTiers,
+    HttpFetcher,
+    decode_html,
+)
+from web.web_scraper import WebScraper
+
+ITALIAN: str = "Perché la città è più bella d'estate"
+PAGE: str = f"<html><body><main><p>{ITALIAN}</p></main></body></html>"
+
+
+def test_decode_html_uses_the_charset_of_the_header():
+    body: bytes = PAGE.encode("cp1252")
+    assert ITALIAN in decode_html(body, "text/html; charset=windows-1252")
+
+
+def test_decode_html_uses_the_meta_charset():
+    page: str = PAGE.replace("<html>", '<html><meta charset="iso-8859-1">')
+    assert ITALIAN in decode_html(page.encode("latin-1"), "text/html")
+
+
+def test_decode_html_without_charset_is_utf8():
+    assert ITALIAN in decode_html(PAGE.encode("utf-8"), "text/html")
+
+
+def test_decode_html_falls_back_when_not_utf8():
+    body: bytes = PAGE.encode("latin-1")
+    assert ITALIAN in decode_html(body, "text/html", lambda: "latin-1")
+    # unknown encodings are ignored
+    assert ITALIAN in decode_html(body, "text/html; charset=nope", lambda: None)
+
+
+def test_fetch_charset_less_utf8_page(local_server):
+    local_server.handler = lambda method, path, body: (
+        200,
+        {"Content-Type": "text/html"},
+        PAGE.encode("utf-8"),
+    )
+    fetcher: HttpFetcher = HttpFetcher(min_text_chars=10)
+    try:
+        html, text, headers = fetcher.fetch(f"{local_server.url}/page")
+    finally:
+        fetcher.close()
+    assert ITALIAN in html
+    assert text == ITALIAN
+
+
+def test_fetch_skips_pages_too_big(local_server):
+    local_server.handler = lambda method, path, body: (
+        200,
+        {"Content-Type": "text/html"},
+        PAGE.encode("utf-8") * 1000,
+    )
+    fetcher: HttpFetcher = HttpFetcher(min_text_chars=10, max_page_mb=0.01)
+    try:
+        assert fetcher.fetch(f"{local_server.url}/page") is None
+    finally:
+        fetcher.close()
+
+
+def test_domain_needs_browser_after_pages_in_a_row():
+    tiers: DomainTiers = DomainTiers(browser_after=3)
+    url: str = "https://example.com/a"
+    tiers.record(url, BROWSER_TIER)
+    tiers.record(url, BROWSER_TIER)
+    assert tiers.get(url) == HTTP_TIER
+    # a page read with http starts the count again
+    tiers.record(url, HTTP_TIER)
+    tiers.record(url, BROWSER_TIER)
+    tiers.record(url, BROWSER_TIER)
+    assert tiers.get(url) == HTTP_TIER
+    tiers.record(url, BROWSER_TIER)
+    assert tiers.get("https://example.com/b") == BROWSER_TIER
+    assert tiers.get("https://other.com/") == HTTP_TIER
+
+
+def test_domain_tiers_are_persisted(tmp_path):
+    path: str = str(tmp_path / "tiers.sqlite")
+    tiers: DomainTiers = DomainTiers(path, browser_after=2)
+    tiers.record("https://example.com/a", BROWSER_TIER)
+    tiers.record("https://example.com/b", BROWSER_TIER)
+    tiers.record("https://half.com/a", BROWSER_TIER)
+    tiers.close()
+
+    tiers = DomainTiers(path, browser_after=2)
+    assert tiers.get("https://example.com/") == BROWSER_TIER
+    tiers.record("https://half.com/b", BROWSER_TIER)
+    assert tiers.get("https://half.com/") == BROWSER_TIER
+    tiers.close()
+
+    tiers = DomainTiers(path, retry_http_after=0, browser_after=2)
+    assert tiers.get("https://example.com/") == HTTP_TIER
+    tiers.close()
+
+
+def test_domain_tiers_of_the_old_schema(tmp_path):
+    path: str = str(tmp_path / "tiers.sqlite")
+    db: sqlite3.Connection = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE domains "
+        "(domain TEXT PRIMARY KEY, tier TEXT NOT NULL, updated_at REAL NOT NULL)"
+    )
+    db.execute(
+        "INSERT INTO domains VALUES ('example.com', 'browser', ?)", (time.time(),)
+    )
+    db.commit()
+    db.close()
+
+    tiers: DomainTiers = DomainTiers(path)
+    assert tiers.get("https://example.com/") == BROWSER_TIER
+    tiers.close()
+
+
+class SlowFetcher:
+    """Stands in for HttpFetcher, records how many fetches run together"""
+
+    def __init__(self) -> None:
+        self.running: int = 0
+        self.max_running: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def fetch(self, url: str):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return "<p>text</p>", f"text of {url}", {}
+
+    def close(self) -> None:
+        pass
+
+
+def test_http_tier_is_bounded_by_max_concurrency():
+    fetcher: SlowFetcher = SlowFetcher()
+    scraper: WebScraper = WebScraper(max_concurrency=2, http_fetcher=fetcher)
+    links: list[str] = [f"https://example.com/{i}" for i in range(8)]
+    try:
+        pages = asyncio.run(scraper.scrape_pages_async(links))
+    finally:
+        scraper.close()
+    assert [page["url"] for page in pages] == links
+    assert fetcher.max_running == 2
+
+
+class FailingFetcher:
+    """Stands in for HttpFetcher, fetch raises on the pages with bad in the url"""
+
+    def fetch(self, url: str):
+        if "bad" in url:
+            raise ValueError("cannot parse the page")
+        return "<p>text</p>", f"text of {url}", {}
+
+    def close(self) -> None:
+        pass
+
+
+class BrowserCrawler:
+    """Stands in for crawl4ai.AsyncWebCrawler, renders every page as markdown"""
+
+    def __init__(self, config=None) -> None:
+        pass
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def arun(self, url: str, config=None):
+        return types.SimpleNamespace(
+            markdown=f"# Page\n\nrendered {url}", html="", response_headers={}
+        )
+
+
+def test_failed_http_fetch_falls_back_to_browser(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules,
+        "crawl4ai",
+        types.SimpleNamespace(
+            AsyncWebCrawler=BrowserCrawler,
+            BrowserConfig=lambda **kwargs: None,
+            CrawlerRunConfig=lambda **kwargs: None,
+            CacheMode=types.SimpleNamespace(BYPASS="bypass"),
+        ),
+    )
+    scraper: WebScraper = WebScraper(http_fetcher=FailingFetcher())
+    links: list[str] = ["https://example.com/ok", "https://example.com/bad"]
+    try:
+        pages = asyncio.run(scraper.scrape_pages_async(links))
+    finally:
+        scraper.close()
+    assert [page["url"] for page in pages] == links
+    assert pages[0]["content"] == "text of https://example.com/ok"
+    assert "rendered https://example.com/bad" in pages[1]["content"]
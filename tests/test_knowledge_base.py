@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+
+from answer_using_web import execute_answer_using_web
+from retrieve.knowledge_base import KnowledgeBase
+
+DIM: int = 16
+
+
+def random_vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    vectors: np.ndarray = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def add_random(
+    knowledge_base: KnowledgeBase, rng: np.random.Generator, n: int, first: int = 0
+) -> np.ndarray:
+    vectors: np.ndarray = random_vectors(rng, n)
+    chunks: list[str] = [f"chunk {first + i}" for i in range(n)]
+    urls: list[str] = [f"https://{first + i}.com" for i in range(n)]
+    assert knowledge_base.add(chunks, urls, vectors) == n
+    return vectors
+
+
+def brute_force_top_k(
+    vectors: np.ndarray, queries: np.ndarray, top_k: int
+) -> list[list[str]]:
+    """The texts of the best rows, with the precision of the stored rows"""
+    scores: np.ndarray = queries @ vectors.astype(np.float16).astype(np.float32).T
+    return [
+        [f"chunk {row}" for row in np.argsort(-query_scores)[:top_k]]
+        for query_scores in scores
+    ]
+
+
+def check_search(
+    knowledge_base: KnowledgeBase, vectors: np.ndarray, queries: np.ndarray
+) -> None:
+    for top_k in (1, 5, 40):
+        found: list[list[dict]] = knowledge_base.search(queries, top_k)
+        assert [[chunk["text"] for chunk in chunks] for chunks in found] == (
+            brute_force_top_k(vectors, queries, top_k)
+        )
+        for chunks in found:
+            scores: list[float] = [chunk["score"] for chunk in chunks]
+            assert scores == sorted(scores, reverse=True)
+            assert all(
+                chunk["url"] == f"https://{chunk['text'].split()[1]}.com"
+                for chunk in chunks
+            )
+
+
+def test_search_matches_brute_force(tmp_path):
+    rng: np.random.Generator = np.random.default_rng(0)
+    knowledge_base: KnowledgeBase = KnowledgeBase(str(tmp_path), "model", DIM)
+    vectors: np.ndarray = add_random(knowledge_base, rng, 200)
+    check_search(knowledge_base, vectors, random_vectors(rng, 7))
+    knowledge_base.close()
+
+
+def test_search_across_blocks(tmp_path, monkeypatch):
+    # a block boundary inside the rows, and a last block shorter than top_k
+    monkeypatch.setattr(KnowledgeBase, "_KnowledgeBase__SEARCH_BLOCK_ROWS", 32)
+    rng: np.random.Generator = np.random.default_rng(1)
+    knowledge_base: KnowledgeBase = KnowledgeBase(str(tmp_path), "model", DIM)
+    vectors: np.ndarray = add_random(knowledge_base, rng, 100)
+    check_search(knowledge_base, vectors, random_vectors(rng, 5))
+    knowledge_base.close()
+
+
+def test_growth_past_the_initial_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(KnowledgeBase, "_KnowledgeBase__GROW_ROWS", 8)
+    rng: np.random.Generator = np.random.default_rng(2)
+    knowledge_base: KnowledgeBase = KnowledgeBase(str(tmp_path), "model", DIM)
+    parts: list[np.ndarray] = []
+    for n in (3, 6, 1, 30):
+        parts.append(add_random(knowledge_base, rng, n, first=len(knowledge_base)))
+    vectors: np.ndarray = np.concatenate(parts)
+    assert len(knowledge_base) == 40
+    check_search(knowledge_base, vectors, random_vectors(rng, 4))
+    knowledge_base.close()
+
+
+def test_persistence_on_reopen(tmp_path):
+    rng: np.random.Generator = np.random.default_rng(3)
+    knowledge_base: KnowledgeBase = KnowledgeBase(str(tmp_path), "model", DIM)
+    vectors: np.ndarray = add_random(knowledge_base, rng, 50)
+    knowledge_base.close()
+
+    knowledge_base = KnowledgeBase(str(tmp_path), "model", DIM)
+    assert len(knowledge_base) == 50
+    # the chunks already known are not added again
+    assert knowledge_base.add(["chunk 0"], ["https://0.com"], vectors[:1]) == 0
+    more: np.ndarray = add_random(knowledge_base, rng, 10, first=50)
+    check_search(knowledge_base, np.concatenate([vectors, more]), vectors[:3])
+    knowledge_base.close()
+
+    # every model has its own index
+    other: KnowledgeBase = KnowledgeBase(str(tmp_path), "other/model", DIM)
+    assert len(other) == 0 and other.search(vectors[:1], 5) == [[]]
+    other.close()
+
+
+def test_add_and_search_edge_cases(tmp_path):
+    knowledge_base: KnowledgeBase = KnowledgeBase(str(tmp_path), "model", DIM)
+    query: np.ndarray = np.ones(DIM)
+    assert knowledge_base.search(query, 3) == [[]]
+    assert knowledge_base.add([], [], np.empty((0, DIM))) == 0
+    # the same chunk twice in a call is added once, the vectors are normalized
+    assert knowledge_base.add(["a", "a"], ["u", "u"], np.ones((2, DIM)) * 3) == 1
+    [[found]] = knowledge_base.search(query, 3)
+    assert found["text"] == "a" and found["score"] == pytest.approx(1, abs=1e-3)
+    assert knowledge_base.search(query, 0) == [[]]
+    with pytest.raises(ValueError):
+        knowledge_base.add(["a"], [], np.ones((1, DIM)))
+    with pytest.raises(ValueError):
+        KnowledgeBase(str(tmp_path), "model", 0)
+    knowledge_base.close()
+
+
+class FakeRetriever:
+    """Answers from the knowledge base with the given confidence"""
+
+    def __init__(self, confidence: float) -> None:
+        self.confidence: float = confidence
+        self.web_queries: int = 0
+
+    def search_knowledge_base(self, queries, max_chunk, metrics=None):
+        return [(["stored chunk"], self.confidence, ["https://stored.com"])]
+
+    def get_relevant_records(self, data, query, max_chunk, metrics=None, pages=None):
+        self.web_queries += 1
+        return []
+
+
+class FakeScraper:
+    def get_scraped_pages(self, query, search_engine, max_pages, language, **kwargs):
+        return [{"url": "https://web.com", "content": "web content"}]
+
+
+class FakeLLMManager:
+    model_name: str = "fake"
+
+    def answer_query(self, dict_for_template, use_cache=True, metrics=None):
+        return dict_for_template["document"]
+
+
+def answer(retriever: FakeRetriever, min_confidence: float) -> tuple:
+    return execute_answer_using_web(
+        "q",
+        3,
+        "english",
+        "ddg",
+        retriever,
+        "ollama",
+        "fake",
+        4,
+        False,
+        "{question}",
+        0.3,
+        False,
+        scraper=FakeScraper(),
+        llm_manager=FakeLLMManager(),
+        knowledge_base_min_confidence=min_confidence,
+    )
+
+
+def test_min_confidence_gate():
+    retriever: FakeRetriever = FakeRetriever(confidence=0.8)
+    assert answer(retriever, 0.75) == (
+        "stored chunk",
+        "KNOWLEDGE_BASE",
+        ["https://stored.com"],
+    )
+    assert retriever.web_queries == 0
+
+    # below the threshold the web is searched
+    retriever = FakeRetriever(confidence=0.7)
+    _, status, sources = answer(retriever, 0.75)
+    assert status == "NO_RELEVANT_CHUNKS" and sources == []
+    assert retriever.web_queries == 1
@@ -0,0 +1,186 @@
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import llm.llm_manager
+from llm.llm_manager import LLMManager, ThinkingFilter
+
+TEMPLATE: str = "{question}"
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"status {status_code}")
+        self.status_code: int = status_code
+
+
+class FakeChain:
+    """Stands in for the prompt and the model: raises the errors, then answers"""
+
+    def __init__(self) -> None:
+        self.errors: list[Exception] = []
+        self.calls: int = 0
+        self.running: int = 0
+        self.max_running: int = 0
+        self.pieces: list[str] = []
+        self.__lock: threading.Lock = threading.Lock()
+
+    def invoke(self, dict_for_template: dict[str, str]) -> str:
+        with self.__lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            error: Exception = self.errors.pop(0) if self.errors else None
+        # the first questions take longer
+        time.sleep(0.01 * (5 - int(dict_for_template["question"]) % 5))
+        with self.__lock:
+            self.running -= 1
+        if error is not None:
+            raise error
+        return f" answer {dict_for_template['question']} "
+
+    def stream(self, dict_for_template: dict[str, str]):
+        yield from self.pieces
+
+
+class FakePrompt:
+    def __init__(self, template: str) -> None:
+        self.template: str = template
+
+    def format(self, **values) -> str:
+        return self.template.format(**values)
+
+    def __or__(self, model) -> FakeChain:
+        return model.chain
+
+
+@pytest.fixture
+def chain(monkeypatch) -> FakeChain:
+    fake_chain: FakeChain = FakeChain()
+    model = types.SimpleNamespace(chain=fake_chain)
+    prompt_class = types.SimpleNamespace(from_template=FakePrompt)
+    monkeypatch.setitem(sys.modules, "langchain", types.ModuleType("langchain"))
+    monkeypatch.setitem(
+        sys.modules,
+        "langchain.prompts",
+        types.SimpleNamespace(ChatPromptTemplate=prompt_class),
+    )
+    monkeypatch.setitem(
+        sys.modules,
+        "langchain_ollama",
+        types.SimpleNamespace(OllamaLLM=lambda **kwargs: model),
+    )
+    return fake_chain
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list[float]:
+    """The backoff delays, without waiting for them"""
+    delays: list[float] = []
+    fake_time = types.SimpleNamespace(
+        perf_counter=time.perf_counter, sleep=delays.append
+    )
+    monkeypatch.setattr(llm.llm_manager, "time", fake_time)
+    return delays
+
+
+def make_manager(**kwargs) -> LLMManager:
+    return LLMManager("ollama", "model", 0.3, TEMPLATE, False, **kwargs)
+
+
+@pytest.mark.parametrize("status_code", [408, 429, 500, 502, 503, 504])
+def test_transient_errors_are_retried(chain, sleeps, status_code):
+    chain.errors = [StatusError(status_code), StatusError(status_code)]
+    manager: LLMManager = make_manager(max_retries=2, retry_backoff=1.0)
+    assert manager.answer_query({"question": "1"}) == "answer 1"
+    assert chain.calls == 3
+    # exponential backoff with jitter
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.5 and 1.0 <= sleeps[1] <= 3.0
+
+
+def test_network_errors_are_retried(chain, sleeps):
+    chain.errors = [ConnectionError("refused"), TimeoutError("slow")]
+    assert make_manager(max_retries=2).answer_query({"question": "1"}) == "answer 1"
+    assert len(sleeps) == 2
+
+
+@pytest.mark.parametrize("error", [StatusError(400), StatusError(404), KeyError("x")])
+def test_other_errors_are_raised_at_once(chain, sleeps, error):
+    chain.errors = [error]
+    with pytest.raises(RuntimeError):
+        make_manager(max_retries=2).answer_query({"question": "1"})
+    assert chain.calls == 1 and sleeps == []
+
+
+def test_retries_are_limited(chain, sleeps):
+    chain.errors = [StatusError(503)] * 3
+    with pytest.raises(RuntimeError, match="status 503"):
+        make_manager(max_retries=2).answer_query({"question": "1"})
+    assert chain.calls == 3 and len(sleeps) == 2
+
+
+def test_answer_queries_in_order_within_max_in_flight(chain):
+    manager: LLMManager = make_manager(max_in_flight=3)
+    questions: list[dict[str, str]] = [{"question": str(i)} for i in range(10)]
+    answers: list[str] = manager.answer_queries(questions)
+    assert answers == [f"answer {i}" for i in range(10)]
+    assert chain.max_running == 3
+
+
+def test_answer_queries_one_at_a_time(chain):
+    answers: list[str] = make_manager().answer_queries(
+        [{"question": "1"}, {"question": "2"}]
+    )
+    assert answers == ["answer 1", "answer 2"]
+    assert chain.max_running == 1
+
+
+def test_stream_hides_the_thinking(chain):
+    chain.pieces = ["<thi", "nk>plan", "</th", "ink>\n The ", "answer", "."]
+    manager: LLMManager = LLMManager("ollama", "model", 0.3, TEMPLATE, True)
+    assert list(manager.stream_answer({"question": "1"})) == ["The ", "answer", "."]
+
+
+THINKING_TEXTS: list[str] = [
+    "<think>plan</think>answer",
+    "before<think>a</think>middle<think>b</think>after",
+    "a < b and <thin> is not a tag, </think> neither",
+    "<think>unclosed thinking",
+    "<think></think><<think>x</think>>",
+]
+
+
+@pytest.mark.parametrize("text", THINKING_TEXTS)
+def test_thinking_filter_every_split(text):
+    expected: str = re.sub(r"<think>.*?(</think>|$)", "", text, flags=re.DOTALL)
+    for first in range(len(text) + 1):
+        for second in range(first, len(text) + 1):
+            thinking_filter: ThinkingFilter = ThinkingFilter()
+            pieces: list[str] = [text[:first], text[first:second], text[second:]]
+            visible: str = "".join(thinking_filter.feed(piece) for piece in pieces)
+            assert visible + thinking_filter.flush() == expected
+
+
+def test_thinking_filter_one_character_at_a_time():
+    rng: random.Random = random.Random(0)
+    for _ in range(200):
+        text: str = "".join(
+            rng.choice(["<think>", "</think>", "<", "t", " ", "</", "k>"])
+            for _ in range(12)
+        )
+        expected: str = re.sub(r"<think>.*?(</think>|$)", "", text, flags=re.DOTALL)
+        thinking_filter: ThinkingFilter = ThinkingFilter()
+        visible: str = "".join(thinking_filter.feed(char) for char in text)
+        assert visible + thinking_filter.flush() == expected
+
+
+def test_thinking_filter_shows_text_as_soon_as_possible():
+    thinking_filter: ThinkingFilter = ThinkingFilter()
+    assert thinking_filter.feed("Hello <") == "Hello "
+    assert thinking_filter.feed("b>") == "<b>"
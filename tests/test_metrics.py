@@ -0,0 +1,41 @@
+from pipeline.metrics import COUNTERS, STAGES, MetricsRegistry, QueryMetrics
+
+
+def test_every_recorded_stage_is_reported():
+    metrics: QueryMetrics = QueryMetrics("q")
+    metrics.add_duration("generation", 1.0)
+    metrics.add_duration("first_token", 0.25)
+    metrics.finish("OK")
+    row = metrics.to_row()
+    assert row["first_token_seconds"] == 0.25
+    assert set(metrics.durations) <= set(STAGES)
+
+
+def test_row_has_every_column():
+    metrics: QueryMetrics = QueryMetrics("q")
+    metrics.count("links", 3)
+    metrics.add_page("https://a.com", "ok", 0.5, size=10, tier="http")
+    metrics.finish("OK")
+    row = metrics.to_row()
+    stage_columns: list[str] = [f"{stage}_seconds" for stage in STAGES]
+    assert list(row) == ["status", "total_seconds"] + stage_columns + COUNTERS
+    assert row["links"] == 3
+    assert row["pages_ok"] == 1
+    assert row["pages_http"] == 1
+    assert row["bytes_fetched"] == 10
+
+
+def test_prometheus_format():
+    registry: MetricsRegistry = MetricsRegistry(prefix="test")
+    for seconds in (0.2, 3.0):
+        metrics: QueryMetrics = QueryMetrics("q")
+        metrics.add_duration("search", seconds)
+        metrics.count("links", 2)
+        metrics.finish("OK")
+        registry.observe(metrics)
+    text: str = registry.format_prometheus()
+    assert 'test_queries_total{status="OK"} 2' in text
+    assert "test_links_total 4" in text
+    assert 'test_stage_seconds_bucket{stage="search",le="0.25"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="search",le="+Inf"} 2' in text
+    assert 'test_stage_seconds_count{stage="search"} 2' in text
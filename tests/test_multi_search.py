@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+from pipeline.metrics import QueryMetrics
+from web.multi_search import (
+    CircuitBreaker,
+    MultiEngineSearch,
+    RateLimitError,
+    merge_links,
+)
+
+
+def test_breaker_opens_after_failures_and_tries_once():
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=2, reset_after=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # a single trial search at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_failed_trial_opens_again():
+    breaker: CircuitBreaker = CircuitBreaker(failure_threshold=3, reset_after=0.05)
+    breaker.record_failure(rate_limited=True)
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_merge_links_by_rank_without_duplicates():
+    results: list[list[str]] = [
+        ["https://a.com/", "https://b.com"],
+        ["https://a.com#top", "https://c.com", "https://d.com"],
+    ]
+    assert merge_links(results, 10) == [
+        "https://a.com/",
+        "https://b.com",
+        "https://c.com",
+        "https://d.com",
+    ]
+    assert merge_links(results, 2) == ["https://a.com/", "https://b.com"]
+    assert merge_links([], 3) == []
+
+
+class FakeEngines:
+    def __init__(self, links: dict[str, list[str]], delays: dict[str, float] = None):
+        """An engine missing from links raises a rate limit"""
+        self.links: dict[str, list[str]] = links
+        self.delays: dict[str, float] = delays or {}
+        self.calls: list[str] = []
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __call__(self, engine: str) -> list[str]:
+        with self.__lock:
+            self.calls.append(engine)
+        time.sleep(self.delays.get(engine, 0))
+        if engine not in self.links:
+            raise RateLimitError("429")
+        return self.links[engine]
+
+
+def test_fallback_only_on_failure():
+    search: MultiEngineSearch = MultiEngineSearch("fallback", ["google"])
+    engines: FakeEngines = FakeEngines({"ddg": ["https://a.com"], "google": []})
+    assert search.search("ddg", engines, 5) == ["https://a.com"]
+    assert engines.calls == ["ddg"]
+
+    engines = FakeEngines({"ddg": [], "google": ["https://g.com"]})
+    assert search.search("ddg", engines, 5) == ["https://g.com"]
+    assert engines.calls == ["ddg", "google"]
+    search.close()
+
+
+def test_rate_limited_engine_is_skipped():
+    search: MultiEngineSearch = MultiEngineSearch(
+        "fallback", ["google"], reset_after=60
+    )
+    engines: FakeEngines = FakeEngines({"google": ["https://g.com"]})
+    assert search.search("ddg", engines, 5) == ["https://g.com"]
+    metrics: QueryMetrics = QueryMetrics("q")
+    assert search.search("ddg", engines, 5, metrics) == ["https://g.com"]
+    assert engines.calls == ["ddg", "google", "google"]
+    assert metrics.counters["search_skipped"] == 1
+    search.close()
+
+
+def test_hedged_starts_next_engine_when_slow():
+    search: MultiEngineSearch = MultiEngineSearch(
+        "hedged", ["google"], hedge_after=0.05
+    )
+    engines: FakeEngines = FakeEngines(
+        {"ddg": ["https://a.com"], "google": ["https://g.com"]}, {"ddg": 0.5}
+    )
+    metrics: QueryMetrics = QueryMetrics("q")
+    start: float = time.monotonic()
+    assert search.search("ddg", engines, 5, metrics) == ["https://g.com"]
+    assert time.monotonic() - start < 0.4
+    assert metrics.counters["search_hedges"] == 1
+    search.close()
+
+
+def test_parallel_merges_all_engines():
+    search: MultiEngineSearch = MultiEngineSearch("parallel", ["google"])
+    engines: FakeEngines = FakeEngines(
+        {"ddg": ["https://a.com", "https://b.com"], "google": ["https://g.com"]},
+        {"google": 0.05},
+    )
+    assert search.search("ddg", engines, 5) == [
+        "https://a.com",
+        "https://g.com",
+        "https://b.com",
+    ]
+    search.close()
+
+
+def test_timeout_moves_to_next_engine():
+    search: MultiEngineSearch = MultiEngineSearch(
+        "fallback", ["google"], timeout=0.05, failure_threshold=1
+    )
+    engines: FakeEngines = FakeEngines(
+        {"ddg": ["https://a.com"], "google": ["https://g.com"]}, {"ddg": 0.3}
+    )
+    assert search.search("ddg", engines, 5) == ["https://g.com"]
+    assert search.get_breaker("ddg").state == "open"
+    search.close()
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        MultiEngineSearch("random")
+    with pytest.raises(ValueError):
+        MultiEngineSearch(timeout=0)
+    with pytest.raises(ValueError):
+        CircuitBreaker(failure_threshold=0)
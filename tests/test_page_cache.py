@@ -0,0 +1,91 @@
+import os
+
+from web.page_cache import PageCache
+
+
+def size_mb(size: int) -> float:
+    """max_size_mb of a cache of size bytes"""
+    return size / (1024 * 1024)
+
+
+def count_blobs(directory: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(os.path.join(directory, "blobs")))
+
+
+def test_put_and_get(tmp_path):
+    cache: PageCache = PageCache(str(tmp_path))
+    cache.put("https://a.com", "città")
+    assert cache.get("https://a.com") == "città"
+    assert cache.get("https://b.com") is None
+    cache.close()
+
+    # persisted
+    cache = PageCache(str(tmp_path))
+    assert cache.get("https://a.com") == "città"
+    cache.close()
+
+
+def test_identical_pages_share_the_file(tmp_path):
+    cache: PageCache = PageCache(str(tmp_path))
+    cache.put("https://a.com", "same text")
+    cache.put("https://b.com", "same text")
+    assert count_blobs(str(tmp_path)) == 1
+
+    cache.put("https://a.com", "new text")
+    assert cache.get("https://b.com") == "same text"
+    cache.put("https://b.com", "new text")
+    assert count_blobs(str(tmp_path)) == 1
+    cache.close()
+
+
+def test_stale_page_without_revalidation(tmp_path):
+    cache: PageCache = PageCache(str(tmp_path), ttl_seconds=0, revalidate=False)
+    cache.put("https://a.com", "text", etag='"v1"')
+    assert cache.get("https://a.com") is None
+    cache.close()
+
+
+def test_stale_page_is_revalidated(tmp_path, local_server):
+    local_server.handler = lambda method, path, body: (
+        (304, {}, b"") if path == "/same" else (200, {}, b"changed")
+    )
+    cache: PageCache = PageCache(str(tmp_path), ttl_seconds=0)
+    cache.put(f"{local_server.url}/same", "old", etag='"v1"')
+    cache.put(f"{local_server.url}/changed", "old", last_modified="yesterday")
+    # no validator, no request
+    cache.put(f"{local_server.url}/unknown", "old")
+
+    assert cache.get(f"{local_server.url}/same") == "old"
+    assert cache.get(f"{local_server.url}/changed") is None
+    assert cache.get(f"{local_server.url}/unknown") is None
+    assert local_server.requests == [("GET", "/same"), ("GET", "/changed")]
+    cache.close()
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    cache: PageCache = PageCache(str(tmp_path), max_size_mb=size_mb(25))
+    cache.put("https://a.com", "a" * 10)
+    cache.put("https://b.com", "b" * 10)
+    # a is now more recent than b
+    assert cache.get("https://a.com") is not None
+    cache.put("https://c.com", "c" * 10)
+
+    assert cache.get("https://b.com") is None
+    assert cache.get("https://a.com") == "a" * 10
+    assert cache.get("https://c.com") == "c" * 10
+    assert count_blobs(str(tmp_path)) == 2
+
+    # larger than the whole cache
+    cache.put("https://d.com", "d" * 30)
+    assert cache.get("https://d.com") is None
+    cache.close()
+
+
+def test_removed_file_is_a_miss(tmp_path):
+    cache: PageCache = PageCache(str(tmp_path))
+    cache.put("https://a.com", "text")
+    for root, _, files in os.walk(os.path.join(str(tmp_path), "blobs")):
+        for name in files:
+            os.remove(os.path.join(root, name))
+    assert cache.get("https://a.com") is None
+    cache.close()
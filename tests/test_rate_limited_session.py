@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from pipeline.metrics import QueryMetrics
+from web.rate_limited_session import RateLimitedSession, TokenBucket
+
+
+def test_bucket_waits_after_burst():
+    bucket: TokenBucket = TokenBucket(rate=20, burst=2)
+    start: float = time.monotonic()
+    waits: list[float] = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(0.05, abs=0.02)
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.04)
+
+
+def test_bucket_spaces_concurrent_threads():
+    bucket: TokenBucket = TokenBucket(rate=50, burst=1)
+    start: float = time.monotonic()
+    threads: list[threading.Thread] = [
+        threading.Thread(target=bucket.acquire) for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.04)
+
+
+def test_bucket_pause_leaves_a_single_request():
+    bucket: TokenBucket = TokenBucket(rate=20, burst=5)
+    bucket.pause(0.1)
+    assert bucket.acquire() == pytest.approx(0.1, abs=0.02)
+    assert bucket.acquire() == pytest.approx(0.05, abs=0.02)
+
+
+def test_backoff_doubles_within_max():
+    session: RateLimitedSession = RateLimitedSession(backoff=1.0, max_backoff=5.0)
+    for attempt, delay in enumerate([1.0, 2.0, 4.0, 5.0, 5.0]):
+        assert delay / 2 <= session.get_backoff(attempt) <= delay
+    assert session.get_backoff(0, "3") == 3
+    assert session.get_backoff(0, "60") == 5
+    # a date is not used
+    assert session.get_backoff(0, "Wed, 21 Oct 2015 07:28:00 GMT") <= 1.0
+    session.close()
+
+
+def test_rate_limited_request_is_retried(local_server):
+    answers: list[int] = [429, 202, 200]
+    local_server.handler = lambda method, path, body: (
+        answers.pop(0),
+        {"Retry-After": "0"},
+        b"ok",
+    )
+    session: RateLimitedSession = RateLimitedSession(
+        requests_per_second=1000, burst=10, backoff=0.01
+    )
+    metrics: QueryMetrics = QueryMetrics("q")
+    response = session.post(f"{local_server.url}/html", metrics, data={"q": "q"})
+    assert response.status_code == 200 and response.text == "ok"
+    assert metrics.counters["search_requests"] == 3
+    assert metrics.counters["search_rate_limited"] == 2
+    session.close()
+
+
+def test_last_rate_limited_answer_is_returned(local_server):
+    local_server.handler = lambda method, path, body: (429, {}, b"slow down")
+    session: RateLimitedSession = RateLimitedSession(
+        requests_per_second=1000, burst=10, max_retries=1, backoff=0.01
+    )
+    response = session.post(f"{local_server.url}/html")
+    assert response.status_code == 429
+    assert len(local_server.requests) == 2
+    session.close()
+
+
+def test_connection_is_kept_alive(local_server):
+    local_server.handler = lambda method, path, body: (200, {}, b"ok")
+    session: RateLimitedSession = RateLimitedSession(requests_per_second=1000)
+    for _ in range(3):
+        assert session.post(f"{local_server.url}/html", data={"q": "q"}).text == "ok"
+    assert len(local_server.client_ports) == 1
+    session.close()
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+    with pytest.raises(ValueError):
+        RateLimitedSession(max_retries=-1)
+    with pytest.raises(ValueError):
+        RateLimitedSession(backoff=2, max_backoff=1)
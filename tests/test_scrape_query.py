@@ -0,0 +1,60 @@
+from answer_using_web import scrape_query
+from pipeline.metrics import QueryMetrics
+from retrieve.dedup import NearDuplicateFilter
+
+ARTICLE: str = " ".join(f"word{i} of the article about sqlite" for i in range(60))
+OTHER: str = " ".join(f"term{i} of a page about postgres" for i in range(60))
+
+
+class FakeScraper:
+    """Gives the pages to on_page one by one, like WebScraper.get_scraped_pages"""
+
+    def __init__(self, pages: list[dict[str, str]]) -> None:
+        self.pages: list[dict[str, str]] = pages
+
+    def get_scraped_pages(self, query, search_engine, max_pages, language, **kwargs):
+        on_page = kwargs.get("on_page")
+        for page in self.pages:
+            if on_page is not None and on_page(page):
+                break
+        return self.pages
+
+
+PAGES: list[dict[str, str]] = [
+    {"url": "https://a.com/", "content": ARTICLE},
+    {"url": "https://mirror.com/", "content": ARTICLE + " copied"},
+    {"url": "https://b.com/", "content": OTHER},
+]
+
+
+def test_dedup_drops_the_pages_before_on_page():
+    received: list[str] = []
+    metrics: QueryMetrics = QueryMetrics()
+    pages, status = scrape_query(
+        "q",
+        3,
+        "english",
+        "ddg",
+        FakeScraper(PAGES),
+        False,
+        metrics=metrics,
+        dedup=NearDuplicateFilter(),
+        on_page=lambda page: received.append(page["url"]) and False,
+    )
+    assert status == "OK"
+    assert received == ["https://a.com/", "https://b.com/"]
+    assert [page["url"] for page in pages] == received
+    assert metrics.counters["duplicate_pages"] == 1
+
+
+def test_dedup_without_on_page():
+    pages, status = scrape_query(
+        "q",
+        3,
+        "english",
+        "ddg",
+        FakeScraper(PAGES),
+        False,
+        dedup=NearDuplicateFilter(),
+    )
+    assert [page["url"] for page in pages] == ["https://a.com/", "https://b.com/"]
@@ -0,0 +1,60 @@
+import web.search_cache
+from web.search_cache import SearchCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now: float = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_links_expire_after_ttl(tmp_path, monkeypatch):
+    clock: FakeClock = FakeClock()
+    monkeypatch.setattr(web.search_cache, "time", clock)
+    cache: SearchCache = SearchCache(
+        str(tmp_path / "search.sqlite"), ttl_seconds=100, negative_ttl_seconds=10
+    )
+    cache.put("ddg", "q", "it-it", 5, ["https://a.com"])
+    cache.put("ddg", "none", "it-it", 5, [])
+
+    clock.now += 50
+    assert cache.get("ddg", "q", "it-it", 5) == ["https://a.com"]
+    # empty results have the shorter ttl
+    assert cache.get("ddg", "none", "it-it", 5) is None
+
+    clock.now += 51
+    assert cache.get("ddg", "q", "it-it", 5) is None
+    assert cache.stats() == {"hits": 1, "negative_hits": 0, "misses": 2}
+    cache.close()
+
+
+def test_key_has_engine_region_and_results(tmp_path):
+    cache: SearchCache = SearchCache(str(tmp_path / "search.sqlite"))
+    cache.put("ddg", "q", None, 5, ["https://a.com"])
+    assert cache.get("ddg", "q", "", 5) == ["https://a.com"]
+    assert cache.get("google", "q", "", 5) is None
+    assert cache.get("ddg", "q", "it-it", 5) is None
+    assert cache.get("ddg", "q", "", 10) is None
+    cache.close()
+
+    # persisted
+    cache = SearchCache(str(tmp_path / "search.sqlite"))
+    assert cache.get("ddg", "q", None, 5) == ["https://a.com"]
+    cache.close()
+
+
+def test_get_or_search_caches_empty_results(tmp_path):
+    cache: SearchCache = SearchCache(str(tmp_path / "search.sqlite"))
+    calls: list[str] = []
+
+    def search() -> list[str]:
+        calls.append("search")
+        return []
+
+    assert cache.get_or_search("ddg", "q", "", 5, search) == []
+    assert cache.get_or_search("ddg", "q", "", 5, search) == []
+    assert calls == ["search"]
+    assert cache.stats() == {"hits": 0, "negative_hits": 1, "misses": 1}
+    cache.close()
@@ -0,0 +1,173 @@
+import random
+import zlib
+
+import pytest
+
+from answer_using_web import scrape_query
+from retrieve.chunking import ChunkRecord
+from retrieve.st_retrieval import IncrementalSearch, SentenceTransformerRetriever
+
+MIN_SCORE: float = 0.4
+
+
+def score_page(search: IncrementalSearch, page: int) -> list[ChunkRecord]:
+    """Stands in for the model: the chunks of a page have the scores of the page"""
+    return [
+        ChunkRecord(page, i, i + 1, score)
+        for i, score in enumerate(search.pages[page]["scores"])
+    ]
+
+
+def make_search(max_chunk: int = 2, stable_pages: int = 2) -> IncrementalSearch:
+    return IncrementalSearch("q", max_chunk, score_page, MIN_SCORE, stable_pages)
+
+
+def page(*scores: float) -> dict:
+    return {"url": f"https://{len(scores)}.com", "content": "x" * 10, "scores": scores}
+
+
+def test_complete_after_stable_pages_unchanged():
+    search: IncrementalSearch = make_search(stable_pages=2)
+    assert not search.add_page(page(0.9, 0.8))
+    assert not search.add_page(page(0.1))
+    assert search.add_page(page(0.2))
+    assert [record.score for record in search.result()] == [0.9, 0.8]
+
+
+def test_better_chunk_resets_the_count():
+    search: IncrementalSearch = make_search(stable_pages=2)
+    assert not search.add_page(page(0.9, 0.8))
+    assert not search.add_page(page(0.1))
+    # a better chunk enters the top, the count starts again
+    assert not search.add_page(page(0.95))
+    assert not search.add_page(page(0.1))
+    assert search.add_page(page(0.3))
+    result: list[ChunkRecord] = search.result()
+    assert [record.score for record in result] == [0.95, 0.9]
+    assert [record.page for record in result] == [2, 0]
+
+
+def test_not_complete_while_top_is_below_min_score():
+    search: IncrementalSearch = make_search(stable_pages=1)
+    for scores in [(0.9,), (0.3,), (0.2,), (0.1,)]:
+        # the top has two chunks, but one of them is not relevant
+        assert not search.add_page(page(*scores))
+    assert [record.score for record in search.result()] == [0.9]
+
+
+def test_stable_pages_must_be_positive():
+    with pytest.raises(ValueError):
+        make_search(stable_pages=0)
+
+
+class FakeScraper:
+    """Gives the pages to on_page one by one, like WebScraper.get_scraped_pages"""
+
+    def __init__(self, pages: list[dict]) -> None:
+        self.pages: list[dict] = pages
+        self.read: int = 0
+
+    def get_scraped_pages(self, query, search_engine, max_pages, language, **kwargs):
+        on_page = kwargs.get("on_page")
+        self.read = 0
+        for scraped in self.pages:
+            self.read += 1
+            if on_page is not None and on_page(scraped):
+                break
+        return self.pages[: self.read]
+
+
+def test_early_stop_only_when_enabled():
+    pages: list[dict] = [page(0.9, 0.8)] + [page(0.1) for _ in range(5)]
+    scraper: FakeScraper = FakeScraper(pages)
+    search: IncrementalSearch = make_search(stable_pages=2)
+    scraped, _ = scrape_query(
+        "q", 6, "english", "ddg", scraper, False, on_page=search.add_page
+    )
+    assert scraper.read == 3 and len(scraped) == 3
+
+    # disabled: every page is read
+    scraped, _ = scrape_query("q", 6, "english", "ddg", scraper, False)
+    assert scraper.read == 6 and len(scraped) == 6
+
+
+class StubEmbedder:
+    """Stands in for SentenceTransformer: normalized bag of words of 64 dims"""
+
+    device: str = "cpu"
+
+    def __init__(self) -> None:
+        self.torch = pytest.importorskip("torch")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 64
+
+    def __encode(self, texts, convert_to_tensor=False, **kwargs):
+        vectors = self.torch.zeros((len(texts), 64))
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, zlib.crc32(word.encode("utf-8")) % 64] += 1
+        vectors = self.torch.nn.functional.normalize(vectors, dim=1)
+        return vectors if convert_to_tensor else vectors.numpy()
+
+    encode_document = __encode
+    encode_query = __encode
+
+    def similarity(self, a, b):
+        return a @ b.T
+
+
+class StubBackend:
+    def model_id(self, model_name: str) -> str:
+        return model_name
+
+    def load(self, model_name: str) -> StubEmbedder:
+        return StubEmbedder()
+
+
+def random_page(rng: random.Random, paragraphs: int) -> dict[str, str]:
+    """A chunk for every paragraph"""
+    words: list[str] = [f"w{i}" for i in range(10)]
+    content: str = "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(200, 260)))
+        for _ in range(paragraphs)
+    )
+    return {"url": f"https://{rng.getrandbits(32)}.com", "content": content}
+
+
+def test_batch_returns_the_records_of_single_queries():
+    retriever: SentenceTransformerRetriever = SentenceTransformerRetriever(
+        "stub", backend=StubBackend()
+    )
+    rng: random.Random = random.Random(0)
+    shared: dict[str, str] = random_page(rng, 4)
+    pages_per_item: list[list[dict[str, str]]] = [
+        [random_page(rng, 6), shared],
+        [shared, random_page(rng, 3)],
+        # fewer chunks than max_chunk
+        [random_page(rng, 1)],
+        [{"url": "https://empty.com", "content": ""}],
+        [random_page(rng, 2), random_page(rng, 5)],
+    ]
+    items: list[tuple[str, str]] = [
+        ("", " ".join(f"w{rng.randrange(10)}" for _ in range(4)))
+        for _ in pages_per_item
+    ]
+    max_chunk: int = 4
+
+    batch: list[list[ChunkRecord]] = retriever.get_relevant_records_batch(
+        items, max_chunk, pages=pages_per_item
+    )
+    single: list[list[ChunkRecord]] = [
+        retriever.get_relevant_records(document, query, max_chunk, pages=pages)
+        for (document, query), pages in zip(items, pages_per_item)
+    ]
+    assert len(batch) == len(items)
+    for batch_records, single_records in zip(batch, single):
+        assert [record[:3] for record in batch_records] == [
+            record[:3] for record in single_records
+        ]
+        assert [record.score for record in batch_records] == pytest.approx(
+            [record.score for record in single_records], abs=1e-5
+        )
+    assert [len(records) for records in batch] == [4, 4, 1, 0, 4]
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from pipeline.staged_executor import Stage, StagedPipeline, StageError
+
+
+def test_results_in_input_order():
+    def slow_first(item: int) -> int:
+        # the first items take longer, so they finish after the later ones
+        time.sleep(0.01 * (10 - item))
+        return item * 2
+
+    pipeline: StagedPipeline = StagedPipeline(
+        [
+            Stage("double", slow_first, concurrency=4),
+            Stage("plus", lambda item: item + 1, concurrency=2),
+        ]
+    )
+    assert list(pipeline.run(range(10))) == [(i, i * 2 + 1) for i in range(10)]
+    assert [stats.items for stats in pipeline.stats] == [10, 10]
+
+
+def test_failed_item_skips_the_next_stages():
+    last_stage: list[int] = []
+
+    def fail_on_three(item: int) -> int:
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    def record(item: int) -> int:
+        last_stage.append(item)
+        return item
+
+    pipeline: StagedPipeline = StagedPipeline(
+        [
+            Stage("first", lambda item: item, concurrency=2),
+            Stage("middle", fail_on_three, concurrency=2),
+            Stage("last", record),
+        ]
+    )
+    results: list = list(pipeline.run(range(6)))
+    assert [item for item, _ in results] == list(range(6))
+    error = results[3][1]
+    assert isinstance(error, StageError)
+    assert error.stage == "middle" and isinstance(error.error, ValueError)
+    completed: list[int] = [
+        result for _, result in results if not isinstance(result, StageError)
+    ]
+    assert completed == [0, 1, 2, 4, 5]
+    assert sorted(last_stage) == [0, 1, 2, 4, 5]
+    assert [stats.errors for stats in pipeline.stats] == [0, 1, 0]
+
+
+def test_batched_stage():
+    batches: list[list[int]] = []
+
+    def batch(items: list[int]) -> list[int]:
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    def slow(item: int) -> int:
+        time.sleep(0.01)
+        return item
+
+    pipeline: StagedPipeline = StagedPipeline(
+        [Stage("slow", slow, concurrency=4), Stage("batch", batch, batch_size=3)]
+    )
+    assert list(pipeline.run(range(7))) == [(i, i * 10) for i in range(7)]
+    assert all(len(items) <= 3 for items in batches)
+    assert sorted(item for items in batches for item in items) == list(range(7))
+
+
+def test_batched_stage_with_wrong_results_fails_its_items():
+    pipeline: StagedPipeline = StagedPipeline(
+        [Stage("batch", lambda items: [], batch_size=4)]
+    )
+    results: list = list(pipeline.run(range(3)))
+    assert [item for item, _ in results] == [0, 1, 2]
+    assert all(isinstance(result.error, RuntimeError) for _, result in results)
+
+
+def test_queues_are_bounded():
+    running: list[int] = [0]
+    lock: threading.Lock = threading.Lock()
+    release: threading.Event = threading.Event()
+
+    def blocked(item: int) -> int:
+        release.wait()
+        return item
+
+    def count(item: int) -> int:
+        with lock:
+            running[0] += 1
+        return item
+
+    pipeline: StagedPipeline = StagedPipeline(
+        [Stage("count", count), Stage("blocked", blocked)], queue_size=2
+    )
+    results: list = []
+    consumer: threading.Thread = threading.Thread(
+        target=lambda: results.extend(pipeline.run(range(20)))
+    )
+    consumer.start()
+    time.sleep(0.1)
+    # one item in each stage and the queue before the blocked one full
+    assert running[0] <= 4
+    release.set()
+    consumer.join()
+    assert [result for _, result in results] == list(range(20))
+    assert pipeline.stats[1].max_queue_depth <= 2
+
+
+def test_stats_to_dict():
+    pipeline: StagedPipeline = StagedPipeline([Stage("only", lambda item: item)])
+    list(pipeline.run(range(3)))
+    stats: dict = pipeline.stats[0].to_dict()
+    assert stats["stage"] == "only" and stats["items"] == 3
+    assert stats["errors"] == 0
+    assert "only: 3 items" in pipeline.format_stats()
+
+
+def test_empty_inputs():
+    pipeline: StagedPipeline = StagedPipeline([Stage("only", lambda item: item)])
+    assert list(pipeline.run([])) == []
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        StagedPipeline([])
+    with pytest.raises(ValueError):
+        StagedPipeline([Stage("only", lambda item: item)], queue_size=0)
+    with pytest.raises(ValueError):
+        Stage("only", lambda item: item, concurrency=0)
+    with pytest.raises(ValueError):
+        Stage("only", lambda item: item, batch_size=0)
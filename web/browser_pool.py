@@ -0,0 +1,176 @@
+import asyncio
+import atexit
+import threading
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Coroutine, Optional
+
+if TYPE_CHECKING:
+    from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+"""
+Pool of long-lived headless browsers shared by every query of the process.
+crawl4ai is imported when the first browser starts, it is slow to import
+"""
+
+
+class _PooledBrowser:
+    def __init__(self) -> None:
+        self.crawler: Optional["AsyncWebCrawler"] = None
+        self.pages_served: int = 0
+
+
+class BrowserPool:
+    """
+    Keeps `size` browsers warm on a dedicated event loop running in a background
+    thread, so that they survive across queries and across asyncio.run calls.
+    A browser is recycled after `recycle_after` pages or as soon as a page fails on it.
+    """
+
+    def __init__(
+        self,
+        get_browser_config: Callable[[], "BrowserConfig"],
+        size: int = 4,
+        recycle_after: int = 50,
+    ) -> None:
+        """get_browser_config is called when the first browser starts"""
+        if size <= 0:
+            raise ValueError("size must be greater than 0")
+        if recycle_after <= 0:
+            raise ValueError("recycle_after must be greater than 0")
+
+        self.size: int = size
+        self.recycle_after: int = recycle_after
+        self.__get_browser_config: Callable[[], "BrowserConfig"] = get_browser_config
+        self.__browser_config: Optional["BrowserConfig"] = None
+        self.__closed: bool = False
+
+        self.__loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.__thread: threading.Thread = threading.Thread(
+            target=self.__loop.run_forever, name="browser-pool", daemon=True
+        )
+        self.__thread.start()
+
+        self.__idle: asyncio.Queue = self.run(self.__create_idle_queue())
+        atexit.register(self.close)
+
+    async def __create_idle_queue(self) -> asyncio.Queue:
+        idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.size):
+            idle.put_nowait(_PooledBrowser())
+        return idle
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.__loop
+
+    def run(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the pool loop and wait for its result"""
+        if self.__closed:
+            coro.close()
+            raise RuntimeError("The browser pool has been closed.")
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    async def arun(self, coro: Coroutine) -> Any:
+        """Await a coroutine on the pool loop from another running event loop"""
+        if self.__closed:
+            coro.close()
+            raise RuntimeError("The browser pool has been closed.")
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(coro, self.__loop)
+        )
+
+    async def __start_browser(self, slot: _PooledBrowser) -> None:
+        from crawl4ai import AsyncWebCrawler
+
+        if self.__browser_config is None:
+            self.__browser_config = self.__get_browser_config()
+        crawler: AsyncWebCrawler = AsyncWebCrawler(config=self.__browser_config)
+        try:
+            await crawler.start()
+        except BaseException:
+            # a browser started halfway would be left running
+            try:
+                await crawler.close()
+            except Exception:
+                pass
+            raise
+        slot.crawler = crawler
+        slot.pages_served = 0
+
+    async def __stop_browser(self, slot: _PooledBrowser) -> None:
+        if slot.crawler is None:
+            return
+        try:
+            await slot.crawler.close()
+        except Exception as e:
+            print(f"[WARNING] Error while closing a pooled browser: {e}")
+        slot.crawler = None
+        slot.pages_served = 0
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator["AsyncWebCrawler"]:
+        """
+        Borrow a running browser, it must be used from the pool loop only.
+        If the body raises, the browser is considered broken and it is replaced,
+        but not when the body is cancelled (e.g. the pages left after an early
+        stop): the browser goes back to the pool
+        """
+        slot: _PooledBrowser = await self.__idle.get()
+        try:
+            if slot.crawler is None:
+                await self.__start_browser(slot)
+
+            try:
+                yield slot.crawler
+            except asyncio.CancelledError:
+                raise
+            except BaseException:
+                await self.__stop_browser(slot)
+                raise
+
+            slot.pages_served += 1
+            if slot.pages_served >= self.recycle_after:
+                await self.__stop_browser(slot)
+        finally:
+            self.__idle.put_nowait(slot)
+
+    async def __warm_up(self) -> None:
+        slots: list[_PooledBrowser] = [
+            self.__idle.get_nowait() for _ in range(self.__idle.qsize())
+        ]
+        try:
+            await asyncio.gather(
+                *[self.__start_browser(slot) for slot in slots if slot.crawler is None]
+            )
+        finally:
+            for slot in slots:
+                self.__idle.put_nowait(slot)
+
+    def warm_up(self) -> None:
+        """Start all the idle browsers now instead of at their first page"""
+        self.run(self.__warm_up())
+
+    async def __close_all(self) -> None:
+        slots: list[_PooledBrowser] = []
+        while len(slots) < self.size:
+            slots.append(await self.__idle.get())
+        await asyncio.gather(*[self.__stop_browser(slot) for slot in slots])
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Close every browser and stop the pool loop, it is safe to call it twice"""
+        if self.__closed:
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self.__close_all(), self.__loop).result(
+                timeout
+            )
+        except Exception as e:
+            print(f"[WARNING] Browser pool not closed cleanly: {e}")
+        finally:
+            self.__closed = True
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join(timeout)
+            if not self.__thread.is_alive():
+                self.__loop.close()
+            atexit.unregister(self.close)
@@ -1,11 +1,17 @@
 from typing import Union
 
-import requests
-from bs4 import BeautifulSoup
 from fake_http_header import FakeHttpHeader
 
+from pipeline.metrics import QueryMetrics
+
+from .html_extraction import HtmlExtractor, get_extractor
+from .multi_search import RateLimitError
+from .rate_limited_session import RATE_LIMIT_STATUSES, RateLimitedSession
+from .search_cache import SearchCache
+
 """
-Use simple request and user agent rotation to scrape DuckDuckGo search results
+Use simple requests with fake browser headers to scrape DuckDuckGo search results.
+The requests go through a RateLimitedSession, shared by all the queries
 """
 
 
@@ -13,20 +19,46 @@ class DuckDuckGoScraper:
     __DDG_URL = "https://html.duckduckgo.com/html"
     __MAX_RESULT_FOR_PAGE_DDG = 10
 
-    def __get_ddg_html_content(self, query: str, region: str = "wt-wt") -> str:
-        # use fake http headers
-        fake_header: FakeHttpHeader = FakeHttpHeader()
-        headers: dict = fake_header.as_header_dict()
-
+    def __init__(
+        self,
+        search_cache: SearchCache = None,
+        url: str = None,
+        extractor: HtmlExtractor = None,
+        session: RateLimitedSession = None,
+    ) -> None:
+        """
+        url replaces the DuckDuckGo html endpoint, e.g. with a local stand-in.
+        extractor parses the result pages, by default the fastest engine installed.
+        session sends the requests, by default with its default rate limit
+        """
+        self.search_cache: SearchCache = search_cache
+        self.url: str = url or self.__DDG_URL
+        self.extractor: HtmlExtractor = extractor or get_extractor()
+        self.session: RateLimitedSession = session or RateLimitedSession()
+        # the same fake headers for all the requests, like a single browser
+        self.__headers: dict[str, str] = FakeHttpHeader().as_header_dict()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __get_ddg_html_content(
+        self, query: str, region: str = "wt-wt", metrics: QueryMetrics = None
+    ) -> str:
         params: dict = {
             "q": query,
             "kl": region,
         }
 
-        response = requests.post(self.__DDG_URL, headers=headers, data=params)
+        response = self.session.post(
+            self.url, metrics, headers=self.__headers, data=params
+        )
 
         if response.status_code == 200:
             return response.text
+        # DuckDuckGo answers 202 with a captcha when it limits the requests, the
+        # session already retried
+        elif response.status_code in RATE_LIMIT_STATUSES:
+            raise RateLimitError(f"DuckDuckGo rate limit: {response.status_code}")
         else:
             raise Exception(f"Failed to retrieve content: {response.status_code}")
 
@@ -38,30 +70,9 @@ class DuckDuckGoScraper:
         Returns a list of dictionaries with 'title', 'description', and 'url'.
         """
 
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-        results: list = []
-        for i in soup.find_all("div", {"class": "links_main"}):
-            if i.find("a", {"class": "badge--ad"}):
-                continue
-            try:
-                title: str = i.h2.a.text
-                description: str = i.find("a", {"class": "result__snippet"}).text
-                url: str = i.find("a", {"class": "result__url"}).get("href")
-
-                if not title or not url:
-                    continue
+        return self.extractor.get_ddg_results(html, max_results)
 
-                results.append({"title": title, "description": description, "url": url})
-
-                if len(results) >= max_results:
-                    break
-
-            except AttributeError:
-                pass
-
-        return results
-
-    def get_web_links_ddg(self, query, max_results, region):
+    def get_web_links_ddg(self, query, max_results, region, metrics=None):
         if max_results <= 0:
             raise ValueError("max_results must be greater than 0")
 
@@ -72,7 +83,18 @@ class DuckDuckGoScraper:
                 }"
             )
 
-        html_content: str = self.__get_ddg_html_content(query, region)
+        if self.search_cache is not None:
+            return self.search_cache.get_or_search(
+                "ddg_custom",
+                query,
+                region,
+                max_results,
+                lambda: self.__search(query, max_results, region, metrics),
+            )
+        return self.__search(query, max_results, region, metrics)
+
+    def __search(self, query, max_results, region, metrics=None):
+        html_content: str = self.__get_ddg_html_content(query, region, metrics)
         results: list[dict[str, str]] = self.__parse_ddg_result_page(
             html_content, max_results
         )
@@ -0,0 +1,329 @@
+import io
+import re
+from typing import Union
+
+from bs4 import BeautifulSoup, CData, NavigableString, SoupStrainer, Tag
+
+"""
+Extraction of text and links from html, with interchangeable engines that return
+the same results:
+- selectolax: the lexbor C parser, the fastest, needs `pip install selectolax`
+- lxml: the libxml2 C parser (installed with crawl4ai). The paragraphs are read
+  while the page is parsed and the rest of the tree is dropped as soon as it is
+  passed, so a large page is never in memory as a whole
+- bs4: BeautifulSoup with html.parser, always available; only the needed elements
+  are kept in the tree (SoupStrainer)
+get_extractor returns the fastest engine installed, or the one asked.
+"""
+
+SUPPORTED_HTML_ENGINES: list[str] = ["auto", "selectolax", "lxml", "bs4"]
+
+PARAGRAPH_TAGS: tuple[str, ...] = ("p", "dd")
+# elements whose content is never text, even inside a paragraph
+_NON_TEXT_TAGS: tuple[str, ...] = ("script", "style", "template")
+# the elements that close an open paragraph when they start, as libxml2 does,
+# html.parser nests them in the paragraph instead
+_CLOSED_BY: dict[str, frozenset[str]] = {
+    "p": frozenset(
+        "address blockquote caption center col colgroup dd dir div dl dt fieldset "
+        "form h1 h2 h3 h4 h5 h6 hr li listing menu ol p plaintext pre table tbody "
+        "td tfoot th tr ul xmp".split()
+    ),
+    "dd": frozenset(("dt",)),
+}
+
+Html = Union[str, bytes]
+
+# while parsing, the class attribute is still a single string
+_LINKS_MAIN_CLASS: re.Pattern = re.compile(r"(^|\s)links_main(\s|$)")
+
+
+def _has_class(name: str) -> str:
+    """xpath condition true for the elements with the css class name"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+class SelectolaxExtractor:
+    name: str = "selectolax"
+
+    def __init__(self) -> None:
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.__parser = LexborHTMLParser
+
+    def get_paragraphs(
+        self, html: Html, tags: tuple[str, ...] = PARAGRAPH_TAGS
+    ) -> list[str]:
+        """The text of every element with one of the tags, in the order of the page"""
+        tree = self.__parser(html)
+        tree.strip_tags(list(_NON_TEXT_TAGS))
+        texts: list[str] = []
+        for node in tree.css(", ".join(tags)):
+            text: str = node.text(deep=True)
+            if text:
+                texts.append(text)
+        return texts
+
+    def get_text(self, html: Html, skipped_tags: list[str]) -> str:
+        """
+        The text of the main content of the page (main, article or body) without
+        the skipped elements, one line for every piece of text
+        """
+        tree = self.__parser(html)
+        tree.strip_tags(skipped_tags)
+        root = tree.css_first("main") or tree.css_first("article") or tree.body
+        return root.text(deep=True, separator="\n") if root is not None else ""
+
+    def get_ddg_results(self, html: Html, max_results: int) -> list[dict[str, str]]:
+        """title, description and url of the results of a DuckDuckGo html page"""
+        tree = self.__parser(html)
+        results: list[dict[str, str]] = []
+        for block in tree.css("div.links_main"):
+            if block.css_first("a.badge--ad") is not None:
+                continue
+            title = block.css_first("h2 a")
+            description = block.css_first("a.result__snippet")
+            link = block.css_first("a.result__url")
+            if title is None or description is None or link is None:
+                continue
+
+            url: str = link.attributes.get("href")
+            if not title.text() or not url:
+                continue
+            results.append(
+                {"title": title.text(), "description": description.text(), "url": url}
+            )
+            if len(results) >= max_results:
+                break
+        return results
+
+
+class LxmlExtractor:
+    name: str = "lxml"
+
+    def __init__(self) -> None:
+        from lxml import etree
+
+        self.__etree = etree
+
+    def __parse(self, html: Html):
+        """Root element of the whole page, None if the page is empty"""
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+            parser = self.__etree.HTMLParser(encoding="utf-8", remove_comments=True)
+        else:
+            parser = self.__etree.HTMLParser(remove_comments=True)
+        return self.__etree.fromstring(html, parser) if html.strip() else None
+
+    @staticmethod
+    def __drop(element) -> None:
+        """Remove the element and its children, keeping the text after it"""
+        parent = element.getparent()
+        if parent is None:
+            return
+        if element.tail:
+            previous = element.getprevious()
+            if previous is not None:
+                previous.tail = (previous.tail or "") + element.tail
+            else:
+                parent.text = (parent.text or "") + element.tail
+        parent.remove(element)
+
+    def get_paragraphs(
+        self, html: Html, tags: tuple[str, ...] = PARAGRAPH_TAGS
+    ) -> list[str]:
+        """The text of every element with one of the tags, in the order of the page"""
+        encoding: str = None
+        if isinstance(html, str):
+            html, encoding = html.encode("utf-8"), "utf-8"
+        if not html.strip():
+            return []
+
+        texts: list[str] = []
+        # positions in texts of the elements still open, a dd can contain a p
+        open_blocks: list[int] = []
+        for event, element in self.__etree.iterparse(
+            io.BytesIO(html),
+            events=("start", "end"),
+            html=True,
+            encoding=encoding,
+            remove_comments=True,
+        ):
+            if event == "start":
+                if element.tag in tags:
+                    open_blocks.append(len(texts))
+                    texts.append("")
+                continue
+
+            if element.tag in _NON_TEXT_TAGS:
+                self.__drop(element)
+                continue
+            if element.tag in tags:
+                texts[open_blocks.pop()] = "".join(element.itertext())
+            if not open_blocks:
+                # nothing before this point is needed anymore
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+        return [text for text in texts if text]
+
+    def get_text(self, html: Html, skipped_tags: list[str]) -> str:
+        """
+        The text of the main content of the page (main, article or body) without
+        the skipped elements, one line for every piece of text
+        """
+        root = self.__parse(html)
+        if root is None:
+            return ""
+        for element in list(root.iter(*skipped_tags)):
+            self.__drop(element)
+
+        main = None
+        for tag in ("main", "article", "body"):
+            main = next(root.iter(tag), None)
+            if main is not None:
+                break
+        return "\n".join((main if main is not None else root).itertext())
+
+    def get_ddg_results(self, html: Html, max_results: int) -> list[dict[str, str]]:
+        """title, description and url of the results of a DuckDuckGo html page"""
+        root = self.__parse(html)
+        if root is None:
+            return []
+
+        results: list[dict[str, str]] = []
+        for block in root.xpath(f"//div[{_has_class('links_main')}]"):
+            if block.xpath(f".//a[{_has_class('badge--ad')}]"):
+                continue
+            title = block.xpath("(.//h2)[1]//a")
+            description = block.xpath(f".//a[{_has_class('result__snippet')}]")
+            link = block.xpath(f".//a[{_has_class('result__url')}]")
+            if not title or not description or not link:
+                continue
+
+            title_text: str = "".join(title[0].itertext())
+            url: str = link[0].get("href")
+            if not title_text or not url:
+                continue
+            results.append(
+                {
+                    "title": title_text,
+                    "description": "".join(description[0].itertext()),
+                    "url": url,
+                }
+            )
+            if len(results) >= max_results:
+                break
+        return results
+
+
+class SoupExtractor:
+    name: str = "bs4"
+
+    def get_paragraphs(
+        self, html: Html, tags: tuple[str, ...] = PARAGRAPH_TAGS
+    ) -> list[str]:
+        """The text of every element with one of the tags, in the order of the page"""
+        # the strings made only of spaces are kept as they are, like the other engines
+        soup: BeautifulSoup = BeautifulSoup(
+            html,
+            "html.parser",
+            parse_only=SoupStrainer(list(tags)),
+            preserve_whitespace_tags=list(tags),
+        )
+        for element in soup.find_all(list(_NON_TEXT_TAGS)):
+            element.decompose()
+        texts: list[str] = []
+        for block in soup.find_all(list(tags)):
+            text: str = self.__block_text(block)
+            if text:
+                texts.append(text)
+        return texts
+
+    @staticmethod
+    def __block_text(block: Tag) -> str:
+        """The text of the block up to the first element that would close it"""
+        closed_by: frozenset[str] = _CLOSED_BY.get(block.name, frozenset())
+        parts: list[str] = []
+        for element in block.descendants:
+            if isinstance(element, Tag):
+                if element.name in closed_by:
+                    break
+            # not the comments and the other special strings
+            elif type(element) in (NavigableString, CData):
+                parts.append(element)
+        return "".join(parts)
+
+    def get_text(self, html: Html, skipped_tags: list[str]) -> str:
+        """
+        The text of the main content of the page (main, article or body) without
+        the skipped elements, one line for every piece of text
+        """
+        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
+        for tag in soup(skipped_tags):
+            tag.decompose()
+
+        root = soup.find("main") or soup.find("article") or soup.body or soup
+        return root.get_text("\n")
+
+    def get_ddg_results(self, html: Html, max_results: int) -> list[dict[str, str]]:
+        """title, description and url of the results of a DuckDuckGo html page"""
+        strainer: SoupStrainer = SoupStrainer("div", class_=_LINKS_MAIN_CLASS)
+        soup: BeautifulSoup = BeautifulSoup(html, "html.parser", parse_only=strainer)
+        results: list[dict[str, str]] = []
+        for i in soup.find_all("div", {"class": "links_main"}):
+            if i.find("a", {"class": "badge--ad"}):
+                continue
+            try:
+                title: str = i.h2.a.text
+                description: str = i.find("a", {"class": "result__snippet"}).text
+                url: str = i.find("a", {"class": "result__url"}).get("href")
+
+                if not title or not url:
+                    continue
+
+                results.append(
+                    {"title": title, "description": description, "url": url}
+                )
+
+                if len(results) >= max_results:
+                    break
+
+            except AttributeError:
+                pass
+
+        return results
+
+
+HtmlExtractor = Union[SelectolaxExtractor, LxmlExtractor, SoupExtractor]
+
+_ENGINES: dict[str, type] = {
+    "selectolax": SelectolaxExtractor,
+    "lxml": LxmlExtractor,
+    "bs4": SoupExtractor,
+}
+
+
+def get_extractor(engine: str = "auto") -> HtmlExtractor:
+    """
+    The extractor of the engine, with auto the fastest one installed.
+    An engine that is not installed falls back to auto
+    """
+    if engine not in SUPPORTED_HTML_ENGINES:
+        raise ValueError(
+            f"Unsupported html engine: {engine}. "
+            f"Supported engines are: {SUPPORTED_HTML_ENGINES}"
+        )
+
+    if engine != "auto":
+        try:
+            return _ENGINES[engine]()
+        except ImportError:
+            print(f"[WARNING] The html engine {engine} is not installed, using auto.")
+
+    for extractor_class in _ENGINES.values():
+        try:
+            return extractor_class()
+        except ImportError:
+            continue
@@ -0,0 +1,332 @@
+import codecs
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .html_extraction import HtmlExtractor, get_extractor
+
+"""
+First tier of the scraper: a plain GET with a pooled keep-alive session, much
+cheaper than rendering the page in the headless browser. The text is extracted
+directly from the html; when the page looks rendered by JavaScript, or the text is
+too short, the caller falls back to the browser.
+DomainTiers remembers for every domain which tier worked, so the domains that
+always need the browser do not waste a request first.
+"""
+
+HTTP_TIER: str = "http"
+BROWSER_TIER: str = "browser"
+
+_META_CHARSET: re.Pattern = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", flags=re.IGNORECASE
+)
+
+
+def _known_encoding(name: Union[str, bytes, None]) -> Optional[str]:
+    if not name:
+        return None
+    if isinstance(name, bytes):
+        name = name.decode("ascii", errors="ignore")
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def decode_html(
+    body: bytes,
+    content_type: str = "",
+    apparent_encoding: Callable[[], Optional[str]] = None,
+) -> str:
+    """
+    The text of an html page: with the charset of the Content-Type header, else the
+    one of its <meta> tag, else utf-8 if the page is valid utf-8, else
+    apparent_encoding (a callable, it is slow) or latin-1.
+    Without a charset in the header requests says ISO-8859-1, wrong for most pages
+    """
+    header: Optional[re.Match] = re.search(
+        r"charset=[\"']?([\w.:-]+)", content_type, flags=re.IGNORECASE
+    )
+    encoding: Optional[str] = _known_encoding(header.group(1) if header else None)
+    if encoding is None:
+        meta: Optional[re.Match] = _META_CHARSET.search(body[:4096])
+        encoding = _known_encoding(meta.group(1) if meta else None)
+    if encoding is not None:
+        return body.decode(encoding, errors="replace")
+
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    encoding = _known_encoding(apparent_encoding() if apparent_encoding else None)
+    return body.decode(encoding or "latin-1", errors="replace")
+
+
+class DomainTiers:
+    def __init__(
+        self,
+        path: str = None,
+        retry_http_after: float = 7 * 86400,
+        browser_after: int = 3,
+    ) -> None:
+        """
+        The tiers are kept in memory and, if path is given, also in sqlite so they
+        survive between runs. A domain needs the browser after browser_after pages in
+        a row that needed it, a single thin page (an index, a login wall) says little
+        about the others. It is tried again with http after retry_http_after seconds,
+        pages change
+        """
+        if browser_after <= 0:
+            raise ValueError("browser_after must be greater than 0")
+        self.retry_http_after: float = retry_http_after
+        self.browser_after: int = browser_after
+        # [domain] -> (tier, updated_at, pages in a row that needed the browser)
+        self.__tiers: dict[str, tuple[str, float, int]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = None
+
+        if path:
+            directory: str = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.__db = sqlite3.connect(path, check_same_thread=False)
+            self.__db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS domains (
+                    domain TEXT PRIMARY KEY,
+                    tier TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    browser_pages INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns: list[str] = [
+                row[1] for row in self.__db.execute("PRAGMA table_info(domains)")
+            ]
+            # written by a version without the count
+            if "browser_pages" not in columns:
+                self.__db.execute(
+                    "ALTER TABLE domains "
+                    "ADD COLUMN browser_pages INTEGER NOT NULL DEFAULT 0"
+                )
+                self.__db.execute(
+                    "UPDATE domains SET browser_pages = ? WHERE tier = ?",
+                    (browser_after, BROWSER_TIER),
+                )
+            self.__db.commit()
+            for domain, tier, updated_at, browser_pages in self.__db.execute(
+                "SELECT domain, tier, updated_at, browser_pages FROM domains"
+            ):
+                self.__tiers[domain] = (tier, updated_at, browser_pages)
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def get(self, url: str) -> str:
+        """Tier to try first for the url, http if the domain is unknown"""
+        with self.__lock:
+            tier, updated_at, _ = self.__tiers.get(
+                self.get_domain(url), (HTTP_TIER, 0, 0)
+            )
+        if tier == BROWSER_TIER and time.time() - updated_at > self.retry_http_after:
+            return HTTP_TIER
+        return tier
+
+    def record(self, url: str, tier: str) -> None:
+        """
+        Remember the tier needed by a page of the domain of the url. The browser is
+        recorded only after a failed http attempt, so its time is always stored
+        """
+        domain: str = self.get_domain(url)
+        now: float = time.time()
+        with self.__lock:
+            previous: tuple[str, float, int] = self.__tiers.get(
+                domain, (HTTP_TIER, 0, 0)
+            )
+            browser_pages: int = previous[2] + 1 if tier == BROWSER_TIER else 0
+            domain_tier: str = (
+                BROWSER_TIER if browser_pages >= self.browser_after else HTTP_TIER
+            )
+            self.__tiers[domain] = (domain_tier, now, browser_pages)
+            unchanged: bool = (
+                previous[0] == domain_tier and previous[2] == browser_pages
+            )
+            if self.__db is None or (unchanged and domain_tier == HTTP_TIER):
+                return
+            self.__db.execute(
+                "INSERT OR REPLACE INTO domains VALUES (?, ?, ?, ?)",
+                (domain, domain_tier, now, browser_pages),
+            )
+            self.__db.commit()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+
+class HttpFetcher:
+    __USER_AGENT: str = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    )
+    # elements that never contain the text of the page
+    __SKIPPED_TAGS: list[str] = [
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "svg",
+        "iframe",
+        "form",
+        "nav",
+        "header",
+        "footer",
+        "aside",
+    ]
+    __JS_REQUIRED: re.Pattern = re.compile(
+        r"(enable|turn on|activate) javascript|javascript is (disabled|required)"
+        r"|requires javascript",
+        flags=re.IGNORECASE,
+    )
+    # empty mount points of the single page applications
+    __EMPTY_APP_ROOT: re.Pattern = re.compile(
+        r'<div[^>]+id=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</div>',
+        flags=re.IGNORECASE,
+    )
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        pool_size: int = 16,
+        min_text_chars: int = 500,
+        max_page_mb: float = 5,
+        domain_tiers: DomainTiers = None,
+        extractor: HtmlExtractor = None,
+    ) -> None:
+        """
+        timeout is in seconds, for the connection and for every read.
+        A page whose extracted text is shorter than min_text_chars is considered not
+        rendered, pages bigger than max_page_mb are not downloaded.
+        extractor is the html engine, by default the fastest one installed
+        """
+        self.timeout: float = timeout
+        self.min_text_chars: int = min_text_chars
+        self.max_page_bytes: int = int(max_page_mb * 1024 * 1024)
+        self.domain_tiers: DomainTiers = domain_tiers or DomainTiers()
+        self.extractor: HtmlExtractor = extractor or get_extractor()
+
+        self.__session: requests.Session = requests.Session()
+        adapter: HTTPAdapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+        self.__session.headers.update(
+            {
+                "User-Agent": self.__USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+                "Accept-Language": "en-US,en;q=0.8",
+                "Accept-Encoding": self.__get_accept_encoding(),
+            }
+        )
+
+    @staticmethod
+    def __get_accept_encoding() -> str:
+        # requests decodes brotli only when one of these packages is installed
+        try:
+            import brotli  # noqa: F401
+
+            return "gzip, deflate, br"
+        except ImportError:
+            try:
+                import brotlicffi  # noqa: F401
+
+                return "gzip, deflate, br"
+            except ImportError:
+                return "gzip, deflate"
+
+    def __download(self, url: str) -> Optional[tuple[str, dict]]:
+        """The html and the headers of the page, None if it is not a usable html"""
+        with self.__session.get(
+            url, timeout=self.timeout, stream=True, allow_redirects=True
+        ) as response:
+            if response.status_code != 200:
+                return None
+            content_type: str = response.headers.get("Content-Type", "")
+            if "html" not in content_type:
+                return None
+
+            pieces: list[bytes] = []
+            size: int = 0
+            for piece in response.iter_content(chunk_size=64 * 1024):
+                pieces.append(piece)
+                size += len(piece)
+                if size > self.max_page_bytes:
+                    return None
+
+            html: str = decode_html(
+                b"".join(pieces),
+                content_type,
+                lambda: response.apparent_encoding,
+            )
+            return html, dict(response.headers)
+
+    def extract_text(self, html: str) -> str:
+        """Readable text of the page: the main content without menus and scripts"""
+        text: str = self.extractor.get_text(html, self.__SKIPPED_TAGS)
+        text = re.sub(r"[ \t\r\f\v]+", " ", text)
+        text = re.sub(r"\n\s*\n+", "\n\n", text)
+        return text.strip()
+
+    def needs_browser(self, html: str, text: str) -> bool:
+        """True if the page looks rendered by JavaScript or its text is too short"""
+        if len(text) < self.min_text_chars:
+            return True
+        if self.__EMPTY_APP_ROOT.search(html):
+            return True
+        # a short text asking for javascript is the placeholder of the real page
+        return len(text) < 4 * self.min_text_chars and bool(
+            self.__JS_REQUIRED.search(text)
+        )
+
+    def fetch(self, url: str) -> Optional[tuple[str, str, dict]]:
+        """
+        Get the page with a plain GET.
+        Returns (html, text, headers), None if the browser is needed: the domain
+        needed it before, the request failed or the page is not rendered.
+        Only a page that is not rendered marks its domain as a browser domain, a
+        failed request says nothing about the other pages
+        """
+        if self.domain_tiers.get(url) == BROWSER_TIER:
+            return None
+
+        try:
+            downloaded = self.__download(url)
+        except requests.RequestException as e:
+            print(f"[WARNING] HTTP fetch failed for {url}: {e}")
+            downloaded = None
+        if downloaded is None:
+            return None
+
+        html, headers = downloaded
+        text: str = self.extract_text(html)
+        if self.needs_browser(html, text):
+            self.domain_tiers.record(url, BROWSER_TIER)
+            return None
+
+        self.domain_tiers.record(url, HTTP_TIER)
+        return html, text, headers
+
+    def close(self) -> None:
+        self.__session.close()
+        self.domain_tiers.close()
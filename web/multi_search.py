@@ -0,0 +1,302 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from pipeline.metrics import QueryMetrics
+
+"""
+Search with more than one engine, the configured one first:
+- fallback: the next engine is tried only when the one before fails, returns
+  nothing or takes longer than timeout
+- hedged: like fallback, but the next engine is also started when the one before
+  has not answered after hedge_after seconds; the first links found win
+- parallel: all the engines at the same time, their links are merged
+The links of more engines are merged by rank (the first of every engine, then
+the second...) without duplicates.
+Every engine has a circuit breaker: after failure_threshold failures in a row, or
+a single rate-limit response, the engine is skipped for reset_after seconds, then
+a single search tries it again.
+"""
+
+SUPPORTED_SEARCH_MODES: list[str] = ["fallback", "hedged", "parallel"]
+# the engines tried after the configured one when none are set, the same
+# fallbacks get_links always had when an engine found nothing
+DEFAULT_FALLBACK_ENGINES: dict[str, list[str]] = {
+    "ddg": ["google"],
+    "google": ["ddg"],
+    "ddg_custom": ["google"],
+}
+
+# (engine) -> links
+SearchFn = Callable[[str], list[str]]
+
+
+class RateLimitError(Exception):
+    """The search engine refused the request because of too many requests"""
+
+
+def is_rate_limit(error: Exception) -> bool:
+    if isinstance(error, RateLimitError):
+        return True
+    # requests.HTTPError (googlesearch) and RatelimitException (duckduckgo_search)
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "ratelimit" in type(error).__name__.lower()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_after: float = 60.0) -> None:
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be greater than 0")
+        self.failure_threshold: int = failure_threshold
+        self.reset_after: float = reset_after
+        self.__failures: int = 0
+        self.__opened_at: Optional[float] = None
+        self.__trial_running: bool = False
+        self.__lock: threading.Lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed (used), open (skipped) or half_open (a trial search is allowed)"""
+        with self.__lock:
+            if self.__opened_at is None:
+                return "closed"
+            if time.monotonic() - self.__opened_at < self.reset_after:
+                return "open"
+            return "half_open"
+
+    def allow(self) -> bool:
+        """True if the engine can be used, when half open only for one search"""
+        with self.__lock:
+            if self.__opened_at is None:
+                return True
+            if time.monotonic() - self.__opened_at < self.reset_after:
+                return False
+            if self.__trial_running:
+                return False
+            self.__trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+            self.__trial_running = False
+
+    def record_failure(self, rate_limited: bool = False) -> None:
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if (
+                rate_limited
+                or self.__opened_at is not None
+                or self.__failures >= self.failure_threshold
+            ):
+                self.__opened_at = time.monotonic()
+
+
+def merge_links(results: list[list[str]], max_results: int) -> list[str]:
+    """The links of every engine by rank, without duplicates, at most max_results"""
+    links: list[str] = []
+    seen: set[str] = set()
+    for rank in range(max((len(result) for result in results), default=0)):
+        for result in results:
+            if rank >= len(result):
+                continue
+            # the same page with a trailing slash or an anchor
+            key: str = result[rank].split("#")[0].rstrip("/")
+            if key not in seen:
+                seen.add(key)
+                links.append(result[rank])
+    return links[:max_results]
+
+
+class _Attempt:
+    def __init__(self, engine: str, future: Future) -> None:
+        self.engine: str = engine
+        self.future: Future = future
+        self.started_at: float = time.monotonic()
+        self.timed_out: bool = False
+
+    def links(self) -> list[str]:
+        if self.timed_out or not self.future.done():
+            return []
+        return self.future.result()
+
+
+class MultiEngineSearch:
+    def __init__(
+        self,
+        mode: str = "fallback",
+        fallback_engines: list[str] = None,
+        hedge_after: float = 2.0,
+        timeout: float = 15.0,
+        failure_threshold: int = 3,
+        reset_after: float = 60.0,
+    ) -> None:
+        """
+        fallback_engines are tried after the configured engine, by default the
+        ones of DEFAULT_FALLBACK_ENGINES. timeout is the longest wait for a single
+        engine, in seconds; a search still running after it is left in background
+        and counts as a failure
+        """
+        if mode not in SUPPORTED_SEARCH_MODES:
+            raise ValueError(
+                f"Unsupported search mode: {mode}. "
+                f"Supported modes are: {SUPPORTED_SEARCH_MODES}"
+            )
+        if hedge_after < 0 or timeout <= 0:
+            raise ValueError("hedge_after must be >= 0 and timeout greater than 0")
+        self.mode: str = mode
+        self.fallback_engines: Optional[list[str]] = fallback_engines
+        self.hedge_after: float = hedge_after
+        self.timeout: float = timeout
+        self.failure_threshold: int = failure_threshold
+        self.reset_after: float = reset_after
+
+        self.__breakers: dict[str, CircuitBreaker] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__executor: ThreadPoolExecutor = None
+
+    def close(self) -> None:
+        """The searches still running are not waited for"""
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=False, cancel_futures=True)
+                self.__executor = None
+
+    def get_engines(self, search_engine: str) -> list[str]:
+        """search_engine followed by its fallback engines"""
+        fallback_engines: list[str] = (
+            self.fallback_engines
+            if self.fallback_engines is not None
+            else DEFAULT_FALLBACK_ENGINES.get(search_engine, [])
+        )
+        return [search_engine] + [
+            engine
+            for engine in dict.fromkeys(fallback_engines)
+            if engine != search_engine
+        ]
+
+    def get_breaker(self, engine: str) -> CircuitBreaker:
+        with self.__lock:
+            if engine not in self.__breakers:
+                self.__breakers[engine] = CircuitBreaker(
+                    self.failure_threshold, self.reset_after
+                )
+            return self.__breakers[engine]
+
+    def __get_executor(self) -> ThreadPoolExecutor:
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=8, thread_name_prefix="search"
+                )
+            return self.__executor
+
+    def __run(
+        self, engine: str, search_fn: SearchFn, metrics: QueryMetrics
+    ) -> list[str]:
+        start: float = time.monotonic()
+        try:
+            links: list[str] = search_fn(engine) or []
+        except Exception as e:
+            rate_limited: bool = is_rate_limit(e)
+            print(
+                f"[ERROR] Search on {engine} failed"
+                f"{' (rate limited)' if rate_limited else ''}: {e}"
+            )
+            metrics.count("search_errors")
+            self.get_breaker(engine).record_failure(rate_limited)
+            return []
+        # a slower search is a failure, recorded when the caller stopped waiting
+        if time.monotonic() - start <= self.timeout:
+            self.get_breaker(engine).record_success()
+        if not links:
+            print(f"[WARNING] No results found on {engine}.")
+        return links
+
+    def search(
+        self,
+        search_engine: str,
+        search_fn: SearchFn,
+        max_results: int,
+        metrics: QueryMetrics = None,
+    ) -> list[str]:
+        """
+        The links of search_engine and its fallback engines, search_fn(engine)
+        searches a single engine
+        """
+        if metrics is None:
+            metrics = QueryMetrics()
+
+        queue: list[str] = self.get_engines(search_engine)
+        executor: ThreadPoolExecutor = self.__get_executor()
+        attempts: list[_Attempt] = []
+
+        def start_next() -> bool:
+            """Start the next engine allowed by its breaker, False if none is left"""
+            while queue:
+                engine: str = queue.pop(0)
+                if not self.get_breaker(engine).allow():
+                    print(f"[WARNING] Skipping {engine}, too many recent failures.")
+                    metrics.count("search_skipped")
+                    continue
+                if attempts:
+                    print(f"[INFO] Searching also on {engine}...")
+                future: Future = executor.submit(self.__run, engine, search_fn, metrics)
+                attempts.append(_Attempt(engine, future))
+                return True
+            return False
+
+        if not start_next():
+            return []
+        while self.mode == "parallel" and start_next():
+            pass
+
+        while True:
+            now: float = time.monotonic()
+            for attempt in attempts:
+                if (
+                    not attempt.future.done()
+                    and not attempt.timed_out
+                    and now - attempt.started_at >= self.timeout
+                ):
+                    print(f"[WARNING] No answer from {attempt.engine} in time.")
+                    attempt.timed_out = True
+                    self.get_breaker(attempt.engine).record_failure()
+            running: list[_Attempt] = [
+                attempt
+                for attempt in attempts
+                if not attempt.future.done() and not attempt.timed_out
+            ]
+            found: bool = any(attempt.links() for attempt in attempts)
+
+            if found and (self.mode != "parallel" or not running):
+                return merge_links(
+                    [attempt.links() for attempt in attempts], max_results
+                )
+            if not running:
+                # the last engine failed or found nothing, try the next one
+                if not start_next():
+                    return []
+                continue
+
+            deadline: float = min(a.started_at + self.timeout for a in running)
+            hedge: bool = bool(queue) and self.mode == "hedged"
+            if hedge:
+                deadline = min(deadline, attempts[-1].started_at + self.hedge_after)
+            done, _ = wait(
+                [attempt.future for attempt in running],
+                timeout=max(0.0, deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
+            )
+            if (
+                not done
+                and hedge
+                and time.monotonic() - attempts[-1].started_at >= self.hedge_after
+                and start_next()
+            ):
+                metrics.count("search_hedges")
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import requests
+
+"""
+On-disk cache of the cleaned text of the scraped pages.
+The text is stored in files named after its sha256 (so identical pages share the same
+file), while a sqlite index maps every url to its file and to the validators
+(ETag / Last-Modified) returned by the server.
+"""
+
+
+class CachedPage(NamedTuple):
+    url: str
+    content: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+
+class PageCache:
+    __INDEX_FILE: str = "index.sqlite"
+    __BLOBS_DIR: str = "blobs"
+    __REVALIDATION_TIMEOUT: float = 10.0
+
+    def __init__(
+        self,
+        directory: str,
+        ttl_seconds: float = 86400,
+        max_size_mb: float = 200,
+        revalidate: bool = True,
+    ) -> None:
+        if ttl_seconds < 0:
+            raise ValueError("ttl_seconds must be greater or equal than 0")
+        if max_size_mb <= 0:
+            raise ValueError("max_size_mb must be greater than 0")
+
+        self.directory: str = directory
+        self.ttl_seconds: float = ttl_seconds
+        self.max_size_bytes: int = int(max_size_mb * 1024 * 1024)
+        self.revalidate: bool = revalidate
+
+        os.makedirs(os.path.join(directory, self.__BLOBS_DIR), exist_ok=True)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = sqlite3.connect(
+            os.path.join(directory, self.__INDEX_FILE), check_same_thread=False
+        )
+        self.__db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.__db.execute("CREATE INDEX IF NOT EXISTS lru ON pages (last_access)")
+        self.__db.commit()
+
+    def __blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, self.__BLOBS_DIR, digest[:2], digest)
+
+    def __read_blob(self, digest: str) -> Optional[str]:
+        try:
+            with open(self.__blob_path(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def __write_blob(self, digest: str, data: bytes) -> None:
+        path: str = self.__blob_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path: str = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __delete_url(self, url: str, digest: str) -> None:
+        self.__db.execute("DELETE FROM pages WHERE url = ?", (url,))
+        still_used = self.__db.execute(
+            "SELECT 1 FROM pages WHERE digest = ? LIMIT 1", (digest,)
+        ).fetchone()
+        if not still_used:
+            try:
+                os.remove(self.__blob_path(digest))
+            except OSError:
+                pass
+
+    def __total_size(self) -> int:
+        row = self.__db.execute(
+            "SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM pages GROUP BY digest)"
+        ).fetchone()
+        return row[0] or 0
+
+    def __evict(self) -> None:
+        """Remove the least recently used pages until the cache fits max_size_mb"""
+        total: int = self.__total_size()
+        while total > self.max_size_bytes:
+            row = self.__db.execute(
+                "SELECT url, digest FROM pages ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self.__delete_url(*row)
+            total = self.__total_size()
+
+    def __lookup(self, url: str) -> Optional[CachedPage]:
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT digest, etag, last_modified, stored_at FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            digest, etag, last_modified, stored_at = row
+            content: Optional[str] = self.__read_blob(digest)
+            if content is None:
+                # the file was removed by hand
+                self.__db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.__db.commit()
+                return None
+
+            self.__db.execute(
+                "UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url)
+            )
+            self.__db.commit()
+            return CachedPage(url, content, etag, last_modified, stored_at)
+
+    def __is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.stored_at < self.ttl_seconds
+
+    def __is_not_modified(self, page: CachedPage) -> bool:
+        """Ask the server with a conditional request if the page changed"""
+        headers: dict[str, str] = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        if not headers:
+            return False
+
+        try:
+            with requests.get(
+                page.url,
+                headers=headers,
+                timeout=self.__REVALIDATION_TIMEOUT,
+                stream=True,
+            ) as response:
+                return response.status_code == 304
+        except requests.RequestException:
+            return False
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Return the cached content of the url if it is still fresh or if the server
+        confirms it did not change, None otherwise.
+        This may do a network request, so do not call it inside an event loop
+        """
+        page: Optional[CachedPage] = self.__lookup(url)
+        if page is None:
+            return None
+
+        if self.__is_fresh(page):
+            return page.content
+
+        if self.revalidate and self.__is_not_modified(page):
+            with self.__lock:
+                self.__db.execute(
+                    "UPDATE pages SET stored_at = ? WHERE url = ?", (time.time(), url)
+                )
+                self.__db.commit()
+            return page.content
+
+        return None
+
+    def put(
+        self,
+        url: str,
+        content: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        data: bytes = content.encode("utf-8")
+        if len(data) > self.max_size_bytes:
+            return
+
+        digest: str = hashlib.sha256(data).hexdigest()
+        now: float = time.time()
+
+        with self.__lock:
+            self.__write_blob(digest, data)
+            old = self.__db.execute(
+                "SELECT digest FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if old is not None and old[0] != digest:
+                self.__delete_url(url, old[0])
+
+            self.__db.execute(
+                """
+                INSERT OR REPLACE INTO pages
+                (url, digest, size, etag, last_modified, stored_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (url, digest, len(data), etag, last_modified, now, now),
+            )
+            self.__evict()
+            self.__db.commit()
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pipeline.metrics import QueryMetrics
+
+"""
+HTTP session shared by all the requests to the same search endpoint: the
+connections are pooled and kept alive, so a query does not pay a new TLS
+handshake, and every request has a timeout.
+Every host has a token bucket: requests_per_second tokens are added every second
+up to burst, a request takes one token and waits when none is left, so a batch
+of queries does not flood the endpoint and get blocked.
+A 202 or 429 answer (rate limit) is retried after a backoff that doubles at every
+attempt, with jitter so the waiting threads do not come back together, and the
+bucket of the host is paused for the same time.
+"""
+
+RATE_LIMIT_STATUSES: tuple[int, ...] = (202, 429)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """rate is in tokens per second, burst the tokens that can be saved"""
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if burst <= 0:
+            raise ValueError("burst must be greater than 0")
+        self.rate: float = rate
+        self.burst: int = burst
+        self.__tokens: float = float(burst)
+        self.__updated_at: float = time.monotonic()
+        self.__paused_until: float = 0.0
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __refill(self, now: float) -> None:
+        if now > self.__updated_at:
+            self.__tokens = min(
+                self.burst, self.__tokens + (now - self.__updated_at) * self.rate
+            )
+            self.__updated_at = now
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed. Returns the seconds waited"""
+        with self.__lock:
+            now: float = time.monotonic()
+            # no token is added while paused
+            start: float = max(now, self.__paused_until)
+            self.__refill(start)
+            # the token is reserved now, the threads after this one wait longer
+            self.__tokens -= 1
+            wait: float = start - now
+            if self.__tokens < 0:
+                wait += -self.__tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """No request for seconds, e.g. after a rate-limit answer"""
+        with self.__lock:
+            now: float = time.monotonic()
+            self.__refill(now)
+            self.__paused_until = max(self.__paused_until, now + seconds)
+            self.__updated_at = max(self.__updated_at, self.__paused_until)
+            # a single request when the pause ends
+            self.__tokens = min(self.__tokens, 1.0)
+
+
+class RateLimitedSession:
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        pool_size: int = 8,
+        requests_per_second: float = 1.0,
+        burst: int = 3,
+        max_retries: int = 2,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        headers: dict[str, str] = None,
+    ) -> None:
+        """
+        timeout is in seconds, for the connection and for every read. A rate-limited
+        request is retried max_retries times, the first time after about backoff
+        seconds (or the Retry-After of the answer), never more than max_backoff.
+        headers are sent with every request
+        """
+        if max_retries < 0:
+            raise ValueError("max_retries must be 0 or greater")
+        if backoff < 0 or max_backoff < backoff:
+            raise ValueError("backoff must be >= 0 and max_backoff >= backoff")
+        self.timeout: float = timeout
+        self.requests_per_second: float = requests_per_second
+        self.burst: int = burst
+        self.max_retries: int = max_retries
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+
+        # [host] -> bucket
+        self.__buckets: dict[str, TokenBucket] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__session: requests.Session = requests.Session()
+        adapter: HTTPAdapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+        if headers:
+            self.__session.headers.update(headers)
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        host: str = urlsplit(url).netloc.lower()
+        with self.__lock:
+            if host not in self.__buckets:
+                self.__buckets[host] = TokenBucket(
+                    self.requests_per_second, self.burst
+                )
+            return self.__buckets[host]
+
+    def get_backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before the retry number attempt (from 0)"""
+        if retry_after is not None and retry_after.strip().isdigit():
+            return min(float(retry_after), self.max_backoff)
+        delay: float = min(self.backoff * 2**attempt, self.max_backoff)
+        # between half and all of the delay
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def request(
+        self, method: str, url: str, metrics: QueryMetrics = None, **kwargs
+    ) -> requests.Response:
+        """
+        Like requests.request, within the rate limit of the host. The answer of the
+        last attempt is returned, also when it is still a rate limit
+        """
+        if metrics is None:
+            metrics = QueryMetrics()
+        bucket: TokenBucket = self.get_bucket(url)
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt: int = 0
+        while True:
+            if bucket.acquire() > 0:
+                metrics.count("search_throttled")
+            metrics.count("search_requests")
+            with metrics.measure("search_request"):
+                response: requests.Response = self.__session.request(
+                    method, url, **kwargs
+                )
+            if response.status_code not in RATE_LIMIT_STATUSES:
+                return response
+
+            metrics.count("search_rate_limited")
+            if attempt >= self.max_retries:
+                return response
+            delay: float = self.get_backoff(
+                attempt, response.headers.get("Retry-After")
+            )
+            print(
+                f"[WARNING] Rate limited by {urlsplit(url).netloc} "
+                f"({response.status_code}), retrying in {delay:.1f}s..."
+            )
+            response.close()
+            bucket.pause(delay)
+            attempt += 1
+
+    def post(
+        self, url: str, metrics: QueryMetrics = None, **kwargs
+    ) -> requests.Response:
+        return self.request("POST", url, metrics, **kwargs)
+
+    def close(self) -> None:
+        self.__session.close()
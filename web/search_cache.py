@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+"""
+Persistent cache of the links returned by the search engines, stored in sqlite.
+Empty results are cached too (with a shorter ttl) so that a query without results
+does not hit the search engine again at every run.
+"""
+
+
+class SearchCache:
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 21600,
+        negative_ttl_seconds: float = 600,
+    ) -> None:
+        if ttl_seconds < 0 or negative_ttl_seconds < 0:
+            raise ValueError("ttl_seconds and negative_ttl_seconds must be >= 0")
+
+        self.path: str = path
+        self.ttl_seconds: float = ttl_seconds
+        self.negative_ttl_seconds: float = negative_ttl_seconds
+
+        self.hits: int = 0
+        self.negative_hits: int = 0
+        self.misses: int = 0
+
+        directory: str = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.__lock: threading.Lock = threading.Lock()
+        self.__db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS searches (
+                engine TEXT NOT NULL,
+                query TEXT NOT NULL,
+                region TEXT NOT NULL,
+                max_results INTEGER NOT NULL,
+                links TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (engine, query, region, max_results)
+            )
+            """
+        )
+        self.__db.commit()
+
+    def get(
+        self, engine: str, query: str, region: str, max_results: int
+    ) -> Optional[list[str]]:
+        """Return the cached links (possibly empty), None if not cached or expired"""
+        with self.__lock:
+            row = self.__db.execute(
+                """
+                SELECT links, expires_at FROM searches
+                WHERE engine = ? AND query = ? AND region = ? AND max_results = ?
+                """,
+                (engine, query, region or "", max_results),
+            ).fetchone()
+
+            if row is None or row[1] < time.time():
+                self.misses += 1
+                return None
+
+            links: list[str] = json.loads(row[0])
+            if links:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return links
+
+    def put(
+        self, engine: str, query: str, region: str, max_results: int, links: list[str]
+    ) -> None:
+        ttl: float = self.ttl_seconds if links else self.negative_ttl_seconds
+        now: float = time.time()
+
+        with self.__lock:
+            self.__db.execute("DELETE FROM searches WHERE expires_at < ?", (now,))
+            self.__db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    engine,
+                    query,
+                    region or "",
+                    max_results,
+                    json.dumps(links),
+                    now + ttl,
+                ),
+            )
+            self.__db.commit()
+
+    def get_or_search(
+        self,
+        engine: str,
+        query: str,
+        region: str,
+        max_results: int,
+        search: Callable[[], list[str]],
+    ) -> list[str]:
+        """Return the cached links or call search() and cache its result"""
+        links: Optional[list[str]] = self.get(engine, query, region, max_results)
+        if links is not None:
+            return links
+
+        links = search()
+        self.put(engine, query, region, max_results, links)
+        return links
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
@@ -1,13 +1,31 @@
 import asyncio
 import re
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Callable, Optional
 
-from bs4 import BeautifulSoup
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlerRunConfig
-from duckduckgo_search import DDGS
-from googlesearch import search  # https://pypi.org/project/googlesearch-python/
-from strip_markdown import strip_markdown
+from pipeline.metrics import QueryMetrics
 
+from .browser_pool import BrowserPool
 from .duck import DuckDuckGoScraper
+from .html_extraction import HtmlExtractor, get_extractor
+from .http_fetcher import BROWSER_TIER, HTTP_TIER, HttpFetcher
+from .multi_search import MultiEngineSearch
+from .page_cache import PageCache
+from .rate_limited_session import RateLimitedSession
+from .search_cache import SearchCache
+
+if TYPE_CHECKING:
+    from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+
+# called with every page ({"url", "content"}) as soon as it is scraped, returns
+# True if no other page is needed
+OnPage = Callable[[dict[str, str]], bool]
+
+"""
+The browser (crawl4ai) and the search engine clients are imported only when they
+are used: they are slow to import and many runs need only some of them
+"""
 
 
 class WebScraper:
@@ -34,57 +52,140 @@ class WebScraper:
 
     __SUPPORTED_SEARCH_ENGINES: list[str] = ["ddg", "google", "ddg_custom"]
 
-    def get_web_links_ddg(
-        self, query: str, max_results: int, language: str
-    ) -> list[str]:
-        region: str = self.__get_ddg_region_from_language(language)
-        results: list[dict[str, str]] = DDGS().text(
-            query, max_results=max_results, region=region, safesearch="off"
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        page_timeout: float = 60.0,
+        use_browser_pool: bool = False,
+        recycle_browser_after: int = 50,
+        page_cache: PageCache = None,
+        search_cache: SearchCache = None,
+        ddg_custom_url: str = None,
+        http_fetcher: HttpFetcher = None,
+        extractor: HtmlExtractor = None,
+        multi_search: MultiEngineSearch = None,
+        ddg_custom_session: RateLimitedSession = None,
+    ) -> None:
+        """
+        With use_browser_pool the scraper keeps max_concurrency browsers open until
+        close() is called (or the process exits), otherwise every call of
+        get_scraped_pages launches and closes its own browser.
+        If page_cache is given, the cleaned content of the pages is read from and
+        stored into it, the same for search_cache and the links of the search engines.
+        ddg_custom_url replaces the DuckDuckGo endpoint used by ddg_custom.
+        If http_fetcher is given, every page is first fetched with a plain GET and
+        rendered by the browser only when its text is missing or too short.
+        extractor is the html engine, by default the fastest one installed.
+        multi_search sets how the other engines are used when the configured one
+        fails or is slow, by default they are tried one after the other.
+        ddg_custom_session sends the requests of ddg_custom, pooled and rate limited
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than 0")
+
+        self.max_concurrency: int = max_concurrency
+        self.page_timeout: float = page_timeout
+        self.page_cache: PageCache = page_cache
+        self.search_cache: SearchCache = search_cache
+        self.ddg_custom_url: str = ddg_custom_url
+        self.http_fetcher: HttpFetcher = http_fetcher
+        self.extractor: HtmlExtractor = extractor or get_extractor()
+        self.multi_search: MultiEngineSearch = multi_search or MultiEngineSearch()
+        # shared by all the queries, so are its connections and its rate limit
+        self.ddg_scraper: DuckDuckGoScraper = DuckDuckGoScraper(
+            search_cache=search_cache,
+            url=ddg_custom_url,
+            extractor=self.extractor,
+            session=ddg_custom_session,
+        )
+        self.browser_pool: BrowserPool = (
+            BrowserPool(
+                self.__get_browser_config,
+                size=max_concurrency,
+                recycle_after=recycle_browser_after,
+            )
+            if use_browser_pool
+            else None
         )
 
-        links: list[str] = [result["href"] for result in results] if results else []
-        # fallback to google if no results found
-        if not links:
-            print("[WARNING] No results found on DDG. Falling back to Google.")
-            links = self.get_web_links_google(query, max_results, language)
+    def close(self) -> None:
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+        if self.page_cache is not None:
+            self.page_cache.close()
+        if self.search_cache is not None:
+            self.search_cache.close()
+        if self.http_fetcher is not None:
+            self.http_fetcher.close()
+        self.multi_search.close()
+        self.ddg_scraper.close()
+
+    def __enter__(self) -> "WebScraper":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __cached_search(self, engine, query, region, max_results, search_fn):
+        if self.search_cache is None:
+            return search_fn()
+        return self.search_cache.get_or_search(
+            engine, query, region, max_results, search_fn
+        )
 
-        return links
+    def __search_ddg(self, query: str, max_results: int, region: str) -> list[str]:
+        from duckduckgo_search import DDGS
 
-    def get_web_links_google(
-        self, query: str, max_results: int, language: str
-    ) -> list[str]:
-        region: str = self.__get_google_region_from_language(language)
-        results: list[str] = search(
-            query, num_results=max_results, region=region, safe=None
+        results: list[dict[str, str]] = DDGS().text(
+            query, max_results=max_results, region=region, safesearch="off"
         )
+        return [result["href"] for result in results] if results else []
 
-        links: list[str] = (
+    def __search_google(self, query: str, max_results: int, region: str) -> list[str]:
+        from googlesearch import search  # https://pypi.org/project/googlesearch-python/
+
+        results: list[str] = list(
+            search(query, num_results=max_results, region=region, safe=None)
+        )
+        return (
             [result for result in results if result.startswith("http")]
             if results
             else []
         )
-        # fallback a google if no results found
-        if not links:
-            print("[WARNING] No results found on Google. Falling back to DDG.")
-            links: list[str] = self.get_web_links_ddg(query, max_results, language)
 
-        return links
+    # the get_web_links_* methods search a single engine, the fallback to the
+    # other engines is done by get_links
 
-    # use my ddg custom scarper
-    def get_web_links_ddg_custom(
+    def get_web_links_ddg(
         self, query: str, max_results: int, language: str
     ) -> list[str]:
         region: str = self.__get_ddg_region_from_language(language)
-        ddg_scraper: DuckDuckGoScraper = DuckDuckGoScraper()
-
-        links: list[str] = ddg_scraper.get_web_links_ddg(query, max_results, region)
+        return self.__cached_search(
+            "ddg",
+            query,
+            region,
+            max_results,
+            lambda: self.__search_ddg(query, max_results, region),
+        )
 
-        # fallback to google if no results found
-        if not links:
-            print("[WARNING] No results found on DDG Custom. Falling back to Google.")
-            links: list[str] = self.get_web_links_google(query, max_results, language)
+    def get_web_links_google(
+        self, query: str, max_results: int, language: str
+    ) -> list[str]:
+        region: str = self.__get_google_region_from_language(language)
+        return self.__cached_search(
+            "google",
+            query,
+            region,
+            max_results,
+            lambda: self.__search_google(query, max_results, region),
+        )
 
-        return links
+    # use my ddg custom scarper
+    def get_web_links_ddg_custom(
+        self, query: str, max_results: int, language: str, metrics=None
+    ) -> list[str]:
+        region: str = self.__get_ddg_region_from_language(language)
+        return self.ddg_scraper.get_web_links_ddg(query, max_results, region, metrics)
 
     def __get_ddg_region_from_language(self, language: str) -> str:
         if language is None or language == "":
@@ -122,8 +223,10 @@ class WebScraper:
         for lang, region in self.__google_regions_mappings.items():
             print(f"{lang}: {region}")
 
-    async def __get_content_from_page(self, url: str, markdown: bool):
-        browser_cfg: BrowserConfig = BrowserConfig(
+    def __get_browser_config(self) -> "BrowserConfig":
+        from crawl4ai import BrowserConfig
+
+        return BrowserConfig(
             headless=True,
             user_agent_mode="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3",
             text_mode=True,
@@ -131,19 +234,39 @@ class WebScraper:
             verbose=False,
         )
 
-        crawler_cfg = CrawlerRunConfig(
+    def __get_crawler_config(self) -> "CrawlerRunConfig":
+        from crawl4ai import CacheMode, CrawlerRunConfig
+
+        return CrawlerRunConfig(
             scan_full_page=True,
             cache_mode=CacheMode.BYPASS,
             remove_overlay_elements=True,
             exclude_social_media_links=True,
             wait_until="load",
         )
-        async with AsyncWebCrawler(config=browser_cfg) as crawler:
-            result = await crawler.arun(url=url, config=crawler_cfg)
+
+    async def __get_content_from_page(
+        self, url: str, markdown: bool, crawler: "AsyncWebCrawler" = None
+    ):
+        """
+        Render the page and return its markdown or html. If a running crawler is given
+        it is reused, otherwise a new browser is launched only for this page
+        """
+        if crawler is None:
+            from crawl4ai import AsyncWebCrawler
+
+            async with AsyncWebCrawler(config=self.__get_browser_config()) as crawler:
+                result = await crawler.arun(
+                    url=url, config=self.__get_crawler_config()
+                )
+        else:
+            result = await crawler.arun(url=url, config=self.__get_crawler_config())
+
+        headers: dict = result.response_headers or {}
         if markdown:
-            return result.markdown
+            return result.markdown, headers
         else:
-            return result.html
+            return result.html, headers
 
     @staticmethod
     def __clean_md_before_heading(markdown_content):
@@ -155,6 +278,8 @@ class WebScraper:
 
     @staticmethod
     def __remove_markdown_formatting(text):
+        from strip_markdown import strip_markdown
+
         text = strip_markdown(text)
         text = re.sub(r"\n\s*\n+", "\n\n", text)
         text = re.sub(r" +", " ", text)
@@ -162,11 +287,7 @@ class WebScraper:
         text = re.sub(r"<(style|script)[^>]*>.*?</\1>", "", text, flags=re.DOTALL)
         return text.strip()
 
-    def scrape_single_page(self, url, markdown):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        content = loop.run_until_complete(self.__get_content_from_page(url, markdown))
-
+    def __clean_page_content(self, content, markdown):
         if not content:
             print("[ERROR] No content found on the page.")
             return
@@ -184,50 +305,281 @@ class WebScraper:
 
         return cleaned_content
 
+    def __clean_wikipedia_content(self, content):
+        if not content:
+            print("[ERROR] No content found on the page.")
+            return
+        # get only the paragraphs from the wikipedia page
+        return self.__get_paragraphs_from_wikipedia(content)
+
+    def scrape_single_page(self, url, markdown):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        content, _ = loop.run_until_complete(
+            self.__get_content_from_page(url, markdown)
+        )
+
+        return self.__clean_page_content(content, markdown)
+
     def scrape_wikipedia_single_page(self, url):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-        content = loop.run_until_complete(
+        content, _ = loop.run_until_complete(
             self.__get_content_from_page(url, markdown=False)
         )
 
-        if not content:
-            print("[ERROR] No content found on the page.")
-            return
-        # get only the paragraphs from the wikipedia page
-        cleaned_content = self.__get_paragraphs_from_wikipedia(content)
-
-        return cleaned_content
+        return self.__clean_wikipedia_content(content)
 
     # knowing that wikipedia is very common and all the text is stored in paragraphs, we can use a specific method to extract only its paragraphs
 
     def __get_paragraphs_from_wikipedia(self, html):
-        soup = BeautifulSoup(html, "html.parser")
-        paragraphs = []
+        return "\n\n".join(self.extractor.get_paragraphs(html, ("p", "dd")))
+
+    async def __scrape_page_async(
+        self,
+        url: str,
+        acquire_crawler,
+        semaphore: asyncio.Semaphore,
+        metrics: QueryMetrics,
+    ):
+        """
+        Scrape and clean a single page using a crawler borrowed from acquire_crawler.
+        Any failure (timeout, browser error, empty page) returns None so that the
+        other pages are not affected
+        """
+        is_wikipedia: bool = url.__contains__("wikipedia.org")
+
+        start: float = time.perf_counter()
+        if self.page_cache is not None:
+            cached_content = await asyncio.to_thread(self.page_cache.get, url)
+            if cached_content:
+                print(f"[INFO] Using cached content for {url}")
+                metrics.add_page(url, "ok", time.perf_counter() - start, cached=True)
+                metrics.count("bytes_cleaned", len(cached_content.encode("utf-8")))
+                return cached_content
+
+        # the http tier is bounded by max_concurrency like the browser
+        async with semaphore:
+            fetched = None
+            if self.http_fetcher is not None:
+                start = time.perf_counter()
+                try:
+                    fetched = await asyncio.to_thread(self.http_fetcher.fetch, url)
+                except Exception as e:
+                    # e.g. a page the parser cannot read, the browser is tried
+                    print(f"[WARNING] HTTP fetch failed for {url}: {e}")
+
+            if fetched is None:
+                # the time of the http attempt is not part of the browser fetch
+                start = time.perf_counter()
+                try:
+                    async with acquire_crawler() as crawler:
+                        content, headers = await asyncio.wait_for(
+                            self.__get_content_from_page(
+                                url, markdown=not is_wikipedia, crawler=crawler
+                            ),
+                            timeout=self.page_timeout,
+                        )
+                except asyncio.TimeoutError:
+                    print(f"[ERROR] Timeout after {self.page_timeout}s on {url}.")
+                    metrics.add_page(url, "timeout", time.perf_counter() - start)
+                    return
+                except Exception as e:
+                    print(f"[ERROR] Error while scraping {url}: {e}")
+                    metrics.add_page(url, "error", time.perf_counter() - start)
+                    return
+        if fetched is not None:
+            return await self.__store_page(
+                url, fetched, time.perf_counter() - start, is_wikipedia, metrics
+            )
+        fetch_seconds: float = time.perf_counter() - start
 
-        blocks = soup.find_all(["p", "dd"])
+        with metrics.measure("clean"):
+            if is_wikipedia:
+                cleaned_content = self.__clean_wikipedia_content(content)
+            else:
+                cleaned_content = self.__clean_page_content(content, markdown=True)
+
+        metrics.add_page(
+            url,
+            "ok" if cleaned_content else "empty",
+            fetch_seconds,
+            size=len(content.encode("utf-8")) if content else 0,
+            tier=BROWSER_TIER,
+        )
+        if cleaned_content:
+            metrics.count("bytes_cleaned", len(cleaned_content.encode("utf-8")))
+
+        if cleaned_content and self.page_cache is not None:
+            await asyncio.to_thread(
+                self.page_cache.put,
+                url,
+                cleaned_content,
+                etag=self.__get_header(headers, "ETag"),
+                last_modified=self.__get_header(headers, "Last-Modified"),
+            )
 
-        for block in blocks:
-            text = block.get_text(strip=False)
-            if text:
-                paragraphs.append(text)
+        return cleaned_content
 
-        return "\n\n".join(paragraphs)
+    async def __store_page(
+        self,
+        url: str,
+        fetched: tuple[str, str, dict],
+        fetch_seconds: float,
+        is_wikipedia: bool,
+        metrics: QueryMetrics,
+    ):
+        """Clean, record and cache a page returned by the http fetcher"""
+        html, text, headers = fetched
+        with metrics.measure("clean"):
+            if is_wikipedia:
+                cleaned_content = self.__clean_wikipedia_content(html)
+            else:
+                # the text is already extracted from the html, only the spaces are left
+                cleaned_content = re.sub(r" +", " ", text).strip()
+
+        metrics.add_page(
+            url,
+            "ok" if cleaned_content else "empty",
+            fetch_seconds,
+            size=len(html.encode("utf-8")),
+            tier=HTTP_TIER,
+        )
+        if not cleaned_content:
+            return
+        metrics.count("bytes_cleaned", len(cleaned_content.encode("utf-8")))
+
+        if self.page_cache is not None:
+            await asyncio.to_thread(
+                self.page_cache.put,
+                url,
+                cleaned_content,
+                etag=self.__get_header(headers, "ETag"),
+                last_modified=self.__get_header(headers, "Last-Modified"),
+            )
+        return cleaned_content
 
-    # find useful links from a query using the specified search engine
-    # scrape the content of the pages and return a list of dictionaries with url and content
+    @staticmethod
+    def __get_header(headers: dict, name: str):
+        for key, value in headers.items():
+            if key.lower() == name.lower():
+                return value
+
+    async def __scrape_links(
+        self,
+        links: list[str],
+        acquire_crawler,
+        metrics: QueryMetrics,
+        on_page: OnPage = None,
+    ) -> list[tuple[str, Optional[str]]]:
+        """(url, content or None if it failed) of the links, without the skipped"""
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(self.max_concurrency)
+        with metrics.measure("fetch"):
+            tasks: list[asyncio.Task] = [
+                asyncio.ensure_future(
+                    self.__scrape_page_async(url, acquire_crawler, semaphore, metrics)
+                )
+                for url in links
+            ]
+            if on_page is None:
+                return list(zip(links, await asyncio.gather(*tasks)))
+
+            results: dict[int, Optional[str]] = {}
+            pending: set[asyncio.Task] = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    # in the order of the links, like gather
+                    for i in sorted(tasks.index(task) for task in done):
+                        results[i] = tasks[i].result()
+                        if not results[i]:
+                            continue
+                        page: dict[str, str] = {"url": links[i], "content": results[i]}
+                        # on_page can be slow (e.g. encoding), the other pages go on
+                        if await asyncio.to_thread(on_page, page):
+                            skipped: int = len(links) - len(results)
+                            if skipped:
+                                print(
+                                    f"[INFO] Enough content, {skipped} pages skipped."
+                                )
+                                metrics.count("pages_cancelled", skipped)
+                            return [(links[i], results[i]) for i in sorted(results)]
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            return [(links[i], results[i]) for i in sorted(results)]
+
+    async def scrape_pages_async(
+        self, links: list[str], metrics: QueryMetrics = None, on_page: OnPage = None
+    ) -> list[dict[str, str]]:
+        """
+        Scrape all the links at the same time, at most max_concurrency pages are open
+        together. The browsers of the pool are used if enabled, otherwise a single
+        browser is launched for this call, only if a page needs it.
+        If metrics is given, the fetch of every page is recorded in it.
+        on_page, if given, gets every page as soon as it is scraped, in a thread;
+        when it returns True the pages still loading are cancelled.
+        Returns the pages in the same order of the links, skipping the failed ones
+        """
+        if metrics is None:
+            metrics = QueryMetrics()
+
+        if self.browser_pool is not None:
+            if asyncio.get_running_loop() is not self.browser_pool.loop:
+                return await self.browser_pool.arun(
+                    self.scrape_pages_async(links, metrics, on_page)
+                )
+            results = await self.__scrape_links(
+                links, self.browser_pool.acquire, metrics, on_page
+            )
+        else:
+            crawler: "AsyncWebCrawler" = None
+            crawler_lock: asyncio.Lock = asyncio.Lock()
+
+            # the browser is launched by the first page not fetched with http
+            @asynccontextmanager
+            async def shared_crawler():
+                nonlocal crawler
+                async with crawler_lock:
+                    if crawler is None:
+                        from crawl4ai import AsyncWebCrawler
+
+                        new_crawler = AsyncWebCrawler(
+                            config=self.__get_browser_config()
+                        )
+                        await new_crawler.start()
+                        crawler = new_crawler
+                yield crawler
+
+            try:
+                results = await self.__scrape_links(
+                    links, shared_crawler, metrics, on_page
+                )
+            finally:
+                if crawler is not None:
+                    await crawler.close()
 
-    def get_scraped_pages(self, query, search_engine, max_pages, language):
-        """Scrape web pages based on a query using the specified search engine.
-        Args:
+        pages_data = []
+        for url, cleaned_content in results:
+            print(f"\n[OK] Using: {url} ")
 
-            query (str): The search query.
-            search_engine (str): The search engine to use ('ddg' for DuckDuckGo, 'google' for Google).
-            max_pages (int): The maximum number of pages to scrape.
-            language (str): The language for the search.
-        Returns:
-            list: A list of dictionaries containing the URL and content of each scraped page.
+            if not cleaned_content:
+                print(f"[ERROR] Failed to scrape content from {url}.")
+                continue
+
+            pages_data.append({"url": url, "content": cleaned_content})
+
+        return pages_data
+
+    def get_links(self, query, search_engine, max_pages, language, metrics=None):
+        """
+        Return the links found for the query by the specified search engine, and by
+        the other engines of multi_search when it fails or is slow, None if the
+        search engine is not supported
         """
         if search_engine not in self.__SUPPORTED_SEARCH_ENGINES:
             print(
@@ -237,46 +589,91 @@ class WebScraper:
             )
             return
 
-        if search_engine == "ddg":
-            links = self.get_web_links_ddg(
+        return self.multi_search.search(
+            search_engine,
+            lambda engine: self.__get_engine_links(
+                engine, query, max_pages, language, metrics
+            ),
+            max_pages,
+            metrics,
+        )
+
+    def __get_engine_links(self, engine, query, max_pages, language, metrics=None):
+        if engine == "ddg":
+            return self.get_web_links_ddg(
                 query, max_results=max_pages, language=language
             )
-        elif search_engine == "google":
-            links = self.get_web_links_google(
+        elif engine == "google":
+            return self.get_web_links_google(
                 query, max_results=max_pages, language=language
             )
-        elif search_engine == "ddg_custom":
-            links = self.get_web_links_ddg_custom(
-                query, max_results=max_pages, language=language
+        elif engine == "ddg_custom":
+            return self.get_web_links_ddg_custom(
+                query, max_results=max_pages, language=language, metrics=metrics
             )
+        raise ValueError(
+            f"Unsupported search engine: {engine}. "
+            f"Supported engines are: {self.__SUPPORTED_SEARCH_ENGINES}"
+        )
 
-        else:
-            print(
-                f"[ERROR] Unsupported search engine: {
-                    search_engine
-                }. Supported engines are: {self.__SUPPORTED_SEARCH_ENGINES}"
-            )
-            return
+    # find useful links from a query using the specified search engine
+    # scrape the content of the pages and return a list of dictionaries with url and content
+
+    def __get_links_measured(self, query, search_engine, max_pages, language, metrics):
+        with metrics.measure("search"):
+            links = self.get_links(query, search_engine, max_pages, language, metrics)
+        metrics.count("links", len(links) if links else 0)
+        return links
+
+    async def aget_scraped_pages(
+        self, query, search_engine, max_pages, language, metrics=None, on_page=None
+    ):
+        """Async version of get_scraped_pages, to be awaited inside a running event loop."""
+        if metrics is None:
+            metrics = QueryMetrics(query)
+        links = await asyncio.to_thread(
+            self.__get_links_measured,
+            query,
+            search_engine,
+            max_pages,
+            language,
+            metrics,
+        )
 
         if not links:
             print("[ERROR] No link found.")
             return
 
-        pages_data = []
-        for url in links:
-            print(f"\n[OK] Using: {url} ")
+        return await self.scrape_pages_async(links, metrics, on_page)
 
-            if url.__contains__("wikipedia.org"):
-                cleaned_content = self.scrape_wikipedia_single_page(url)
-                if not cleaned_content:
-                    print(f"[ERROR] Failed to scrape content from {url}.")
-                    continue
-            else:
-                cleaned_content = self.scrape_single_page(url, markdown=True)
-                if not cleaned_content:
-                    print(f"[ERROR] Failed to scrape content from {url}.")
-                    continue
+    def get_scraped_pages(
+        self, query, search_engine, max_pages, language, metrics=None, on_page=None
+    ):
+        """Scrape web pages based on a query using the specified search engine.
+        Args:
 
-            pages_data.append({"url": url, "content": cleaned_content})
+            query (str): The search query.
+            search_engine (str): The search engine to use ('ddg' for DuckDuckGo, 'google' for Google).
+            max_pages (int): The maximum number of pages to scrape.
+            language (str): The language for the search.
+            metrics (QueryMetrics): Optional, records the search and every page fetch.
+            on_page (OnPage): Optional, gets every page as soon as it is scraped and
+                stops the scraping of the other pages by returning True.
+        Returns:
+            list: A list of dictionaries containing the URL and content of each scraped page.
+        """
+        if metrics is None:
+            metrics = QueryMetrics(query)
+        links = self.__get_links_measured(
+            query, search_engine, max_pages, language, metrics
+        )
 
-        return pages_data
+        if not links:
+            print("[ERROR] No link found.")
+            return
+
+        if self.browser_pool is not None:
+            return self.browser_pool.run(
+                self.scrape_pages_async(links, metrics, on_page)
+            )
+        return asyncio.run(self.scrape_pages_async(links, metrics, on_page))